@@ -0,0 +1,439 @@
+"""
+Unattended migration of many mailboxes from a job manifest.
+
+Each job of the manifest names its source PSTs, its destination store (and
+optionally a folder in it) and a mode: 'flatten', 'preserve' or 'plan' (a
+dry run that only writes the shard plan).  BatchJobRunner runs the jobs
+smallest first, at most max_jobs at a time.  All jobs share one
+ThrottleController and one cap on concurrent Move() calls, so the batch as a
+whole stays within the destination server's budget however many jobs run at
+once.  Every job gets its own journal, state and report directory, and the
+runner writes a summary with the outcome of each job.  A PST may belong to
+only one job: a job removes the PSTs it opened from the profile when it
+ends, which would pull them from under a concurrent job.  With more than one
+job at a time, sources must therefore be PST file paths, since a display name
+cannot be checked against the other jobs' paths.  Jobs with the same
+destination store run one after another, as each validates the destination's
+item count against its own moves.
+
+Nothing prompts or opens a dialog.  tkinter and the COM libraries are only
+imported when they are used, so the runner starts quickly and can be driven
+by FakeOutlookBackend.
+
+    python batch_job_runner.py manifest.json --max-jobs 4 --max-concurrent-moves 16
+
+Manifest (JSON); "defaults" apply to every job that does not set a key:
+
+    {
+      "defaults": {"mode": "flatten", "workers": 1},
+      "jobs": [
+        {"id": "ghi.jkl", "source": "\\\\\\\\fs01\\\\pst\\\\ghi.jkl.pst",
+         "destination": "Online Archive - ghi.jkl@def.com",
+         "destination_folder": "Inbox", "mode": "preserve"}
+      ]
+    }
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from migration_logging import setup_queue_logging, stop_logging
+from migration_metrics import MigrationMetrics
+from pst_scanner import PstInventory
+from pst_to_archive_migrator import EmailMigrator
+from throttle_controller import ThrottleController
+
+JOB_MODES = ('flatten', 'preserve', 'plan')
+
+# Per-job settings and their defaults; "defaults" in the manifest overrides these
+JOB_DEFAULTS = {
+    'mode': 'flatten',
+    'destination_folder': None,
+    'workers': 1,
+    'resume': True,
+    'incremental': False,
+    'dedupe': True,
+    'retry_timeout': 600.0,
+}
+
+JOB_STATUS_SUCCEEDED = 'succeeded'
+JOB_STATUS_FAILED = 'failed'        # The migration ran but reported failures or failed validation
+JOB_STATUS_ERROR = 'error'          # The job could not be run at all
+
+
+class ManifestError(ValueError):
+    """The job manifest is malformed."""
+
+
+def load_manifest(path):
+    """Jobs of a manifest file with defaults applied, in manifest order."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"Could not read manifest {path}: {e}")
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    return parse_jobs(manifest.get('jobs') or [], manifest.get('defaults') or {})
+
+
+def parse_jobs(entries, defaults=None):
+    """Validate manifest entries and return them as job dicts."""
+    unknown = set(defaults or {}) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ManifestError(f"Unknown keys in manifest defaults: {', '.join(sorted(unknown))}")
+    jobs = []
+    seen = set()
+    source_jobs = {}    # Normalized source -> id of the job that lists it
+    for index, entry in enumerate(entries, 1):
+        job = {**JOB_DEFAULTS, **(defaults or {}), **entry}
+        job['id'] = str(job.get('id') or f"job-{index}")
+        if job['id'] in seen:
+            raise ManifestError(f"Duplicate job id '{job['id']}'")
+        seen.add(job['id'])
+        sources = job.pop('source', None) or job.get('sources')
+        job['sources'] = [sources] if isinstance(sources, str) else list(sources or [])
+        if not job['sources']:
+            raise ManifestError(f"Job '{job['id']}' has no source")
+        for source in job['sources']:
+            # Jobs run concurrently, and a job closes the PSTs it opened while another could still be using them
+            key = source.replace('\\', '/').lower()
+            other = source_jobs.setdefault(key, job['id'])
+            if other != job['id']:
+                raise ManifestError(f"Jobs '{other}' and '{job['id']}' both list source '{source}'; "
+                                    f"a PST may only belong to one job")
+        if not job.get('destination'):
+            raise ManifestError(f"Job '{job['id']}' has no destination")
+        if job['mode'] not in JOB_MODES:
+            raise ManifestError(f"Job '{job['id']}' has unknown mode '{job['mode']}' (expected one of {', '.join(JOB_MODES)})")
+        if job['destination_folder']:
+            job['destination_folder'] = job['destination_folder'].replace('\\', '/').strip('/')
+        job['index'] = index
+        jobs.append(job)
+    return jobs
+
+
+def is_pst_path(source):
+    """True for a PST file path, False for a store display name (as EmailMigrator.select_sources tells them apart)."""
+    return source.lower().endswith('.pst')
+
+
+def check_concurrent_sources(jobs):
+    """Reject display-name sources, which parse_jobs cannot compare with the paths of concurrent jobs."""
+    for job in jobs:
+        names = [source for source in job['sources'] if not is_pst_path(source)]
+        if names:
+            raise ManifestError(f"Job '{job['id']}' names source '{names[0]}' by display name; "
+                                f"jobs that run concurrently need PST file paths as sources")
+
+
+def job_directory_name(job_id):
+    """File-system-safe directory name for a job."""
+    return re.sub(r'[^\w.@-]+', '_', job_id).strip('._') or 'job'
+
+
+class ThreadOutput:
+    """
+    sys.stdout stand-in that sends what a job thread prints to that job's console file.
+    Threads without a file (the runner's own, and the migrators' worker threads) write
+    to the real stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def write(self, text):
+        return (getattr(self._local, 'file', None) or self.stream).write(text)
+
+    def flush(self):
+        (getattr(self._local, 'file', None) or self.stream).flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    @contextlib.contextmanager
+    def redirect(self, path):
+        with open(path, 'a', encoding='utf-8') as f:
+            self._local.file = f
+            try:
+                yield
+            finally:
+                self._local.file = None
+
+
+class BatchJobRunner:
+    """Runs manifest jobs smallest first under one concurrency and rate budget."""
+
+    def __init__(self, jobs, backend=None, max_jobs=2, throttle=None, max_concurrent_moves=None,
+                 state_dir="migration_state", report_dir="migration_reports", inventory=None, verbose=False,
+                 metrics_interval=30.0):
+        self.jobs = jobs
+        self.backend = backend
+        self.max_jobs = max(1, max_jobs)
+        if self.max_jobs > 1:
+            check_concurrent_sources(jobs)
+        # Shared by every job's migrator: one adaptive rate and one cap on in-flight moves for the whole batch
+        self.throttle = throttle or ThrottleController()
+        self.max_concurrent_moves = max_concurrent_moves
+        self.move_slots = threading.BoundedSemaphore(max_concurrent_moves) if max_concurrent_moves else None
+        self.state_dir = state_dir
+        self.report_dir = report_dir
+        self.inventory = inventory
+        self.verbose = verbose
+        self.metrics_interval = metrics_interval
+        self.batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.order = []
+        self.results = {}
+        self._results_lock = threading.Lock()
+        self._pending = []                  # Jobs not started yet, in run order
+        self._busy_destinations = set()     # Destination stores of the running jobs
+        self._schedule = threading.Condition()
+
+    def estimate_size(self, job):
+        """
+        (items, bytes) of a job's sources. Items come from the PST inventory when it covers every
+        source; bytes are the PST file sizes when the files are reachable. None if unknown.
+        """
+        items = 0
+        size = 0
+        for source in job['sources']:
+            entry = self.inventory.find(source) if self.inventory is not None else None
+            if entry is None:
+                items = None
+            elif items is not None:
+                items += entry['totals']['items' if job['mode'] == 'preserve' else 'mail_items']
+            if size is not None:
+                try:
+                    size += os.path.getsize(source)
+                except OSError:
+                    size = size + entry['file_bytes'] if entry is not None else None
+        return items, size
+
+    def schedule(self):
+        """Jobs in run order: smallest first, jobs of unknown size last in manifest order."""
+        sized = []
+        for job in self.jobs:
+            items, size = self.estimate_size(job)
+            job['estimated_items'] = items
+            job['estimated_bytes'] = size
+            # Item counts beat file sizes, which include attachments and free space
+            key = (0, items) if items is not None else (1, size) if size is not None else (2, 0)
+            sized.append((key, job['index'], job))
+        sized.sort(key=lambda entry: entry[:2])
+        return [job for _, _, job in sized]
+
+    def run(self):
+        """Run every job and return the batch summary (also written to the report directory)."""
+        started = time.monotonic()
+        self.order = self.schedule()
+        self._pending = list(self.order)
+        logging.info(f"Batch {self.batch_id}: {len(self.jobs)} jobs, {min(self.max_jobs, len(self.jobs))} at a time, "
+                     f"at most {self.max_concurrent_moves or 'unlimited'} concurrent moves.")
+
+        output = ThreadOutput(sys.stdout)
+        sys.stdout = output
+        try:
+            threads = [
+                threading.Thread(target=self.run_job_worker, args=(output,), name=f"job-runner-{n + 1}", daemon=True)
+                for n in range(min(self.max_jobs, len(self.jobs)))
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.stdout = output.stream
+
+        summary = self.summarize(time.monotonic() - started)
+        self.write_summary(summary)
+        return summary
+
+    def next_job(self):
+        """
+        Take the first pending job whose destination store no running job uses, waiting while
+        every pending job's destination is busy. None once no job is pending.
+        """
+        with self._schedule:
+            while self._pending:
+                for job in self._pending:
+                    destination = job['destination'].lower()
+                    if destination not in self._busy_destinations:
+                        self._pending.remove(job)
+                        self._busy_destinations.add(destination)
+                        return job
+                self._schedule.wait()
+            return None
+
+    def finish_job(self, job):
+        with self._schedule:
+            self._busy_destinations.discard(job['destination'].lower())
+            self._schedule.notify_all()
+
+    def run_job_worker(self, output):
+        while True:
+            job = self.next_job()
+            if job is None:
+                return
+            job_dir = os.path.join(self.report_dir, f"batch_{self.batch_id}", job_directory_name(job['id']))
+            os.makedirs(job_dir, exist_ok=True)
+            logging.info(f"Job '{job['id']}' started ({len(job['sources'])} sources -> '{job['destination']}', "
+                         f"{job['mode']}, about {job['estimated_items'] if job['estimated_items'] is not None else '?'} items).")
+            try:
+                with output.redirect(os.path.join(job_dir, "console.txt")):
+                    result = self.run_job(job, job_dir)
+            finally:
+                self.finish_job(job)
+            with self._results_lock:
+                self.results[job['id']] = result
+            logging.info(f"Job '{job['id']}' {result['status']} in {result['seconds']}s: "
+                         f"{result['successful']} moved, {result['failed']} failed, {result['deferred']} deferred.")
+
+    def run_job(self, job, job_dir):
+        """Run one job with its own migrator; returns the job's result dict, never raises."""
+        started = time.monotonic()
+        result = {
+            'id': job['id'],
+            'status': JOB_STATUS_ERROR,
+            'mode': job['mode'],
+            'sources': job['sources'],
+            'destination': job['destination'],
+            'destination_folder': job['destination_folder'],
+            'estimated_items': job.get('estimated_items'),
+            'estimated_bytes': job.get('estimated_bytes'),
+            'report_dir': job_dir,
+            'attempted': 0,
+            'successful': 0,
+            'failed': 0,
+            'skipped': 0,
+            'deferred': 0,
+            'aggregate_validation_passed': None,
+            'error': None,
+        }
+        migrator = None
+        try:
+            migrator = EmailMigrator(
+                backend=self.backend,
+                journal_path=os.path.join(self.state_dir, job_directory_name(job['id']), "migration_journal.sqlite3"),
+                resume=job['resume'], workers=job['workers'], throttle=self.throttle, move_slots=self.move_slots,
+                max_concurrent_moves=self.max_concurrent_moves, preserve_structure=job['mode'] == 'preserve',
+                dedupe=job['dedupe'], incremental=job['incremental'], retry_timeout=job['retry_timeout'],
+                inventory=self.inventory, sources=job['sources'], report_dir=job_dir, verbose=self.verbose,
+                interactive=False, configure_logging=False,
+                metrics=MigrationMetrics(export_path=os.path.join(job_dir, "migration_metrics"),
+                                         export_interval=self.metrics_interval),
+            )
+            success = migrator.run_migration(destination_store_name=job['destination'],
+                                             destination_folder=job['destination_folder'],
+                                             assume_yes=True, plan_only=job['mode'] == 'plan')
+            report = migrator.migration_report
+            result.update({
+                'status': JOB_STATUS_SUCCEEDED if success else JOB_STATUS_FAILED,
+                'destination_path': report['destination_path'],
+                'attempted': report['total_attempted'],
+                'successful': report['total_successful'],
+                'failed': report['total_failed'],
+                'skipped': report['total_skipped'],
+                'deferred': report['total_deferred'],
+                'aggregate_validation_passed': report['aggregate_validation_passed'] if job['mode'] != 'plan' else None,
+                'plan': report.get('plan'),
+            })
+        except Exception as e:
+            logging.error(f"Job '{job['id']}' could not be run: {e}", exc_info=True)
+            result['error'] = str(e)
+        finally:
+            if migrator is not None:
+                migrator.journal.close()
+        result['seconds'] = round(time.monotonic() - started, 3)
+        return result
+
+    def summarize(self, seconds):
+        jobs = [self.results[job['id']] for job in self.order if job['id'] in self.results]
+        by_status = {status: sum(1 for job in jobs if job['status'] == status)
+                     for status in (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED, JOB_STATUS_ERROR)}
+        return {
+            'batch_id': self.batch_id,
+            'finished_at': datetime.now().isoformat(),
+            'seconds': round(seconds, 3),
+            'jobs': len(jobs),
+            **by_status,
+            'total_attempted': sum(job['attempted'] for job in jobs),
+            'total_successful': sum(job['successful'] for job in jobs),
+            'total_failed': sum(job['failed'] for job in jobs),
+            'total_deferred': sum(job['deferred'] for job in jobs),
+            'throttle': self.throttle.snapshot(),
+            'results': jobs,
+        }
+
+    def write_summary(self, summary):
+        """Write the summary JSON next to the job directories and return its path."""
+        path = os.path.join(self.report_dir, f"batch_{self.batch_id}", "batch_summary.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, default=str)
+        logging.info(f"Batch summary saved to: {path}")
+        summary['summary_path'] = path
+        return path
+
+
+def print_summary(summary):
+    print(f"\n=== BATCH {summary['batch_id']} ===")
+    print(f"Jobs: {summary['jobs']} ({summary[JOB_STATUS_SUCCEEDED]} succeeded, {summary[JOB_STATUS_FAILED]} failed, "
+          f"{summary[JOB_STATUS_ERROR]} could not run) in {summary['seconds']:.1f}s")
+    print(f"Items: {summary['total_successful']} moved, {summary['total_failed']} failed, "
+          f"{summary['total_deferred']} deferred")
+    print(f"{'Job':<30}{'Status':<11}{'Moved':>9}{'Failed':>8}{'Skipped':>9}{'Seconds':>10}")
+    for job in summary['results']:
+        print(f"{job['id'][:29]:<30}{job['status']:<11}{job['successful']:>9}{job['failed']:>8}{job['skipped']:>9}"
+              f"{job['seconds']:>10.1f}")
+        if job['error']:
+            print(f"  Error: {job['error']}")
+    print(f"Summary: {summary['summary_path']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate many mailboxes unattended from a job manifest.")
+    parser.add_argument('manifest', help="JSON manifest of jobs (source, destination, mode)")
+    parser.add_argument('--max-jobs', type=int, default=2,
+                        help="Jobs run at the same time")
+    parser.add_argument('--max-concurrent-moves', type=int, default=None,
+                        help="Cap on simultaneous Move() calls across all jobs")
+    parser.add_argument('--move-rate', type=float, default=5.0,
+                        help="Initial Move() rate per second for the whole batch; adapts to server latency and throttling")
+    parser.add_argument('--max-move-rate', type=float, default=200.0,
+                        help="Upper bound for the batch's adaptive Move() rate")
+    parser.add_argument('--inventory', default=None,
+                        help="PST inventory written by pst_scanner.py, used to size, plan and reconcile jobs")
+    parser.add_argument('--state-dir', default="migration_state",
+                        help="Directory for the per-job journals and state")
+    parser.add_argument('--report-dir', default="migration_reports",
+                        help="Directory for the per-job reports and the batch summary")
+    parser.add_argument('--metrics-interval', type=float, default=30.0,
+                        help="Seconds between metrics exports of each job; 0 exports only at the end")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Write a DEBUG line per item to the log file")
+    args = parser.parse_args()
+
+    os.makedirs("migration_logs", exist_ok=True)
+    log_filename = os.path.join("migration_logs", f'batch_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
+    setup_queue_logging(log_filename, verbose=args.verbose)
+    try:
+        runner = BatchJobRunner(
+            load_manifest(args.manifest), max_jobs=args.max_jobs,
+            throttle=ThrottleController(initial_rate=args.move_rate, max_rate=args.max_move_rate),
+            max_concurrent_moves=args.max_concurrent_moves, state_dir=args.state_dir, report_dir=args.report_dir,
+            inventory=PstInventory.load(args.inventory) if args.inventory else None, verbose=args.verbose,
+            metrics_interval=args.metrics_interval,
+        )
+        summary = runner.run()
+    finally:
+        stop_logging()
+    print_summary(summary)
+    sys.exit(0 if summary['jobs'] and summary['jobs'] == summary[JOB_STATUS_SUCCEEDED] else 1)
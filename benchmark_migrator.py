@@ -0,0 +1,175 @@
+"""
+Throughput benchmark for EmailMigrator against the in-memory fake Outlook backend.
+
+Reports items/sec, COM calls per item (with a per-category breakdown) and peak
+Python memory for migrate_shards (the move phase of a flattened run) and
+run_migration on synthetic PSTs.
+
+    python benchmark_migrator.py --items 10000,100000 --depth 3 --fanout 4
+    python benchmark_migrator.py --items 1000000 --scenario migrate_shards --json bench.json
+
+Runs in a temporary directory so logs and reports do not pile up in the repo.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fake_outlook import FakeOutlookBackend
+from migration_logging import stop_logging
+from pst_to_archive_migrator import EmailMigrator
+from throttle_controller import ThrottleController
+
+DESTINATION_STORE = 'Online Archive - benchmark@example.com'
+
+
+def build_backend(args, item_count, pst_count):
+    backend = FakeOutlookBackend(
+        latency=args.latency,
+        latencies={'move': args.move_latency} if args.move_latency is not None else None,
+        failure_rates={'move': args.failure_rate} if args.failure_rate else None,
+        throttle_rate=args.throttle_rate,
+        max_moves_per_second=args.server_move_limit,
+        seed=args.seed,
+    )
+    backend.add_mailbox(DESTINATION_STORE)
+    per_pst, remainder = divmod(item_count, pst_count)
+    for i in range(pst_count):
+        backend.build_synthetic_pst(
+            f"Benchmark PST {i + 1}", per_pst + (1 if i < remainder else 0),
+            depth=args.depth, fanout=args.fanout, non_mail_ratio=args.non_mail_ratio
+        )
+    return backend
+
+
+def quiet_migrator(backend, args):
+    throttle = ThrottleController(initial_rate=args.move_rate, max_rate=max(args.move_rate, args.max_move_rate),
+                                  backoff_base=args.backoff_base)
+    return EmailMigrator(backend=backend, workers=args.workers, max_concurrent_moves=args.max_concurrent_moves,
+                         throttle=throttle, log_to_console=args.keep_console_logging)
+
+
+def scenario_migrate_shards(args, item_count):
+    backend = build_backend(args, item_count, 1)
+    migrator = quiet_migrator(backend, args)
+    session = migrator.open_session()
+    try:
+        psts = [s for s in session.namespace.Stores if s.FilePath]
+        target = session.store(DESTINATION_STORE).GetRootFolder()
+        # Planning is not part of the measurement
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = migrator.plan_migration(psts)
+
+        def run():
+            reports = migrator.migrate_shards(plan, psts, target)
+            return sum(report['total_attempted_current_pst'] for report in reports)
+
+        return measure(backend, run, args.memory)
+    finally:
+        migrator.close_session()
+        migrator.journal.close()
+
+
+def scenario_run_migration(args, item_count):
+    backend = build_backend(args, item_count, args.psts)
+    migrator = quiet_migrator(backend, args)
+
+    def run():
+        migrator.run_migration(destination_store_name=DESTINATION_STORE, assume_yes=True)
+        return migrator.migration_report['total_attempted']
+
+    return measure(backend, run, args.memory)
+
+
+SCENARIOS = {
+    'migrate_shards': scenario_migrate_shards,
+    'run_migration': scenario_run_migration,
+}
+
+
+def measure(backend, run, trace_memory):
+    backend.reset_counters()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        items = run()
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    per_item = max(items, 1)
+    return {
+        'items': items,
+        'seconds': round(elapsed, 3),
+        'items_per_sec': round(items / elapsed, 1) if elapsed else 0,
+        'com_calls': backend.total_calls(),
+        'com_calls_per_item': round(backend.total_calls() / per_item, 2),
+        'com_calls_per_item_by_category': {
+            category: round(count / per_item, 3) for category, count in sorted(backend.calls.items())
+        },
+        'peak_memory_mb': round(peak / (1024 * 1024), 2) if trace_memory else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', default='10000', help="Comma-separated item counts (e.g. 10000,100000,1000000)")
+    parser.add_argument('--scenario', choices=['all'] + list(SCENARIOS), default='all')
+    parser.add_argument('--depth', type=int, default=3, help="Folder tree depth of each synthetic PST")
+    parser.add_argument('--fanout', type=int, default=3, help="Subfolders per folder")
+    parser.add_argument('--psts', type=int, default=3, help="Number of PSTs for run_migration")
+    parser.add_argument('--workers', type=int, default=1, help="Parallel PST workers for run_migration")
+    parser.add_argument('--max-concurrent-moves', type=int, default=None)
+    parser.add_argument('--non-mail-ratio', type=float, default=0.02)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds of latency per COM call")
+    parser.add_argument('--move-latency', type=float, default=None, help="Seconds of latency per Move() (overrides --latency)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability that a Move() fails")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Probability that a Move() is throttled")
+    parser.add_argument('--move-rate', type=float, default=1e6,
+                        help="Initial adaptive Move() rate (default effectively unpaced)")
+    parser.add_argument('--max-move-rate', type=float, default=1e6)
+    parser.add_argument('--backoff-base', type=float, default=0.05,
+                        help="Throttle backoff base in seconds (kept short for benchmarking)")
+    parser.add_argument('--server-move-limit', type=float, default=None,
+                        help="Moves per second the fake server accepts before throttling")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="Skip tracemalloc (faster, no peak memory)")
+    parser.add_argument('--keep-console-logging', action='store_true')
+    parser.add_argument('--json', help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    scenarios = list(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+    json_path = os.path.abspath(args.json) if args.json else None
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='migrator_bench_') as workdir:
+        os.chdir(workdir)
+        try:
+            for item_count in (int(n) for n in args.items.split(',')):
+                for name in scenarios:
+                    result = SCENARIOS[name](args, item_count)
+                    stop_logging()
+                    result.update({'scenario': name, 'requested_items': item_count,
+                                   'depth': args.depth, 'fanout': args.fanout})
+                    results.append(result)
+                    print(f"{name:<16} items={result['items']:>9} time={result['seconds']:>9.2f}s "
+                          f"items/s={result['items_per_sec']:>10.1f} calls/item={result['com_calls_per_item']:>6.2f} "
+                          f"peak_mb={result['peak_memory_mb']}")
+                    print(f"{'':<16} {result['com_calls_per_item_by_category']}")
+        finally:
+            os.chdir(cwd)
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
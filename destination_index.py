@@ -0,0 +1,272 @@
+"""
+Fingerprint index of the items already in the migration destination.
+
+Each destination item is reduced to an 8-byte hash of its Internet Message-ID,
+SentOn and sender (plus its folder path when the index covers a folder tree),
+read in bulk from folder tables.  The migrator looks fingerprints up before
+moving to skip mail that is already in the destination, and after the run to
+verify that every moved item arrived.  Items without a Message-ID have no
+fingerprint: they are neither skipped nor verified item by item, only counted.  The index is cached on disk per destination folder
+and brought up to date incrementally with a LastModificationTime restriction.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+# PR_INTERNET_MESSAGE_ID (Unicode), readable as a table column and via PropertyAccessor
+MESSAGE_ID_PROPTAG = 'http://schemas.microsoft.com/mapi/proptag/0x1035001F'
+
+# Columns read per destination item; LastModificationTime drives incremental updates
+INDEX_COLUMNS = [MESSAGE_ID_PROPTAG, 'SentOn', 'SenderName', 'LastModificationTime']
+
+CACHE_VERSION = 2
+
+
+def fingerprint(message_id, sent_on, sender, folder=''):
+    """
+    64-bit fingerprint of an item, or None without a Message-ID: SentOn and sender alone
+    do not tell items apart, and stores recompute sizes, so a PST item and its moved copy
+    rarely agree on those. folder (a path below the destination root) keeps the copies of
+    one message in different folders apart.
+    """
+    if not message_id:
+        return None
+    sent = sent_on.strftime('%Y%m%d%H%M%S') if sent_on else ''
+    key = f"{message_id}\x1f{sent}\x1f{sender or ''}\x1f{folder.lower()}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+
+
+def restrict_date(value):
+    """Format a datetime for a Jet Restrict/GetTable filter (minute precision, local time)."""
+    return value.strftime('%m/%d/%Y %I:%M %p')
+
+
+class DestinationIndex:
+    """Thread-safe set of destination fingerprints, cached in state_dir between runs."""
+
+    WINDOW_SIZE = 500   # Rows fetched per GetArray call
+
+    def __init__(self, state_dir="migration_state"):
+        self.state_dir = state_dir
+        self.cache_path = None
+        self.root_id = None
+        self.recursive = False
+        self.folders = {}           # Folder EntryID -> {'count': ..., 'high_water': ISO timestamp}
+        self.fingerprints = set()
+        self.moved = set()          # Fingerprints of items moved in this run, checked by verify()
+        self.claimed = set()        # Fingerprints of moves in flight, kept by a full refresh
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __contains__(self, value):
+        return value in self.fingerprints
+
+    def fingerprint_row(self, row, folder=''):
+        """
+        Fingerprint of a migrator ItemRow (None without a Message-ID). folder is the path
+        below the destination root the item is moved to; only a recursive index uses it.
+        """
+        return fingerprint(row.message_id, row.sent_on, row.sender, folder if self.recursive else '')
+
+    def claim(self, value):
+        """Reserve a fingerprint for a move. False if it is already in the destination or claimed by another move."""
+        with self._lock:
+            if value in self.fingerprints:
+                return False
+            self.fingerprints.add(value)
+            self.claimed.add(value)
+            return True
+
+    def release(self, value):
+        """Give back a claim whose move failed."""
+        with self._lock:
+            self.fingerprints.discard(value)
+            self.claimed.discard(value)
+
+    def record_moved(self, value):
+        with self._lock:
+            self.moved.add(value)
+            self.claimed.discard(value)
+
+    def subtree_fingerprints(self, folder, folder_path):
+        """
+        Fingerprints of every item in folder and its subfolders, as they will be keyed once the
+        subtree sits at folder_path below the destination root. Used around a bulk folder move.
+        """
+        values = set()
+        for subfolder, path in self._walk(folder, folder_path, recursive=True):
+            self._scan(subfolder, '', values, path=path)
+        return values
+
+    def record_bulk_move(self, values):
+        """Add the fingerprints of items moved with their folder; verify() checks them like single moves."""
+        with self._lock:
+            self.fingerprints.update(values)
+            self.moved.update(values)
+
+    def open(self, root_folder, recursive=False):
+        """Load the cached index of root_folder (and its subfolders if recursive) and bring it up to date."""
+        self.root_id = root_folder.EntryID
+        self.recursive = recursive
+        digest = hashlib.blake2b(f"{self.root_id}|{int(recursive)}".encode(), digest_size=8).hexdigest()
+        self.cache_path = os.path.join(self.state_dir, f"destination_index_{digest}.json")
+        self._load()
+        cached = len(self.fingerprints)
+        scanned = self.refresh(root_folder)
+        logging.info(f"Destination index: {len(self.fingerprints)} fingerprints "
+                     f"({cached} from cache, {scanned} rows read).")
+        self.save()
+
+    def refresh(self, root_folder, full=False, seen=None):
+        """
+        Bring the index up to date and return the number of rows read. Folders are re-read
+        from their cached high-water mark unless full is set or a folder has shrunk, which
+        makes the whole index be rebuilt. seen, if given, collects every fingerprint read.
+        Workers may call this while others claim fingerprints: the tables are read into local
+        containers and merged under the lock, and a rebuild keeps claims and this run's moves.
+        """
+        folders = list(self._walk(root_folder))
+        counts = {}
+        for folder, _ in folders:
+            entry_id = folder.EntryID
+            counts[entry_id] = folder.Items.Count
+            meta = self.folders.get(entry_id)
+            if not full and meta and counts[entry_id] < meta['count']:
+                logging.info("Destination folder shrank since the index was cached, rebuilding the index.")
+                full = True
+
+        fingerprints, folder_meta = set(), {}
+        scanned = 0
+        for folder, path in folders:
+            entry_id = folder.EntryID
+            meta = None if full else self.folders.get(entry_id)
+            filter_text = ''
+            if meta and meta['high_water']:
+                # Jet filters compare at minute precision; re-reading a minute is harmless
+                since = datetime.fromisoformat(meta['high_water']) - timedelta(minutes=1)
+                filter_text = f"[LastModificationTime] >= '{restrict_date(since)}'"
+            rows, high_water = self._scan(folder, filter_text, fingerprints, seen, path)
+            if filter_text and meta['count'] + rows < counts[entry_id]:
+                # Items arrived without a newer modification time; read the folder in full
+                extra, full_high_water = self._scan(folder, '', fingerprints, seen, path)
+                rows += extra
+                high_water = max(filter(None, [high_water, full_high_water]), default=None)
+            scanned += rows
+            previous = meta['high_water'] if meta else None
+            folder_meta[entry_id] = {
+                'count': counts[entry_id],
+                'high_water': max(filter(None, [previous, high_water.isoformat() if high_water else None]), default=None),
+            }
+
+        with self._lock:
+            if full:
+                # Drop fingerprints of items no longer in the destination, in place
+                self.fingerprints.intersection_update(fingerprints | self.claimed | self.moved)
+                self.folders.clear()
+            self.fingerprints.update(fingerprints)
+            self.folders.update(folder_meta)
+        return scanned
+
+    def verify(self, root_folder, full=True):
+        """
+        Re-read the destination and check every fingerprint moved in this run. Without full,
+        only items modified since the last refresh are read, which suits frequent incremental
+        runs. Returns a summary dict for the migration report.
+        """
+        arrived = set()
+        self.refresh(root_folder, full=full, seen=arrived)
+        missing = self.moved - arrived
+        self.save()
+        return {
+            'moved_items_checked': len(self.moved),
+            'verified': len(self.moved) - len(missing),
+            'missing': len(missing),
+            'missing_fingerprints_sample': [f"{value:016x}" for value in sorted(missing)[:20]],
+        }
+
+    def _walk(self, folder, path='', recursive=None):
+        """(folder, path below the walk's root) of folder and, if recursive, all its subfolders."""
+        yield folder, path
+        if self.recursive if recursive is None else recursive:
+            for subfolder in folder.Folders:
+                yield from self._walk(subfolder, f"{path}/{subfolder.Name}" if path else subfolder.Name, recursive)
+
+    def _scan(self, folder, filter_text, fingerprints, seen=None, path=''):
+        """
+        Add the fingerprints of one folder table, path being the folder's place below the
+        destination root; returns (rows read, newest LastModificationTime).
+        """
+        table = folder.GetTable(filter_text) if filter_text else folder.GetTable()
+        table.Columns.RemoveAll()
+        try:
+            table.Columns.Add(MESSAGE_ID_PROPTAG)
+            has_message_id = True
+        except Exception:
+            # Stores that cannot return the Message-ID column give their items no fingerprint
+            has_message_id = False
+        for column in INDEX_COLUMNS[1:]:
+            table.Columns.Add(column)
+
+        rows = 0
+        high_water = None
+        while True:
+            batch = table.GetArray(self.WINDOW_SIZE)
+            if not batch:
+                break
+            for values in batch:
+                if not has_message_id:
+                    values = (None, *values)
+                message_id, sent_on, sender, modified = values
+                value = fingerprint(message_id, sent_on, sender, path if self.recursive else '')
+                if value is not None:
+                    fingerprints.add(value)
+                    if seen is not None:
+                        seen.add(value)
+                if modified and (high_water is None or modified > high_water):
+                    high_water = modified
+                rows += 1
+        return rows, high_water
+
+    def _load(self):
+        self.folders = {}
+        self.fingerprints = set()
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                cache = json.load(f)
+            if cache.get('version') != CACHE_VERSION or cache.get('root_id') != self.root_id:
+                logging.info(f"Ignoring destination index cache {self.cache_path}: different version or destination.")
+                return
+            values = array('Q')
+            values.frombytes(bytes.fromhex(cache['fingerprints']))
+            self.fingerprints = set(values)
+            self.folders = cache['folders']
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not read destination index cache {self.cache_path}, rebuilding: {e}")
+            self.folders = {}
+            self.fingerprints = set()
+
+    def save(self):
+        """Write the index to its cache file atomically."""
+        if not self.cache_path:
+            return
+        os.makedirs(self.state_dir, exist_ok=True)
+        with self._lock:
+            cache = {
+                'version': CACHE_VERSION,
+                'root_id': self.root_id,
+                'saved_at': datetime.now().isoformat(),
+                'folders': self.folders,
+                'fingerprints': array('Q', sorted(self.fingerprints)).tobytes().hex(),
+            }
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, self.cache_path)
@@ -0,0 +1,1059 @@
+"""
+In-memory stand-in for the Outlook/MAPI object model.
+
+FakeOutlookBackend exposes the same initialize/uninitialize/dispatch interface
+as outlook_backend.OutlookBackend, so EmailMigrator can be run and measured on
+any platform.  Every call into a fake COM object is counted per category
+('dispatch', 'namespace', 'store', 'folder', 'folder_move', 'count',
+'enumerate', 'property', 'table', 'move') and can be slowed down with a configurable latency.  Calls can
+be made to fail at a given rate, and moves can raise the same throttling
+errors Exchange returns (SERVER_THROTTLE_ERRORS).
+
+Items are stored as compact records; a proxy object is only created when the
+migrator asks for one, just like a late-bound COM proxy.
+"""
+import random
+import re
+import threading
+import time
+from array import array
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+from outlook_backend import MAPI_E_NOT_FOUND, MAPI_E_OBJECT_CHANGED, RPC_E_DISCONNECTED, RPC_E_TIMEOUT, SERVER_THROTTLE_ERRORS
+
+# HRESULTs raised by the fake, matching what Outlook returns through pywin32
+E_FAIL = -2147467259
+DISP_E_EXCEPTION = -2147352567
+CO_E_NOTINITIALIZED = -2147221008
+THROTTLE_SCODE = SERVER_THROTTLE_ERRORS[1]
+
+OL_MAIL = 43
+ITEM_CLASSES = {
+    'IPM.Note': 43,
+    'IPM.Post': 45,
+    'IPM.Appointment': 26,
+    'IPM.Contact': 40,
+    'IPM.Task': 48,
+    'IPM.StickyNote': 44,
+    'IPM.Schedule.Meeting.Request': 53,
+    'REPORT.IPM.Note.NDR': 46,
+}
+
+# MAPI property tags accepted as table columns in addition to the plain names
+MESSAGE_ID_COLUMNS = (
+    'http://schemas.microsoft.com/mapi/proptag/0x1035001F',
+    'http://schemas.microsoft.com/mapi/proptag/0x1035001E',
+)
+
+SYNTHETIC_EPOCH = datetime(2015, 1, 1)
+
+
+class FakeComError(Exception):
+    """Mirrors pywintypes.com_error: args are (hresult, strerror, excepinfo, argerror)."""
+
+    def __init__(self, hresult, strerror, description=None, scode=None):
+        excepinfo = (0, 'Microsoft Outlook', description, None, 0, scode) if (description or scode) else None
+        super().__init__(hresult, strerror, excepinfo, None)
+
+
+def item_class_for(message_class):
+    """Map a MessageClass to the Outlook Class constant (olMail is 43)."""
+    while message_class:
+        if message_class in ITEM_CLASSES:
+            return ITEM_CLASSES[message_class]
+        if '.' not in message_class:
+            break
+        message_class = message_class.rsplit('.', 1)[0]
+    return OL_MAIL if message_class.startswith('IPM.Note') else 0
+
+
+class StoreRecord:
+    __slots__ = ('uid', 'display_name', 'file_path', 'root')
+
+    def __init__(self, uid, display_name, file_path):
+        self.uid = uid
+        self.display_name = display_name
+        self.file_path = file_path
+        self.root = None
+
+
+class FolderRecord:
+    __slots__ = ('uid', 'name', 'store', 'parent', 'items', 'children')
+
+    def __init__(self, uid, name, store, parent):
+        self.uid = uid
+        self.name = name
+        self.store = store
+        self.parent = parent
+        self.items = ItemList()
+        self.children = []
+
+    @property
+    def path(self):
+        parts = []
+        folder = self
+        while folder.parent is not None:
+            parts.append(folder.name)
+            folder = folder.parent
+        parts.append('\\\\' + self.store.display_name)
+        return '\\'.join(reversed(parts))
+
+
+class ItemRecord:
+    """One message.  Subject, sender and Message-ID are derived from seq."""
+    __slots__ = ('uid', 'seq', 'message_class', 'size', 'received', 'modified', 'folder', 'slot')
+
+    def __init__(self, uid, seq, message_class, size, received):
+        self.uid = uid
+        self.seq = seq
+        self.message_class = message_class
+        self.size = size
+        self.received = received
+        self.modified = received
+        self.folder = None
+        self.slot = None
+
+
+class ItemList:
+    """Ordered record container with O(log n) positional access and removal.
+
+    Removed slots become tombstones tracked by a Fenwick tree, so Items.Item(i)
+    and Move() stay cheap on million-item folders.
+    """
+
+    def __init__(self):
+        self._slots = []
+        self._tree = [0]
+        self._live = 0
+
+    def __len__(self):
+        return self._live
+
+    def __iter__(self):
+        for record in list(self._slots):
+            if record is not None and record.slot is not None:
+                yield record
+
+    def _prefix(self, index):
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def append(self, record):
+        record.slot = len(self._slots)
+        self._slots.append(record)
+        n = len(self._slots)
+        self._tree.append(1 + self._prefix(n - 1) - self._prefix(n - (n & -n)))
+        self._live += 1
+
+    def remove(self, record):
+        index = record.slot + 1
+        self._slots[record.slot] = None
+        record.slot = None
+        while index < len(self._tree):
+            self._tree[index] -= 1
+            index += index & -index
+        self._live -= 1
+        if len(self._slots) > 1024 and self._live < len(self._slots) // 2:
+            self._compact()
+
+    def kth(self, k):
+        """Return the k-th live record (1-based), or None."""
+        if k < 1 or k > self._live:
+            return None
+        pos = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = pos + step
+            if nxt < len(self._tree) and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return self._slots[pos]
+
+    def _compact(self):
+        live = [record for record in self._slots if record is not None]
+        self._slots = live
+        tree = [0] * (len(live) + 1)
+        for i, record in enumerate(live, 1):
+            record.slot = i - 1
+            tree[i] += 1
+            parent = i + (i & -i)
+            if parent <= len(live):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+
+def _parse_filter_value(raw):
+    raw = raw.strip()
+    if raw.startswith("'") and raw.endswith("'"):
+        text = raw[1:-1]
+        for fmt in ('%m/%d/%Y %I:%M %p', '%m/%d/%Y %H:%M', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        return text
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+_FILTER_CLAUSE = re.compile(r"\[([^\]]+)\]\s*(>=|<=|<>|=|>|<)\s*('[^']*'|\S+)")
+
+
+def compile_filter(text):
+    """Compile a Jet-style Restrict filter ("[Prop] op 'value' AND ...")."""
+    if not text:
+        return None
+    if text.startswith('@SQL='):
+        raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'DASL filters are not supported by the fake backend.', E_FAIL)
+    clauses = []
+    for part in re.split(r'\s+AND\s+', text.strip(), flags=re.IGNORECASE):
+        match = _FILTER_CLAUSE.fullmatch(part.strip().strip('()'))
+        if not match:
+            raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', f"Cannot parse filter condition '{part}'.", E_FAIL)
+        clauses.append((match.group(1), match.group(2), _parse_filter_value(match.group(3))))
+
+    def predicate(record):
+        for column, op, expected in clauses:
+            actual = column_value(record, column)
+            if isinstance(expected, datetime):
+                # Outlook compares dates at minute precision
+                actual = actual.replace(second=0, microsecond=0)
+            if op == '=' and not actual == expected:
+                return False
+            if op == '<>' and not actual != expected:
+                return False
+            if op == '>' and not actual > expected:
+                return False
+            if op == '>=' and not actual >= expected:
+                return False
+            if op == '<' and not actual < expected:
+                return False
+            if op == '<=' and not actual <= expected:
+                return False
+        return True
+
+    return predicate
+
+
+def column_value(record, column):
+    """Return the value Outlook would report for a property/column of an item."""
+    if column == 'EntryID':
+        return f"{record.uid:032X}"
+    if column == 'Subject':
+        return f"Synthetic message {record.seq}"
+    if column == 'SenderName':
+        return f"Sender {record.seq % 997}"
+    if column == 'ReceivedTime':
+        return SYNTHETIC_EPOCH + timedelta(seconds=record.received)
+    if column == 'SentOn':
+        return SYNTHETIC_EPOCH + timedelta(seconds=record.received - 60)
+    if column == 'CreationTime':
+        return SYNTHETIC_EPOCH + timedelta(seconds=record.received)
+    if column == 'LastModificationTime':
+        return SYNTHETIC_EPOCH + timedelta(seconds=record.modified)
+    if column == 'Size':
+        return record.size
+    if column == 'MessageClass':
+        return record.message_class
+    if column in MESSAGE_ID_COLUMNS:
+        return f"<{record.seq}.synthetic@example.com>"
+    raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', f"Unknown property '{column}'.", E_FAIL)
+
+
+class FakeOutlookBackend:
+    """Pure-Python Outlook backend with call counting, latency and fault injection.
+
+    latency          default seconds slept per call
+    latencies        per-category overrides, e.g. {'move': 0.002}
+    failure_rates    per-category probability of raising a generic COM error
+    throttle_rate    probability that a Move() raises a throttling error
+    throttle_every   raise a throttling error on every N-th Move()
+    max_moves_per_second  throttle Move() calls beyond this rate, like an Exchange budget
+    disconnect_every drop the connection on every N-th Move(); every call then fails with
+                     RPC_E_DISCONNECTED until the next dispatch() reconnects
+    locked_rate      probability that a Move() fails with MAPI_E_OBJECT_CHANGED, as when
+                     a sync holds the item; the next attempt may well succeed
+
+    mark_reply_lost() makes a Move() complete and still raise RPC_E_TIMEOUT, as when the
+    server carried out the call but its reply never arrived. With folder_move_item_limit,
+    Folder.MoveTo() creates the destination folder, moves that many of the folder's own
+    items into it and then fails, as a move cut off partway.
+    """
+
+    def __init__(self, latency=0.0, latencies=None, failure_rates=None,
+                 throttle_rate=0.0, throttle_every=0, max_moves_per_second=None, disconnect_every=0, locked_rate=0.0, seed=0):
+        self.latency = latency
+        self.latencies = dict(latencies or {})
+        self.failure_rates = dict(failure_rates or {})
+        self.throttle_rate = throttle_rate
+        self.throttle_every = throttle_every
+        self.max_moves_per_second = max_moves_per_second
+        self.disconnect_every = disconnect_every
+        self.locked_rate = locked_rate
+        self._locked_uids = Counter()
+        self._reply_lost_uids = set()
+        self.folder_move_item_limit = None
+        self.connected = True
+        self._recent_moves = deque()
+        self.calls = Counter()
+        self.moves_attempted = 0
+        self.lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._thread_state = threading.local()
+        self._next_uid = 1
+        self._next_seq = 1
+        self._failing_uids = set()
+        self.stores = []
+        self.closed_stores = {}     # Lower-cased file path -> StoreRecord of PSTs not open in the profile
+        self.folders = {}
+        self.items = {}
+
+    # --- backend interface ---
+
+    def initialize(self):
+        self._thread_state.depth = getattr(self._thread_state, 'depth', 0) + 1
+
+    def uninitialize(self):
+        self._thread_state.depth = max(getattr(self._thread_state, 'depth', 0) - 1, 0)
+
+    def dispatch(self):
+        if not getattr(self._thread_state, 'depth', 0):
+            raise FakeComError(CO_E_NOTINITIALIZED, 'CoInitialize has not been called.')
+        self.connected = True
+        self.call('dispatch')
+        return FakeApplication(self)
+
+    def disconnect(self):
+        """Simulate a dropped RPC connection to Outlook."""
+        self.connected = False
+
+    def open_pst(self, namespace, path):
+        namespace.AddStore(path)
+
+    # --- instrumentation ---
+
+    def call(self, category):
+        """Account for one COM round trip and apply latency/failure injection."""
+        with self.lock:
+            self.calls[category] += 1
+            fail = self.failure_rates.get(category, 0) and self._random.random() < self.failure_rates[category]
+        delay = self.latencies.get(category, self.latency)
+        if delay:
+            time.sleep(delay)
+        if not self.connected:
+            raise FakeComError(RPC_E_DISCONNECTED, 'The object invoked has disconnected from its clients.')
+        if fail:
+            raise FakeComError(E_FAIL, 'Unspecified error')
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.moves_attempted = 0
+
+    def mark_failing(self, entry_id):
+        """Make every Move() of the given item fail."""
+        self._failing_uids.add(int(entry_id, 16))
+
+    def mark_locked(self, entry_id, attempts=1):
+        """Make the next `attempts` Move() calls of the given item fail as if a sync held it."""
+        self._locked_uids[int(entry_id, 16)] += attempts
+
+    def mark_reply_lost(self, entry_id):
+        """Make the next Move() of the given item go through but raise a timeout."""
+        self._reply_lost_uids.add(int(entry_id, 16))
+
+    # --- world building ---
+
+    def _uid(self):
+        uid = self._next_uid
+        self._next_uid += 1
+        return uid
+
+    def add_store(self, display_name, file_path='', opened=True):
+        """A store in the profile; with opened=False a PST file that AddStore() can open later."""
+        with self.lock:
+            store = StoreRecord(self._uid(), display_name, file_path)
+            store.root = FolderRecord(self._uid(), display_name, store, None)
+            self.folders[store.root.uid] = store.root
+            if opened:
+                self.stores.append(store)
+            else:
+                self.closed_stores[file_path.lower()] = store
+            return store
+
+    def add_folder(self, parent, name):
+        with self.lock:
+            folder = FolderRecord(self._uid(), name, parent.store, parent)
+            parent.children.append(folder)
+            self.folders[folder.uid] = folder
+            return folder
+
+    def add_mailbox(self, display_name, folder_names=('Inbox', 'Sent Items', 'Deleted Items')):
+        store = self.add_store(display_name)
+        for name in folder_names:
+            self.add_folder(store.root, name)
+        return store
+
+    def add_items(self, folder, count, message_class='IPM.Note', size=None):
+        with self.lock:
+            for _ in range(count):
+                seq = self._next_seq
+                self._next_seq += 1
+                record = ItemRecord(
+                    self._uid(), seq, message_class,
+                    size if size is not None else self._random.randint(2_000, 150_000),
+                    seq * 37
+                )
+                self._place(record, folder)
+
+    def build_synthetic_pst(self, display_name, item_count, depth=2, fanout=3,
+                            non_mail_ratio=0.0, file_path=None, opened=True):
+        """Create a PST store with a folder tree of the given depth/fanout and spread item_count over it."""
+        store = self.add_store(display_name, file_path or f"C:\\PST\\{display_name}.pst", opened)
+        folders = []
+        level = [store.root]
+        for d in range(depth):
+            next_level = []
+            for parent in level:
+                for i in range(fanout):
+                    next_level.append(self.add_folder(parent, f"Folder {d + 1}.{i + 1}"))
+            folders.extend(next_level)
+            level = next_level
+        if not folders:
+            folders = [store.root]
+
+        per_folder, remainder = divmod(item_count, len(folders))
+        for i, folder in enumerate(folders):
+            count = per_folder + (1 if i < remainder else 0)
+            non_mail = int(count * non_mail_ratio)
+            self.add_items(folder, count - non_mail)
+            if non_mail:
+                self.add_items(folder, non_mail, message_class='IPM.Appointment')
+        return store
+
+    def _place(self, record, folder):
+        record.folder = folder
+        folder.items.append(record)
+        self.items[record.uid] = record
+
+    # --- operations used by the proxies ---
+
+    def move_item(self, record, destination):
+        with self.lock:
+            self.moves_attempted += 1
+            attempt = self.moves_attempted
+            if self.disconnect_every and attempt % self.disconnect_every == 0:
+                self.connected = False
+                raise FakeComError(RPC_E_DISCONNECTED, 'The object invoked has disconnected from its clients.')
+            throttled = (self.throttle_every and attempt % self.throttle_every == 0) or (
+                self.throttle_rate and self._random.random() < self.throttle_rate)
+            locked = self.locked_rate and self._random.random() < self.locked_rate
+            if self._locked_uids[record.uid] > 0:
+                self._locked_uids[record.uid] -= 1
+                locked = True
+            if self.max_moves_per_second:
+                now = time.monotonic()
+                while self._recent_moves and now - self._recent_moves[0] > 1.0:
+                    self._recent_moves.popleft()
+                if len(self._recent_moves) >= self.max_moves_per_second:
+                    throttled = True
+                else:
+                    self._recent_moves.append(now)
+        if throttled:
+            raise FakeComError(
+                DISP_E_EXCEPTION, 'Exception occurred.',
+                'Your server administrator has limited the number of items you can open simultaneously.',
+                THROTTLE_SCODE
+            )
+        if locked:
+            raise FakeComError(
+                DISP_E_EXCEPTION, 'Exception occurred.',
+                'The operation cannot be performed because the message has been changed.',
+                MAPI_E_OBJECT_CHANGED
+            )
+        with self.lock:
+            if record.folder is None:
+                raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'The item has been moved or deleted.', MAPI_E_NOT_FOUND)
+            if record.uid in self._failing_uids:
+                raise FakeComError(E_FAIL, 'Unspecified error')
+            reply_lost = record.uid in self._reply_lost_uids
+            self._reply_lost_uids.discard(record.uid)
+            record.folder.items.remove(record)
+            if destination.store is not record.folder.store:
+                # Cross-store moves produce a new EntryID, as in MAPI
+                del self.items[record.uid]
+                record.uid = self._uid()
+            record.modified = (datetime.now() - SYNTHETIC_EPOCH).total_seconds()
+            self._place(record, destination)
+        if reply_lost:
+            raise FakeComError(RPC_E_TIMEOUT, 'This operation returned because the timeout period expired.')
+        return record
+
+    def move_folder(self, folder, destination):
+        with self.lock:
+            if any(child.name == folder.name for child in destination.children):
+                raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'A folder with this name already exists.', E_FAIL)
+            parent = destination
+            while parent is not None:
+                if parent is folder:
+                    raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'Cannot move a folder into itself.', E_FAIL)
+                parent = parent.parent
+            if self.folder_move_item_limit is not None:
+                partial = self.add_folder(destination, folder.name)
+                for record in list(folder.items)[:self.folder_move_item_limit]:
+                    folder.items.remove(record)
+                    if folder.store is not destination.store:
+                        del self.items[record.uid]
+                        record.uid = self._uid()
+                    self._place(record, partial)
+                raise FakeComError(RPC_E_TIMEOUT, 'This operation returned because the timeout period expired.')
+            folder.parent.children.remove(folder)
+            folder.parent = destination
+            destination.children.append(folder)
+            if folder.store is not destination.store:
+                self._rehome(folder, destination.store)
+
+    def copy_folder(self, folder, destination):
+        with self.lock:
+            copy = self.add_folder(destination, folder.name)
+            for record in folder.items:
+                clone = ItemRecord(self._uid(), record.seq, record.message_class, record.size, record.received)
+                self._place(clone, copy)
+            for child in list(folder.children):
+                self.copy_folder(child, copy)
+            return copy
+
+    def _rehome(self, folder, store):
+        """Give a subtree moved to another store new EntryIDs, as MAPI does."""
+        del self.folders[folder.uid]
+        folder.uid = self._uid()
+        folder.store = store
+        self.folders[folder.uid] = folder
+        for record in folder.items:
+            del self.items[record.uid]
+            record.uid = self._uid()
+            self.items[record.uid] = record
+        for child in folder.children:
+            self._rehome(child, store)
+
+    def live_record(self, record):
+        if record.folder is None:
+            raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'The item has been moved or deleted.', MAPI_E_NOT_FOUND)
+        return record
+
+    def find_store(self, store_id):
+        for store in self.stores:
+            if f"{store.uid:032X}" == store_id:
+                return store
+        return None
+
+
+class FakeApplication:
+    def __init__(self, backend):
+        self._backend = backend
+        self._namespace = FakeNamespace(backend)
+
+    def GetNamespace(self, name):
+        self._backend.call('namespace')
+        return self._namespace
+
+    @property
+    def Session(self):
+        return self._namespace
+
+
+class FakeNamespace:
+    def __init__(self, backend):
+        self._backend = backend
+
+    @property
+    def CurrentProfileName(self):
+        self._backend.call('namespace')
+        return 'Outlook'
+
+    @property
+    def Stores(self):
+        self._backend.call('namespace')
+        return FakeStores(self._backend)
+
+    @property
+    def Folders(self):
+        self._backend.call('namespace')
+        return FakeFolders(self._backend, None)
+
+    def GetDefaultFolder(self, folder_type):
+        self._backend.call('namespace')
+        for store in self._backend.stores:
+            if not store.file_path:
+                for child in store.root.children:
+                    if child.name == 'Inbox':
+                        return FakeFolder(self._backend, child)
+        raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'The default folder could not be found.', MAPI_E_NOT_FOUND)
+
+    def GetFolderFromID(self, entry_id, store_id=None):
+        self._backend.call('namespace')
+        folder = self._backend.folders.get(int(entry_id, 16))
+        if folder is None:
+            raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'The folder could not be found.', MAPI_E_NOT_FOUND)
+        return FakeFolder(self._backend, folder)
+
+    def GetStoreFromID(self, store_id):
+        self._backend.call('namespace')
+        store = self._backend.find_store(store_id)
+        if store is None:
+            raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'The store could not be found.', MAPI_E_NOT_FOUND)
+        return FakeStore(self._backend, store)
+
+    def GetItemFromID(self, entry_id, store_id=None):
+        self._backend.call('namespace')
+        record = self._backend.items.get(int(entry_id, 16))
+        if record is None:
+            raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'The item could not be found.', MAPI_E_NOT_FOUND)
+        return FakeMailItem(self._backend, record)
+
+    def AddStore(self, path):
+        # Unlike Outlook, which would create a new PST, an unknown path is an error
+        self._backend.call('namespace')
+        with self._backend.lock:
+            store = self._backend.closed_stores.pop(path.lower(), None)
+            if store is None:
+                raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', f'The file {path} could not be found.', MAPI_E_NOT_FOUND)
+            self._backend.stores.append(store)
+
+    def RemoveStore(self, folder):
+        self._backend.call('namespace')
+        with self._backend.lock:
+            store = folder._record.store
+            if store in self._backend.stores:
+                self._backend.stores.remove(store)
+                self._backend.closed_stores[store.file_path.lower()] = store
+
+
+class FakeStores:
+    def __init__(self, backend):
+        self._backend = backend
+
+    @property
+    def Count(self):
+        self._backend.call('store')
+        return len(self._backend.stores)
+
+    def Item(self, index):
+        self._backend.call('store')
+        return FakeStore(self._backend, self._backend.stores[index - 1])
+
+    def __iter__(self):
+        for store in list(self._backend.stores):
+            self._backend.call('store')
+            yield FakeStore(self._backend, store)
+
+    def __len__(self):
+        return self.Count
+
+
+class FakeStore:
+    def __init__(self, backend, record):
+        self._backend = backend
+        self._record = record
+
+    @property
+    def DisplayName(self):
+        self._backend.call('store')
+        return self._record.display_name
+
+    @property
+    def FilePath(self):
+        self._backend.call('store')
+        return self._record.file_path
+
+    @property
+    def StoreID(self):
+        self._backend.call('store')
+        return f"{self._record.uid:032X}"
+
+    @property
+    def IsDataFileStore(self):
+        self._backend.call('store')
+        return bool(self._record.file_path)
+
+    def GetRootFolder(self):
+        self._backend.call('store')
+        return FakeFolder(self._backend, self._record.root)
+
+
+class FakeFolders:
+    def __init__(self, backend, parent):
+        self._backend = backend
+        self._parent = parent
+
+    def _children(self):
+        if self._parent is None:
+            return [store.root for store in self._backend.stores]
+        return self._parent.children
+
+    @property
+    def Count(self):
+        self._backend.call('folder')
+        return len(self._children())
+
+    def Item(self, key):
+        self._backend.call('folder')
+        children = self._children()
+        if isinstance(key, int):
+            if 1 <= key <= len(children):
+                return FakeFolder(self._backend, children[key - 1])
+        else:
+            for child in children:
+                if child.name == key:
+                    return FakeFolder(self._backend, child)
+        raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.',
+                           'The attempted operation failed.  An object could not be found.', MAPI_E_NOT_FOUND)
+
+    __getitem__ = Item
+
+    def Add(self, name, folder_type=None):
+        self._backend.call('folder')
+        for child in self._children():
+            if child.name == name:
+                raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'Cannot create the folder.', E_FAIL)
+        return FakeFolder(self._backend, self._backend.add_folder(self._parent, name))
+
+    def __iter__(self):
+        for child in list(self._children()):
+            self._backend.call('folder')
+            yield FakeFolder(self._backend, child)
+
+    def __len__(self):
+        return self.Count
+
+
+class FakeFolder:
+    def __init__(self, backend, record):
+        self._backend = backend
+        self._record = record
+
+    @property
+    def Name(self):
+        self._backend.call('folder')
+        return self._record.name
+
+    @property
+    def FolderPath(self):
+        self._backend.call('folder')
+        return self._record.path
+
+    @property
+    def EntryID(self):
+        self._backend.call('folder')
+        return f"{self._record.uid:032X}"
+
+    @property
+    def StoreID(self):
+        self._backend.call('folder')
+        return f"{self._record.store.uid:032X}"
+
+    @property
+    def Store(self):
+        self._backend.call('folder')
+        return FakeStore(self._backend, self._record.store)
+
+    @property
+    def Session(self):
+        self._backend.call('folder')
+        return FakeNamespace(self._backend)
+
+    @property
+    def Parent(self):
+        self._backend.call('folder')
+        if self._record.parent is None:
+            return FakeNamespace(self._backend)
+        return FakeFolder(self._backend, self._record.parent)
+
+    @property
+    def Items(self):
+        self._backend.call('folder')
+        return FakeItems(self._backend, self._record)
+
+    @property
+    def Folders(self):
+        self._backend.call('folder')
+        return FakeFolders(self._backend, self._record)
+
+    def MoveTo(self, DestinationFolder):
+        self._backend.call('folder_move')
+        self._backend.move_folder(self._record, DestinationFolder._record)
+
+    def CopyTo(self, DestinationFolder):
+        self._backend.call('folder_move')
+        return FakeFolder(self._backend, self._backend.copy_folder(self._record, DestinationFolder._record))
+
+    def GetTable(self, Filter='', TableContents=0):
+        self._backend.call('table')
+        predicate = compile_filter(Filter)
+        with self._backend.lock:
+            uids = array('Q', (r.uid for r in self._record.items if predicate is None or predicate(r)))
+        return FakeTable(self._backend, self._record, uids)
+
+
+class FakeItems:
+    """Live view over a folder's items, optionally restricted/sorted to a snapshot of uids."""
+
+    def __init__(self, backend, folder, view=None):
+        self._backend = backend
+        self._folder = folder
+        self._view = view
+        self._cursor = 0
+
+    def _records(self):
+        if self._view is None:
+            return self._folder.items
+        items = self._backend.items
+        return [items[uid] for uid in self._view
+                if uid in items and items[uid].folder is self._folder]
+
+    @property
+    def Count(self):
+        self._backend.call('count')
+        with self._backend.lock:
+            return len(self._records())
+
+    def _at(self, index):
+        with self._backend.lock:
+            if self._view is None:
+                return self._folder.items.kth(index)
+            records = self._records()
+            return records[index - 1] if 1 <= index <= len(records) else None
+
+    def Item(self, index):
+        self._backend.call('enumerate')
+        record = self._at(index)
+        if record is None:
+            raise FakeComError(DISP_E_EXCEPTION, 'Exception occurred.', 'Array index out of bounds.', E_FAIL)
+        return FakeMailItem(self._backend, record)
+
+    def GetFirst(self):
+        self._cursor = 0
+        return self.GetNext()
+
+    def GetNext(self):
+        self._backend.call('enumerate')
+        self._cursor += 1
+        record = self._at(self._cursor)
+        return FakeMailItem(self._backend, record) if record is not None else None
+
+    def Restrict(self, Filter):
+        self._backend.call('enumerate')
+        predicate = compile_filter(Filter)
+        with self._backend.lock:
+            uids = array('Q', (r.uid for r in self._records() if predicate is None or predicate(r)))
+        return FakeItems(self._backend, self._folder, uids)
+
+    def Sort(self, Property, Descending=False):
+        self._backend.call('enumerate')
+        column = Property.strip('[]')
+        with self._backend.lock:
+            ordered = sorted(self._records(), key=lambda r: column_value(r, column), reverse=bool(Descending))
+            self._view = array('Q', (r.uid for r in ordered))
+
+    def __iter__(self):
+        index = 1
+        while True:
+            self._backend.call('enumerate')
+            record = self._at(index)
+            if record is None:
+                return
+            yield FakeMailItem(self._backend, record)
+            index += 1
+
+    def __len__(self):
+        return self.Count
+
+
+class FakeMailItem:
+    def __init__(self, backend, record):
+        self._backend = backend
+        self._record = record
+
+    def _get(self, column):
+        self._backend.call('property')
+        with self._backend.lock:
+            return column_value(self._backend.live_record(self._record), column)
+
+    @property
+    def Class(self):
+        self._backend.call('property')
+        return item_class_for(self._record.message_class)
+
+    @property
+    def MessageClass(self):
+        return self._get('MessageClass')
+
+    @property
+    def Subject(self):
+        return self._get('Subject')
+
+    @property
+    def SentOn(self):
+        return self._get('SentOn')
+
+    @property
+    def ReceivedTime(self):
+        return self._get('ReceivedTime')
+
+    @property
+    def SenderName(self):
+        return self._get('SenderName')
+
+    @property
+    def EntryID(self):
+        return self._get('EntryID')
+
+    @property
+    def Size(self):
+        return self._get('Size')
+
+    @property
+    def LastModificationTime(self):
+        return self._get('LastModificationTime')
+
+    @property
+    def Parent(self):
+        self._backend.call('property')
+        return FakeFolder(self._backend, self._backend.live_record(self._record).folder)
+
+    @property
+    def PropertyAccessor(self):
+        return FakePropertyAccessor(self)
+
+    def Move(self, destination):
+        self._backend.call('move')
+        record = self._backend.move_item(self._record, destination._record)
+        return FakeMailItem(self._backend, record)
+
+
+class FakePropertyAccessor:
+    def __init__(self, item):
+        self._item = item
+
+    def GetProperty(self, SchemaName):
+        return self._item._get(SchemaName)
+
+
+class FakeColumns:
+    def __init__(self, table):
+        self._table = table
+
+    @property
+    def Count(self):
+        return len(self._table.columns)
+
+    def Add(self, name):
+        self._table._backend.call('table')
+        column_value(ItemRecord(0, 0, 'IPM.Note', 0, 0), name)
+        self._table.columns.append(name)
+
+    def RemoveAll(self):
+        self._table._backend.call('table')
+        self._table.columns.clear()
+
+
+class FakeRow:
+    def __init__(self, columns, values):
+        self._columns = columns
+        self._values = values
+
+    def Item(self, key):
+        if isinstance(key, int):
+            return self._values[key - 1]
+        return self._values[self._columns.index(key)]
+
+    __call__ = Item
+
+    def GetValues(self):
+        return tuple(self._values)
+
+
+class FakeTable:
+    """Snapshot of a folder's rows.  GetArray returns up to N rows in one round trip."""
+
+    DEFAULT_COLUMNS = ['EntryID', 'Subject', 'CreationTime', 'LastModificationTime', 'MessageClass']
+
+    def __init__(self, backend, folder, uids):
+        self._backend = backend
+        self._folder = folder
+        self._uids = uids
+        self._position = 0
+        self.columns = list(self.DEFAULT_COLUMNS)
+
+    @property
+    def Columns(self):
+        return FakeColumns(self)
+
+    @property
+    def EndOfTable(self):
+        self._backend.call('table')
+        return self._position >= len(self._uids)
+
+    def GetRowCount(self):
+        self._backend.call('table')
+        return len(self._uids)
+
+    def MoveToStart(self):
+        self._backend.call('table')
+        self._position = 0
+
+    def _next_values(self):
+        items = self._backend.items
+        while self._position < len(self._uids):
+            record = items.get(self._uids[self._position])
+            self._position += 1
+            if record is not None and record.folder is self._folder:
+                return tuple(column_value(record, column) for column in self.columns)
+        return None
+
+    def GetNextRow(self):
+        self._backend.call('table')
+        with self._backend.lock:
+            values = self._next_values()
+        return FakeRow(self.columns, values) if values is not None else None
+
+    def GetArray(self, MaxRows):
+        self._backend.call('table')
+        rows = []
+        with self._backend.lock:
+            while len(rows) < MaxRows:
+                values = self._next_values()
+                if values is None:
+                    break
+                rows.append(values)
+        return tuple(rows)
+
+    def Restrict(self, Filter):
+        self._backend.call('table')
+        predicate = compile_filter(Filter)
+        items = self._backend.items
+        with self._backend.lock:
+            uids = array('Q', (uid for uid in self._uids
+                               if uid in items and (predicate is None or predicate(items[uid]))))
+        table = FakeTable(self._backend, self._folder, uids)
+        table.columns = list(self.columns)
+        return table
+
+    def Sort(self, SortProperty, Descending=False):
+        self._backend.call('table')
+        column = SortProperty.strip('[]')
+        items = self._backend.items
+        with self._backend.lock:
+            live = [items[uid] for uid in self._uids if uid in items]
+            live.sort(key=lambda r: column_value(r, column), reverse=bool(Descending))
+            self._uids = array('Q', (r.uid for r in live))
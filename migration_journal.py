@@ -0,0 +1,204 @@
+"""
+Durable checkpoint journal for EmailMigrator.
+
+Every item is recorded as 'planned' before its move and 'moved' or 'failed'
+after it, and every folder whose items all moved is recorded as 'done'.  The
+journal is an append-only SQLite database in WAL mode; writes are buffered and
+committed in batches so they never become a per-item cost.
+
+Losing the last unflushed batch in a crash is harmless: items that were moved
+are no longer in the source, and items that were not are simply attempted
+again on resume.
+
+The same database holds the retry queue: items whose move failed with a
+throttling or transient error, with their attempt count and the time of their
+next attempt.  Queue changes are written immediately, so deferred items
+survive a crash and are picked up again by the next run.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+ITEM_PLANNED = 'planned'
+ITEM_MOVED = 'moved'
+ITEM_FAILED = 'failed'
+ITEM_DEFERRED = 'deferred'
+FOLDER_DONE = 'done'
+
+
+class MigrationJournal:
+    """Append-only SQLite journal of item and folder outcomes, keyed on PST and EntryID."""
+
+    FLUSH_EVERY = 1000      # Buffered events that trigger a commit
+    FLUSH_SECONDS = 5.0     # Maximum age of buffered events before a commit
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS item_events (
+                pst TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                entry_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                recorded_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_item_events_lookup ON item_events (pst, entry_id, status);
+            CREATE TABLE IF NOT EXISTS folder_events (
+                pst TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                status TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_folder_events_lookup ON folder_events (pst, folder, status);
+            CREATE TABLE IF NOT EXISTS retry_queue (
+                pst TEXT NOT NULL,
+                pst_display_name TEXT,
+                folder TEXT NOT NULL,
+                store_id TEXT NOT NULL,
+                entry_id TEXT NOT NULL,
+                target_entry_id TEXT NOT NULL,
+                target_store_id TEXT NOT NULL,
+                subject TEXT,
+                fingerprint TEXT,
+                error_class TEXT NOT NULL,
+                last_error TEXT,
+                attempts INTEGER NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                run_id TEXT,
+                PRIMARY KEY (pst, entry_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_retry_queue_due ON retry_queue (next_attempt_at);
+        ''')
+        logging.info(f"Migration journal: {path}")
+
+    def record_item(self, pst, folder, entry_id, status, error=None):
+        """Buffer one item event; commits when the batch is full or old enough."""
+        with self._lock:
+            self._pending.append((pst, folder, entry_id, status, error, time.time()))
+            due = (len(self._pending) >= self.FLUSH_EVERY or
+                   time.monotonic() - self._last_flush >= self.FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def mark_folder_done(self, pst, folder):
+        """Record that every item of a folder (not its subfolders) has been moved."""
+        self.flush()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO folder_events (pst, folder, status, recorded_at) VALUES (?, ?, ?, ?)',
+                (pst, folder, FOLDER_DONE, time.time())
+            )
+
+    def is_folder_done(self, pst, folder):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM folder_events WHERE pst = ? AND folder = ? AND status = ? LIMIT 1',
+                (pst, folder, FOLDER_DONE)
+            ).fetchone() is not None
+
+    def is_item_done(self, pst, entry_id):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT 1 FROM item_events WHERE pst = ? AND entry_id = ? AND status = ? LIMIT 1',
+                (pst, entry_id, ITEM_MOVED)
+            ).fetchone() is not None
+
+    def moved_item_counts(self, since, until):
+        """Number of distinct items recorded as moved between two times (epoch seconds), per PST."""
+        with self._lock:
+            return dict(self._conn.execute(
+                'SELECT pst, COUNT(DISTINCT entry_id) FROM item_events '
+                'WHERE status = ? AND recorded_at >= ? AND recorded_at < ? GROUP BY pst',
+                (ITEM_MOVED, since, until)
+            ).fetchall())
+
+    def enqueue_retry(self, entry, delay):
+        """Add or update a retry queue entry (a dict with the retry_queue columns), due in delay seconds."""
+        entry = {**entry, 'next_attempt_at': time.time() + delay}
+        columns = ', '.join(entry)
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO retry_queue ({columns}) VALUES ({", ".join("?" * len(entry))})',
+                tuple(entry.values())
+            )
+
+    def claim_due_retries(self, limit, lease_seconds, psts=None):
+        """
+        Return up to limit entries that are due, oldest first, and push their next attempt
+        lease_seconds into the future so that no other worker picks them up meanwhile.
+        psts, if given, limits this to the entries of those PSTs.
+        """
+        now = time.time()
+        scope, params = self._retry_scope(psts)
+        with self._lock:
+            cursor = self._conn.execute(
+                f'SELECT * FROM retry_queue WHERE next_attempt_at <= ?{scope} ORDER BY next_attempt_at LIMIT ?',
+                (now, *params, limit)
+            )
+            names = [column[0] for column in cursor.description]
+            entries = [dict(zip(names, row)) for row in cursor.fetchall()]
+            self._conn.executemany(
+                'UPDATE retry_queue SET next_attempt_at = ? WHERE pst = ? AND entry_id = ?',
+                [(now + lease_seconds, entry['pst'], entry['entry_id']) for entry in entries]
+            )
+        return entries
+
+    def queued_retry_keys(self, psts=None):
+        """(pst, entry_id) of every queued entry, or of the entries of the given PSTs."""
+        scope, params = self._retry_scope(psts)
+        with self._lock:
+            return set(self._conn.execute(f'SELECT pst, entry_id FROM retry_queue WHERE 1{scope}', params).fetchall())
+
+    def remove_retry(self, pst, entry_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM retry_queue WHERE pst = ? AND entry_id = ?', (pst, entry_id))
+
+    def pending_retries(self, psts=None):
+        """(number of queued entries, time of the earliest next attempt or None), optionally of the given PSTs."""
+        scope, params = self._retry_scope(psts)
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT COUNT(*), MIN(next_attempt_at) FROM retry_queue WHERE 1{scope}', params
+            ).fetchone()
+
+    @staticmethod
+    def _retry_scope(psts):
+        """SQL condition (to append after WHERE ...) and parameters limiting the retry queue to psts."""
+        if psts is None:
+            return '', ()
+        psts = tuple(psts)
+        return f' AND pst IN ({", ".join("?" * len(psts))})', psts
+
+    def flush(self):
+        """Commit all buffered events in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            if not pending:
+                return
+            try:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(
+                    'INSERT INTO item_events (pst, folder, entry_id, status, error, recorded_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    pending
+                )
+                self._conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                logging.error(f"Failed to write {len(pending)} journal events: {e}", exc_info=True)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
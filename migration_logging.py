@@ -0,0 +1,154 @@
+"""
+Queue-based logging for the migrators.
+
+The calling thread only enqueues log records; all file and console I/O
+happen on a background QueueListener thread.  As with the standard
+QueueHandler, the message and any traceback are rendered before the record
+is queued, so a record never holds on to the (COM) objects its arguments
+refer to.  Per-item DEBUG messages are written with %-style arguments and
+cost almost nothing when DEBUG is disabled.
+ProgressReporter replaces per-item INFO lines with periodic, rate-limited
+progress lines (items/sec and ETA).
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+_listener = None
+_queue_handler = None
+
+
+class TimedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that can report how long each record took to enqueue. prepare() is the
+    standard one: msg and exc_text are formatted here, args, exc_info and exc_text cleared.
+    """
+
+    observer = None     # Optional callable(seconds) told how long each record took to enqueue
+
+    def emit(self, record):
+        if self.observer is None:
+            super().emit(record)
+            return
+        started = time.perf_counter()
+        super().emit(record)
+        self.observer(time.perf_counter() - started)
+
+
+def setup_queue_logging(log_filename, verbose=False, console=True):
+    """
+    Route all logging through one queue to a single file handler and, optionally,
+    a single console handler. Replaces any handlers installed by a previous call.
+    """
+    global _listener, _queue_handler
+    stop_logging()
+
+    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG if verbose else logging.INFO)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(threadName)s - %(levelname)s - %(message)s'))
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = TimedQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Drain the queue, close the handlers and detach them from the root logger."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
+
+
+def observe_logging(observer):
+    """Report the time the logging calls of the current setup spend enqueuing records (None to stop)."""
+    if _queue_handler is not None:
+        _queue_handler.observer = observer
+
+
+class ProgressReporter:
+    """Counts moves from any thread and logs at most one progress line per interval."""
+
+    def __init__(self, interval_seconds=10.0, total=None):
+        self.interval_seconds = interval_seconds
+        self.total = total
+        self.moved = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._next_report = self._started + interval_seconds
+
+    def start(self, total=None):
+        """Reset the counters and clock; total enables the ETA."""
+        with self._lock:
+            self.total = total
+            self.moved = 0
+            self.failed = 0
+            self._started = time.monotonic()
+            self._next_report = self._started + self.interval_seconds
+
+    def update(self, moved=0, failed=0):
+        with self._lock:
+            self.moved += moved
+            self.failed += failed
+            now = time.monotonic()
+            if now < self._next_report:
+                return
+            self._next_report = now + self.interval_seconds
+            line = self._format(now)
+        logging.info(line)
+
+    def snapshot(self):
+        """Counters and overall rate so far, for metrics exports."""
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {
+                'items_moved': self.moved,
+                'items_failed': self.failed,
+                'items_total': self.total or 0,
+                'items_per_second': round((self.moved + self.failed) / elapsed, 3),
+            }
+
+    def finish(self):
+        with self._lock:
+            line = self._format(time.monotonic())
+        logging.info(f"Final {line[0].lower()}{line[1:]}")
+
+    def _format(self, now):
+        elapsed = max(now - self._started, 1e-9)
+        done = self.moved + self.failed
+        rate = done / elapsed
+        line = f"Progress: {self.moved:,} moved, {self.failed:,} failed | {rate:,.1f} items/s | elapsed {_hms(elapsed)}"
+        if self.total:
+            remaining = max(self.total - done, 0)
+            eta = _hms(remaining / rate) if rate > 0 else 'unknown'
+            line += f" | {done / self.total:.1%} done, ETA {eta} ({remaining:,} remaining)"
+        return line
+
+
+def _hms(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
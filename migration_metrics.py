@@ -0,0 +1,299 @@
+"""
+Run-time metrics for the migrators.
+
+MigrationMetrics times every category of COM call EmailMigrator makes (Move(),
+item opens, table reads, Items.Count, folder enumeration, ...) into
+log-bucketed latency histograms and keeps per-folder throughput.  A
+background thread exports a snapshot every export_interval seconds as JSON
+and as Prometheus text (for the node_exporter textfile collector), so a slow
+run can be diagnosed while it is still going; the final snapshot goes into
+the migration report.  SamplingProfiler is an optional hook for long runs: it
+samples the stacks of all threads and writes them in collapsed-stack format.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Histogram buckets: 4 per power of two from 1 microsecond, the last one open-ended (~10 minutes and up)
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 120
+BUCKET_FLOOR = 1e-6
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _bucket_upper_bound(index):
+    return BUCKET_FLOOR * 2 ** ((index + 1) / BUCKETS_PER_OCTAVE)
+
+
+class LatencyHistogram:
+    """Fixed log-scale histogram of durations in seconds; quantiles are accurate to about 19%."""
+
+    __slots__ = ('buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, seconds):
+        if seconds <= BUCKET_FLOOR:
+            index = 0
+        else:
+            index = min(int(math.log2(seconds / BUCKET_FLOOR) * BUCKETS_PER_OCTAVE), BUCKET_COUNT - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile, capped at the largest observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else None,
+            'min': round(self.min, 6) if self.min is not None else None,
+            'max': round(self.max, 6),
+            **{f"p{int(q * 100)}": _round(self.quantile(q)) for q in QUANTILES},
+        }
+
+
+def _round(value):
+    return round(value, 6) if value is not None else None
+
+
+class _Timer:
+    __slots__ = ('metrics', 'category', 'started')
+
+    def __init__(self, metrics, category):
+        self.metrics = metrics
+        self.category = category
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.category, time.perf_counter() - self.started)
+
+
+class MigrationMetrics:
+    """Thread-safe latency histograms per call category plus per-folder items/sec."""
+
+    SLOWEST_FOLDERS = 10        # Slowest folders (by items/sec) kept for the report
+    MIN_FOLDER_ITEMS = 10       # Folders with fewer moves say little about throughput
+
+    def __init__(self, export_path=None, export_interval=30.0):
+        """export_path is the file name without extension; .json and .prom are written next to each other."""
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.histograms = {}
+        self.counters = Counter()
+        self.folders_timed = 0
+        self._slowest_folders = []  # Max-heap on items/sec (negated), SLOWEST_FOLDERS long
+        self._lock = threading.Lock()
+        self._gauges = None
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._exporter = None
+
+    def timer(self, category):
+        """Context manager adding the duration of its block to category's histogram."""
+        return _Timer(self, category)
+
+    def observe(self, category, seconds):
+        with self._lock:
+            histogram = self.histograms.get(category)
+            if histogram is None:
+                histogram = self.histograms[category] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def record_folder(self, folder_path, items, seconds):
+        """Throughput of one folder's item moves; returns its items/sec (None if nothing was moved)."""
+        if items <= 0 or seconds <= 0:
+            return None
+        rate = items / seconds
+        with self._lock:
+            self.folders_timed += 1
+            if items >= self.MIN_FOLDER_ITEMS:
+                entry = (-rate, folder_path, items, seconds)
+                if len(self._slowest_folders) < self.SLOWEST_FOLDERS:
+                    heapq.heappush(self._slowest_folders, entry)
+                elif rate < -self._slowest_folders[0][0]:
+                    heapq.heapreplace(self._slowest_folders, entry)
+        return rate
+
+    def snapshot(self):
+        """JSON-serializable state: histograms by category, counters, slowest folders and gauges."""
+        with self._lock:
+            calls = {category: histogram.snapshot() for category, histogram in sorted(self.histograms.items())}
+            counters = dict(self.counters)
+            slowest = sorted(self._slowest_folders, reverse=True)
+            folders_timed = self.folders_timed
+        return {
+            'elapsed_seconds': round(time.monotonic() - self._started, 3),
+            'calls': calls,
+            'counters': counters,
+            'folders_timed': folders_timed,
+            'slowest_folders': [
+                {'folder': folder, 'items': items, 'seconds': round(seconds, 3), 'items_per_second': round(-rate, 3)}
+                for rate, folder, items, seconds in slowest
+            ],
+            'gauges': self._read_gauges(),
+        }
+
+    def to_prometheus(self, snapshot=None):
+        """Prometheus text exposition of a snapshot."""
+        snapshot = snapshot or self.snapshot()
+        lines = [
+            '# HELP migrator_call_seconds Latency of COM calls made by the migrator, by category.',
+            '# TYPE migrator_call_seconds summary',
+        ]
+        for category, stats in snapshot['calls'].items():
+            for q in QUANTILES:
+                lines.append(f'migrator_call_seconds{{category="{category}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]}')
+            lines.append(f'migrator_call_seconds_sum{{category="{category}"}} {stats["total_seconds"]}')
+            lines.append(f'migrator_call_seconds_count{{category="{category}"}} {stats["count"]}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE migrator_{name}_total counter')
+            lines.append(f'migrator_{name}_total {value}')
+        for name, value in sorted(snapshot['gauges'].items()):
+            if isinstance(value, (int, float)):
+                lines.append(f'# TYPE migrator_{name} gauge')
+                lines.append(f'migrator_{name} {value}')
+        lines.append('# TYPE migrator_elapsed_seconds gauge')
+        lines.append(f"migrator_elapsed_seconds {snapshot['elapsed_seconds']}")
+        return '\n'.join(lines) + '\n'
+
+    def start(self, gauges=None):
+        """
+        Reset the clock and start exporting every export_interval seconds. gauges, if given,
+        is called at each export and returns a dict of numbers (progress, move rate, ...).
+        """
+        self._gauges = gauges
+        self._started = time.monotonic()
+        if not self.export_path or not self.export_interval or self._exporter is not None:
+            return
+        self._stop.clear()
+        self._exporter = threading.Thread(target=self._export_loop, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+
+    def stop(self):
+        """Stop the exporter thread and write a last export; returns the final snapshot."""
+        if self._exporter is not None:
+            self._stop.set()
+            self._exporter.join()
+            self._exporter = None
+        snapshot = self.snapshot()
+        if self.export_path:
+            self.export(snapshot)
+        return snapshot
+
+    def export(self, snapshot=None):
+        """Write the JSON and Prometheus files atomically."""
+        snapshot = snapshot or self.snapshot()
+        os.makedirs(os.path.dirname(self.export_path) or '.', exist_ok=True)
+        for extension, text in (('.json', json.dumps(snapshot, indent=2, default=str)),
+                                ('.prom', self.to_prometheus(snapshot))):
+            temp_path = f"{self.export_path}{extension}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.export_path + extension)
+
+    def _export_loop(self):
+        while not self._stop.wait(self.export_interval):
+            try:
+                self.export()
+            except Exception as e:
+                logging.warning(f"Could not export metrics to {self.export_path}: {e}")
+
+    def _read_gauges(self):
+        if self._gauges is None:
+            return {}
+        try:
+            return dict(self._gauges())
+        except Exception as e:
+            logging.debug("Metrics gauges unavailable: %s", e)
+            return {}
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all other threads every interval seconds and writes them
+    as collapsed stacks ("frame;frame;frame count" per line), the input format of
+    flamegraph.pl and speedscope.
+    """
+
+    MAX_DEPTH = 64
+
+    def __init__(self, path, interval=0.01):
+        self.path = path
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and write the collapsed stacks; returns the output path."""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logging.info(f"Profiler: {self.sample_count} samples written to {self.path}")
+        return self.path
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.MAX_DEPTH:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                self.samples[';'.join(reversed(frames))] += 1
+            self.sample_count += 1
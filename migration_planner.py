@@ -0,0 +1,331 @@
+"""
+Pre-flight planning for EmailMigrator.
+
+MigrationPlanner walks the folder trees of the selected PST stores with folder
+table queries (no item proxies) and records item counts and byte sizes per
+folder.  It then packs the work into shards of roughly equal size: folders
+bigger than a shard are split into ReceivedTime windows, small folders of the
+same store are grouped.  With an offline PST inventory (pst_scanner), stores
+the inventory covers are planned from its counts without reading any folder
+table.  ThroughputHistory keeps the items/sec measured by previous runs so the
+plan can carry an ETA.
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# Columns read per item while planning
+PLAN_TABLE_COLUMNS = ['MessageClass', 'Size', 'ReceivedTime']
+
+
+def is_mail_class(message_class):
+    """Equivalent of item.Class == 43 (olMail) for a MessageClass string."""
+    message_class = message_class or ''
+    return message_class == 'IPM.Note' or message_class.startswith('IPM.Note.')
+
+
+def received_filter(unit):
+    """Jet filter for the ReceivedTime window of a plan unit, or None for a whole folder."""
+    clauses = []
+    if unit.get('received_from'):
+        clauses.append(f"[ReceivedTime] >= '{datetime.fromisoformat(unit['received_from']).strftime('%m/%d/%Y %I:%M %p')}'")
+    if unit.get('received_until'):
+        clauses.append(f"[ReceivedTime] < '{datetime.fromisoformat(unit['received_until']).strftime('%m/%d/%Y %I:%M %p')}'")
+    return ' AND '.join(clauses) or None
+
+
+def unit_label(unit):
+    """Folder path of a plan unit, with its ReceivedTime window if it is one."""
+    if not unit.get('received_from') and not unit.get('received_until'):
+        return unit['folder_path']
+    return f"{unit['folder_path']} [{unit.get('received_from') or '...'}, {unit.get('received_until') or '...'})"
+
+
+class ThroughputHistory:
+    """Items/sec of previous runs, stored as JSON in the migration state directory."""
+
+    MAX_RUNS = 20   # Runs kept in the history file
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read throughput history {self.path}: {e}")
+            return []
+
+    def record(self, items, seconds, workers):
+        """Append one finished run; runs that moved nothing are not recorded."""
+        if items <= 0 or seconds <= 0:
+            return
+        runs = self.load()
+        runs.append({
+            'finished_at': datetime.now().isoformat(),
+            'items': items,
+            'seconds': round(seconds, 3),
+            'workers': workers,
+            'items_per_second': round(items / seconds, 3),
+        })
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(runs[-self.MAX_RUNS:], f, indent=2)
+
+    def items_per_second(self, workers=None):
+        """(median items/sec, runs used) of recent runs, preferring runs with the same worker count; (None, 0) without history."""
+        runs = self.load()
+        matching = [run for run in runs if run.get('workers') == workers] or runs
+        rates = [run['items_per_second'] for run in matching[-5:]]
+        return (statistics.median(rates), len(rates)) if rates else (None, 0)
+
+
+class MigrationPlanner:
+    """Scans PST stores and splits the work into size-balanced shards."""
+
+    WINDOW_SIZE = 500   # Rows fetched per GetArray call
+
+    def __init__(self, shard_bytes=256 * 1024 * 1024, shard_items=5000, state_dir="migration_state", inventory=None):
+        self.shard_bytes = shard_bytes
+        self.shard_items = shard_items
+        self.inventory = inventory  # pst_scanner.PstInventory, or None to scan every store through Outlook
+        self.history = ThroughputHistory(os.path.join(state_dir, "throughput_history.json"))
+
+    def build_plan(self, pst_stores, mail_only=True, workers=1, fallback_rate=None, item_filter=None):
+        """
+        Scan pst_stores and return the plan as a JSON-serializable dict. The ETA uses the
+        throughput of previous runs, or fallback_rate (items/sec) if there is no history.
+        item_filter(store_id, folder_entry_id) may return a Jet filter limiting what is counted;
+        the inventory cannot apply one, so it is only used without item_filter.
+        """
+        folders = []
+        from_inventory = 0
+        for store in pst_stores:
+            store_folders = None
+            if self.inventory is not None and item_filter is None:
+                store_folders = self.inventory_folders(store, mail_only)
+            if store_folders is None:
+                store_folders = self.scan_store(store, mail_only, item_filter)
+            else:
+                from_inventory += 1
+            folders.extend(store_folders)
+
+        shards = []
+        by_store = defaultdict(list)
+        for folder in folders:
+            by_store[folder['store_id']].extend(self.split_folder(folder))
+        for store in pst_stores:
+            shards.extend(self.pack_units(store, by_store[store.StoreID]))
+        # Largest first, so parallel workers finish at about the same time
+        shards.sort(key=lambda shard: (shard['bytes'], shard['items']), reverse=True)
+        for shard_id, shard in enumerate(shards, 1):
+            shard['shard_id'] = shard_id
+
+        total_items = sum(folder['items'] for folder in folders)
+        rate, runs = self.history.items_per_second(workers)
+        rate_source = f"median of {runs} previous runs" if rate else "configured move rate"
+        rate = rate or fallback_rate
+        return {
+            'created_at': datetime.now().isoformat(),
+            'mail_only': mail_only,
+            'stores': len(pst_stores),
+            'stores_from_inventory': from_inventory,
+            'folders': len(folders),
+            'total_items': total_items,
+            'total_bytes': sum(folder['bytes'] for folder in folders),
+            'shard_bytes': self.shard_bytes,
+            'shard_items': self.shard_items,
+            'items_per_second': round(rate, 3) if rate else None,
+            'rate_source': rate_source if rate else None,
+            'eta_seconds': round(total_items / rate) if rate else None,
+            'shards': shards,
+        }
+
+    def scan_store(self, store, mail_only=True, item_filter=None):
+        """Per-folder counts, bytes and a per-day histogram of one store, read from folder tables."""
+        store_id = store.StoreID
+        folders = []
+        stack = [(store.GetRootFolder(), "")]
+        while stack:
+            folder, parent_path = stack.pop()
+            folder_path = f"{parent_path}/{folder.Name}" if parent_path else folder.Name
+            entry_id = folder.EntryID
+            stats = self.scan_folder_or_count(folder, folder_path, mail_only,
+                                              item_filter(store_id, entry_id) if item_filter else None)
+            stats.update({
+                'store_id': store_id,
+                'pst_display_name': store.DisplayName,
+                'pst_file_path': getattr(store, 'FilePath', 'N/A'),
+                'folder_path': folder_path,
+                'entry_id': entry_id,
+            })
+            folders.append(stats)
+            subfolders = [(subfolder, folder_path) for subfolder in folder.Folders]
+            stack.extend(reversed(subfolders))
+        return folders
+
+    def inventory_folders(self, store, mail_only=True):
+        """
+        Per-folder counts of one store from the offline inventory, or None if the inventory has
+        no entry for the store's file or the entry's root EntryID is not the store's. The folder
+        tree is walked live: a folder whose Items.Count differs from the inventory, or that the
+        inventory does not list, is scanned through Outlook instead.
+        """
+        entry = self.inventory.find(getattr(store, 'FilePath', ''))
+        if entry is None:
+            return None
+        root = store.GetRootFolder()
+        if (entry.get('root_entry_id') or '').upper() != root.EntryID.upper():
+            logging.warning(f"PST inventory entry {entry['path']} does not match store '{store.DisplayName}', "
+                            f"scanning it through Outlook.")
+            return None
+        store_id = store.StoreID
+        by_entry_id = {folder['entry_id'].upper(): folder for folder in entry['folders'] if folder.get('entry_id')}
+        # Inventory days are UTC dates; windows only need to be contiguous, so the offset is harmless
+        items, size, undated, day_items, day_bytes = (
+            ('mail_items', 'mail_bytes', 1, 2, 3) if mail_only else ('items', 'bytes', 0, 0, 1))
+        folders = []
+        changed = 0
+        stack = [(root, "")]
+        while stack:
+            folder, parent_path = stack.pop()
+            folder_path = f"{parent_path}/{folder.Name}" if parent_path else folder.Name
+            entry_id = folder.EntryID
+            known = by_entry_id.get(entry_id.upper())
+            known_count = None
+            if known is not None:
+                known_count = known['items'] if known.get('content_count') is None else known['content_count']
+            if known is not None and folder.Items.Count == known_count:
+                stats = {
+                    'items': known[items],
+                    'bytes': known[size],
+                    'undated': known['undated'][undated],
+                    'days': {day: [counts[day_items], counts[day_bytes]] for day, counts in known['days'].items()
+                             if counts[day_items]},
+                }
+            else:
+                # Changed since the inventory was taken (or created since)
+                changed += 1
+                stats = self.scan_folder_or_count(folder, folder_path, mail_only)
+            stats.update({
+                'store_id': store_id,
+                'pst_display_name': store.DisplayName,
+                'pst_file_path': getattr(store, 'FilePath', 'N/A'),
+                'folder_path': folder_path,
+                'entry_id': entry_id,
+            })
+            folders.append(stats)
+            subfolders = [(subfolder, folder_path) for subfolder in folder.Folders]
+            stack.extend(reversed(subfolders))
+        logging.info(f"Planner: '{store.DisplayName}' counted from the PST inventory of {entry['path']}"
+                     f"{f', {changed} changed folders scanned through Outlook' if changed else ''}.")
+        return folders
+
+    def scan_folder_or_count(self, folder, folder_path, mail_only=True, item_filter=None):
+        """scan_folder, or just Items.Count if the folder table cannot be read."""
+        try:
+            return self.scan_folder(folder, mail_only, item_filter)
+        except Exception as e:
+            logging.warning(f"Planner could not read the table of '{folder_path}', using Items.Count: {e}")
+            return {'items': folder.Items.Count, 'bytes': 0, 'undated': 0, 'days': {}}
+
+    def scan_folder(self, folder, mail_only=True, item_filter=None):
+        table = folder.GetTable(item_filter) if item_filter else folder.GetTable()
+        table.Columns.RemoveAll()
+        for column in PLAN_TABLE_COLUMNS:
+            table.Columns.Add(column)
+
+        items = 0
+        size_total = 0
+        undated = 0
+        days = defaultdict(lambda: [0, 0])
+        while True:
+            rows = table.GetArray(self.WINDOW_SIZE)
+            if not rows:
+                break
+            for message_class, size, received in rows:
+                if mail_only and not is_mail_class(message_class):
+                    continue
+                size = size if isinstance(size, int) else 0
+                items += 1
+                size_total += size
+                if received:
+                    day = days[received.date().isoformat()]
+                    day[0] += 1
+                    day[1] += size
+                else:
+                    undated += 1
+        return {'items': items, 'bytes': size_total, 'undated': undated, 'days': dict(days)}
+
+    def split_folder(self, folder):
+        """
+        Plan units of one folder: the whole folder, or consecutive ReceivedTime windows of
+        whole days when it is bigger than a shard. The first and last windows are open-ended.
+        """
+        if not folder['items']:
+            return []
+        unit = {key: folder[key] for key in ('folder_path', 'entry_id', 'items', 'bytes')}
+        if folder['items'] <= self.shard_items and folder['bytes'] <= self.shard_bytes:
+            return [unit]
+        if folder['undated'] or len(folder['days']) < 2:
+            # Items without ReceivedTime match no date filter, so such folders are never split
+            return [unit]
+
+        windows = []
+        current = None
+        for day in sorted(folder['days']):
+            day_items, day_bytes = folder['days'][day]
+            if current and (current['items'] + day_items > self.shard_items or
+                            current['bytes'] + day_bytes > self.shard_bytes):
+                current['received_until'] = day
+                windows.append(current)
+                current = None
+            if current is None:
+                current = {'folder_path': folder['folder_path'], 'entry_id': folder['entry_id'],
+                           'items': 0, 'bytes': 0, 'received_from': day if windows else None,
+                           'received_until': None}
+            current['items'] += day_items
+            current['bytes'] += day_bytes
+        windows.append(current)
+        return windows
+
+    def pack_units(self, store, units):
+        """Group the units of one store into shards with the longest-processing-time heuristic."""
+        if not units:
+            return []
+        total_bytes = sum(unit['bytes'] for unit in units)
+        total_items = sum(unit['items'] for unit in units)
+        shard_count = max(1, math.ceil(total_bytes / self.shard_bytes), math.ceil(total_items / self.shard_items))
+        shard_count = min(shard_count, len(units))
+
+        shards = [{
+            'store_id': store.StoreID,
+            'pst_display_name': store.DisplayName,
+            'pst_file_path': getattr(store, 'FilePath', 'N/A'),
+            'items': 0,
+            'bytes': 0,
+            'units': [],
+        } for _ in range(shard_count)]
+        heap = [(0, 0, index) for index in range(shard_count)]
+        for unit in sorted(units, key=lambda u: (u['bytes'], u['items']), reverse=True):
+            _, _, index = heapq.heappop(heap)
+            shard = shards[index]
+            shard['units'].append(unit)
+            shard['items'] += unit['items']
+            shard['bytes'] += unit['bytes']
+            heapq.heappush(heap, (shard['bytes'], shard['items'], index))
+        return shards
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return 'unknown'
+    return str(timedelta(seconds=int(seconds)))
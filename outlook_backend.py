@@ -0,0 +1,114 @@
+"""
+Outlook/MAPI backends used by EmailMigrator.
+
+The migrator never dispatches Outlook directly; it asks a backend for the
+COM apartment and the Outlook.Application object.  OutlookBackend drives a
+live Outlook through win32com, fake_outlook.FakeOutlookBackend provides the
+same interface in pure Python.
+"""
+import os
+
+# Error codes consistent with server-side throttling/MAPI limits
+SERVER_THROTTLE_ERRORS = [-2147352567, -2147220731]
+
+# The Outlook process or its RPC connection is gone; the session has to be re-dispatched
+RPC_E_DISCONNECTED = -2147417848
+RPC_S_SERVER_UNAVAILABLE = -2147023174
+RPC_E_SERVERFAULT = -2147417851
+CO_E_OBJNOTCONNECTED = -2147220995
+SESSION_LOST_ERRORS = [RPC_E_DISCONNECTED, RPC_S_SERVER_UNAVAILABLE, RPC_E_SERVERFAULT, CO_E_OBJNOTCONNECTED]
+
+# Failures of one call that usually succeed when tried again later: busy or timed-out RPC,
+# MAPI timeouts and network errors, items changed or locked by a sync in progress
+RPC_E_CALL_REJECTED = -2147418111
+RPC_E_SERVERCALL_RETRYLATER = -2147417846
+RPC_E_TIMEOUT = -2147417825
+RPC_S_CALL_FAILED = -2147023170
+MAPI_E_TIMEOUT = -2147220479
+MAPI_E_NETWORK_ERROR = -2147221227
+MAPI_E_BUSY = -2147221237
+MAPI_E_OBJECT_CHANGED = -2147221239
+TRANSIENT_ERRORS = [RPC_E_CALL_REJECTED, RPC_E_SERVERCALL_RETRYLATER, RPC_E_TIMEOUT, RPC_S_CALL_FAILED,
+                    MAPI_E_TIMEOUT, MAPI_E_NETWORK_ERROR, MAPI_E_BUSY, MAPI_E_OBJECT_CHANGED] + SESSION_LOST_ERRORS
+
+# The item (or folder) does not exist (any more), e.g. because it was moved
+MAPI_E_NOT_FOUND = -2147221233
+
+# Error classes returned by classify_error
+ERROR_THROTTLE = 'throttle'
+ERROR_TRANSIENT = 'transient'
+ERROR_PERMANENT = 'permanent'
+
+
+class OutlookBackend:
+    """Backend that talks to a live Outlook instance through win32com."""
+
+    def initialize(self):
+        """Initialize COM for the calling thread."""
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def uninitialize(self):
+        """Release COM for the calling thread."""
+        import pythoncom
+        pythoncom.CoUninitialize()
+
+    def dispatch(self):
+        """Return the Outlook.Application object for the calling thread."""
+        import win32com.client
+        return win32com.client.Dispatch("Outlook.Application")
+
+    def open_pst(self, namespace, path):
+        """Add an existing PST file to the profile. AddStore would create a missing file, so that is refused."""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"PST file not found: {path}")
+        namespace.AddStore(path)
+
+
+def get_error_codes(error):
+    """Return (hresult, scode) of a COM error; scode is the code Outlook put in excepinfo, if any."""
+    args = getattr(error, 'args', ())
+    hresult = args[0] if args and isinstance(args[0], int) else None
+    scode = None
+    if len(args) > 2 and args[2] and len(args[2]) > 5:
+        scode = args[2][5]
+    return hresult, scode
+
+
+def is_throttle_error(error, throttle_codes=SERVER_THROTTLE_ERRORS):
+    """
+    True if a COM error matches SERVER_THROTTLE_ERRORS.
+    Outlook wraps most failures in DISP_E_EXCEPTION, so when excepinfo carries
+    its own scode that code decides, not the generic outer HRESULT.
+    """
+    hresult, scode = get_error_codes(error)
+    if scode is not None:
+        return scode in throttle_codes
+    return hresult in throttle_codes
+
+
+def is_session_lost_error(error):
+    """True if a COM error means the Outlook session itself is gone, not just one call."""
+    hresult, scode = get_error_codes(error)
+    return hresult in SESSION_LOST_ERRORS or scode in SESSION_LOST_ERRORS
+
+
+def is_not_found_error(error):
+    """True if a COM error says the object does not exist, as for an item that was already moved."""
+    hresult, scode = get_error_codes(error)
+    return (scode if scode is not None else hresult) == MAPI_E_NOT_FOUND
+
+
+def classify_error(error):
+    """
+    ERROR_THROTTLE, ERROR_TRANSIENT or ERROR_PERMANENT for an exception raised by a COM call.
+    As in is_throttle_error, the scode Outlook put in excepinfo decides when there is one.
+    Anything that is not a recognised throttling or transient COM error is permanent.
+    """
+    if is_throttle_error(error):
+        return ERROR_THROTTLE
+    hresult, scode = get_error_codes(error)
+    code = scode if scode is not None else hresult
+    if code in TRANSIENT_ERRORS or hresult in SESSION_LOST_ERRORS:
+        return ERROR_TRANSIENT
+    return ERROR_PERMANENT
@@ -0,0 +1,207 @@
+"""
+Warm Outlook/MAPI session with cached store and folder resolution.
+
+OutlookSession owns one thread's COM apartment and Outlook.Application.  It
+checks the session's health at most every HEALTH_CHECK_INTERVAL seconds and
+reconnects by dispatching a new Outlook.Application.  Store display names and
+folder paths are resolved to StoreIDs/EntryIDs once and kept across
+reconnects, so stores and folders are reopened with GetStoreFromID /
+GetFolderFromID instead of scanning namespace.Stores and walking Folders
+level by level.  A cached ID that no longer opens is dropped and resolved
+again.
+"""
+import logging
+import time
+from collections import Counter
+
+from outlook_backend import is_session_lost_error
+
+
+class OutlookSession:
+    """One thread's Outlook session plus store-name and folder-path indexes."""
+
+    HEALTH_CHECK_INTERVAL = 30.0   # Seconds between namespace health checks
+    MAX_RECONNECTS = 3             # Consecutive failed reconnect attempts before giving up
+
+    def __init__(self, backend, health_check_interval=None, store_ids=None, folder_ids=None):
+        self.backend = backend
+        self.health_check_interval = self.HEALTH_CHECK_INTERVAL if health_check_interval is None else health_check_interval
+        self.outlook = None
+        self._namespace = None
+        self._last_check = 0.0
+        self._initialized = False
+        # Indexes may be shared between the sessions of several worker threads
+        self.store_ids = {} if store_ids is None else store_ids         # Store display name -> StoreID
+        self.folder_ids = {} if folder_ids is None else folder_ids      # (StoreID, folder path) -> EntryID
+        self.stats = Counter()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        """Initialize COM for the calling thread and dispatch Outlook."""
+        self.backend.initialize()
+        self._initialized = True
+        self._connect()
+        return self
+
+    def close(self):
+        self._namespace = None
+        self.outlook = None
+        if self._initialized:
+            self._initialized = False
+            self.backend.uninitialize()
+
+    def _connect(self):
+        self.outlook = self.backend.dispatch()
+        self._namespace = self.outlook.GetNamespace("MAPI")
+        self._last_check = time.monotonic()
+
+    @property
+    def namespace(self):
+        """The MAPI namespace, health-checked at most every health_check_interval seconds."""
+        if self._namespace is None or time.monotonic() - self._last_check >= self.health_check_interval:
+            self.check_health()
+        return self._namespace
+
+    def check_health(self):
+        """Make one cheap call on the namespace and reconnect if the session is gone."""
+        self.stats['health_checks'] += 1
+        try:
+            if self._namespace is None:
+                raise RuntimeError("Session is not connected")
+            self._namespace.Stores.Count
+            self._last_check = time.monotonic()
+        except Exception as e:
+            logging.warning(f"Outlook session failed its health check, reconnecting: {e}")
+            self.reconnect()
+
+    def reconnect(self):
+        """Dispatch a new Outlook session; cached StoreIDs and EntryIDs stay valid."""
+        self._namespace = None
+        self.outlook = None
+        for attempt in range(1, self.MAX_RECONNECTS + 1):
+            try:
+                self._connect()
+                self.stats['reconnects'] += 1
+                logging.info(f"Outlook session reconnected (attempt {attempt}).")
+                return
+            except Exception as e:
+                logging.warning(f"Reconnect attempt {attempt} failed: {e}")
+                time.sleep(min(2 ** attempt, 30))
+        raise RuntimeError(f"Could not reconnect to Outlook after {self.MAX_RECONNECTS} attempts")
+
+    def call(self, operation, *args):
+        """Run operation(namespace, *args), reconnecting once if the session was lost."""
+        try:
+            return operation(self.namespace, *args)
+        except Exception as e:
+            if not is_session_lost_error(e):
+                raise
+            self.reconnect()
+            return operation(self.namespace, *args)
+
+    def store_by_id(self, store_id):
+        return self.call(lambda namespace: namespace.GetStoreFromID(store_id))
+
+    def folder_by_id(self, entry_id, store_id=None):
+        return self.call(lambda namespace: namespace.GetFolderFromID(entry_id, store_id))
+
+    def item_by_id(self, entry_id, store_id=None):
+        return self.call(lambda namespace: namespace.GetItemFromID(entry_id, store_id))
+
+    def store(self, display_name):
+        """Store with the given display name, or None. One scan of namespace.Stores fills the index."""
+        store_id = self.store_ids.get(display_name)
+        if store_id is not None:
+            try:
+                store = self.store_by_id(store_id)
+                self.stats['store_hits'] += 1
+                return store
+            except Exception as e:
+                if is_session_lost_error(e):
+                    raise
+                self.invalidate_store(display_name)
+
+        self.stats['store_misses'] += 1
+        found = None
+        for store in self.namespace.Stores:
+            name = store.DisplayName
+            self.store_ids[name] = store.StoreID
+            if name == display_name:
+                found = store
+        return found
+
+    def folder(self, store_id, folder_path):
+        """
+        Folder at a '/'-separated path whose first component is the store's root folder
+        name, or None. Resolved paths, and every ancestor on the way, are indexed.
+        """
+        entry_id = self.folder_ids.get((store_id, folder_path))
+        if entry_id is not None:
+            try:
+                folder = self.folder_by_id(entry_id, store_id)
+                self.stats['folder_hits'] += 1
+                return folder
+            except Exception as e:
+                if is_session_lost_error(e):
+                    raise
+                self.invalidate_folder(store_id, folder_path)
+
+        self.stats['folder_misses'] += 1
+        parts = folder_path.split('/')
+        # Start from the deepest ancestor already in the index
+        folder = None
+        depth = len(parts) - 1
+        while depth > 0 and folder is None:
+            ancestor_id = self.folder_ids.get((store_id, '/'.join(parts[:depth])))
+            if ancestor_id is not None:
+                try:
+                    folder = self.folder_by_id(ancestor_id, store_id)
+                    break
+                except Exception as e:
+                    if is_session_lost_error(e):
+                        raise
+                    self.invalidate_folder(store_id, '/'.join(parts[:depth]))
+            depth -= 1
+        if folder is None:
+            folder = self.store_by_id(store_id).GetRootFolder()
+            if folder.Name != parts[0]:
+                return None
+            self.remember_folder(store_id, parts[0], folder.EntryID)
+            depth = 1
+
+        for index in range(depth, len(parts)):
+            try:
+                folder = folder.Folders[parts[index]]
+            except Exception as e:
+                if is_session_lost_error(e):
+                    raise
+                return None
+            self.remember_folder(store_id, '/'.join(parts[:index + 1]), folder.EntryID)
+        return folder
+
+    def remember_folder(self, store_id, folder_path, entry_id):
+        self.folder_ids[(store_id, folder_path)] = entry_id
+
+    def invalidate_store(self, display_name):
+        self.stats['invalidations'] += 1
+        self.store_ids.pop(display_name, None)
+
+    def invalidate_folder(self, store_id, folder_path):
+        """Drop a folder path and everything below it from the index."""
+        self.stats['invalidations'] += 1
+        prefix = folder_path + '/'
+        for key in [key for key in list(self.folder_ids)
+                    if key[0] == store_id and (key[1] == folder_path or key[1].startswith(prefix))]:
+            self.folder_ids.pop(key, None)
+
+    def snapshot(self):
+        return {
+            'stores_indexed': len(self.store_ids),
+            'folders_indexed': len(self.folder_ids),
+            **self.stats,
+        }
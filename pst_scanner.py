@@ -0,0 +1,593 @@
+"""
+Offline, read-only inventory of PST files.
+
+PstFile memory-maps a .pst file and walks its NDB layer (header, node and block
+B-trees, data trees and subnode trees) and enough of its LTP layer (heap-on-node,
+BTH and property contexts) to list the folders of the IPM subtree with item
+counts, byte sizes, a per-day ReceivedTime histogram and, optionally, the
+Internet Message-IDs of their items.  Outlook is not involved, so a file share
+full of PSTs can be inventoried from a Linux box, many files in parallel.
+
+The inventory feeds EmailMigrator: MigrationPlanner builds its shards from it
+instead of reading every folder table through Outlook, and after the run the
+migrator reconciles what it accounted for against the source counts.
+
+Unicode (wVer 23) and ANSI (wVer 14/15) files are read, unencoded or with
+permutative ("compressible") encoding.  4 KB-page OSTs and files with cyclic
+("high") encoding are reported as unsupported.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from migration_planner import is_mail_class
+
+INVENTORY_VERSION = 1
+
+# mpbbR from [MS-PST] 5.1: permutative encoding maps every byte b of an external block to MPBB_CRYPT[b]
+MPBB_CRYPT = bytes((
+    65, 54, 19, 98, 168, 33, 110, 187, 244, 22, 204, 4, 127, 100, 232, 93,
+    30, 242, 203, 42, 116, 197, 94, 53, 210, 149, 71, 158, 150, 45, 154, 136,
+    76, 125, 132, 63, 219, 172, 49, 182, 72, 95, 246, 196, 216, 57, 139, 231,
+    35, 59, 56, 142, 200, 193, 223, 37, 177, 32, 165, 70, 96, 78, 156, 251,
+    170, 211, 86, 81, 69, 124, 85, 0, 7, 201, 43, 157, 133, 155, 9, 160,
+    143, 173, 179, 15, 99, 171, 137, 75, 215, 167, 21, 90, 113, 102, 66, 191,
+    38, 74, 107, 152, 250, 234, 119, 83, 178, 112, 5, 44, 253, 89, 58, 134,
+    126, 206, 6, 235, 130, 120, 87, 199, 141, 67, 175, 180, 28, 212, 91, 205,
+    226, 233, 39, 79, 195, 8, 114, 128, 207, 176, 239, 245, 40, 109, 190, 48,
+    77, 52, 146, 213, 14, 60, 34, 50, 229, 228, 249, 159, 194, 209, 10, 129,
+    18, 225, 238, 145, 131, 118, 227, 151, 230, 97, 138, 23, 121, 164, 183, 220,
+    144, 122, 92, 140, 2, 166, 202, 105, 222, 80, 26, 17, 147, 185, 82, 135,
+    88, 252, 237, 29, 55, 73, 27, 106, 224, 41, 51, 153, 189, 108, 217, 148,
+    243, 64, 84, 111, 240, 198, 115, 184, 214, 62, 101, 24, 68, 31, 221, 103,
+    16, 241, 12, 25, 236, 174, 3, 161, 20, 123, 169, 11, 255, 248, 163, 192,
+    162, 1, 247, 46, 188, 36, 104, 117, 13, 254, 186, 47, 181, 208, 218, 61,
+))
+
+
+def _inverse_permutation(table):
+    if len(table) != 256 or len(set(table)) != 256:
+        raise ValueError("The permutative encoding table is not a permutation of 0..255")
+    inverse = bytearray(256)
+    for plain, encoded in enumerate(table):
+        inverse[encoded] = plain
+    return bytes(inverse)
+
+
+# Decoding table (mpbbI) for bytes.translate()
+PERMUTE_DECODE = _inverse_permutation(MPBB_CRYPT)
+
+CRYPT_NONE = 0
+CRYPT_PERMUTE = 1
+CRYPT_CYCLIC = 2
+
+PAGE_SIZE = 512
+PTYPE_BBT = 0x80
+PTYPE_NBT = 0x81
+
+BLOCK_TYPE_XBLOCK = 0x01    # XBLOCK (level 1) and XXBLOCK (level 2)
+BLOCK_TYPE_SUBNODE = 0x02   # SLBLOCK (level 0) and SIBLOCK (level 1)
+
+# Node types (low 5 bits of a NID) and well-known NIDs
+NID_TYPE_NORMAL_FOLDER = 0x02
+NID_TYPE_NORMAL_MESSAGE = 0x04
+NID_MESSAGE_STORE = 0x21
+NID_ROOT_FOLDER = 0x122
+
+HEAP_SIGNATURE = 0xEC
+HEAP_CLIENT_PC = 0xBC
+BTH_SIGNATURE = 0xB5
+
+PT_SHORT = 0x0002
+PT_LONG = 0x0003
+PT_BOOLEAN = 0x000B
+PT_LONGLONG = 0x0014
+PT_STRING8 = 0x001E
+PT_UNICODE = 0x001F
+PT_SYSTIME = 0x0040
+PT_BINARY = 0x0102
+
+PR_MESSAGE_CLASS = 0x001A
+PR_MESSAGE_DELIVERY_TIME = 0x0E06   # Outlook's ReceivedTime
+PR_MESSAGE_SIZE = 0x0E08
+PR_RECORD_KEY = 0x0FF9
+PR_INTERNET_MESSAGE_ID = 0x1035
+PR_DISPLAY_NAME = 0x3001
+PR_IPM_SUBTREE_ENTRYID = 0x35E0
+PR_CONTENT_COUNT = 0x3602
+PR_CONTAINER_CLASS = 0x3613
+
+STORE_PROPERTIES = frozenset((PR_DISPLAY_NAME, PR_RECORD_KEY, PR_IPM_SUBTREE_ENTRYID))
+FOLDER_PROPERTIES = frozenset((PR_DISPLAY_NAME, PR_CONTENT_COUNT, PR_CONTAINER_CLASS))
+MESSAGE_PROPERTIES = frozenset((PR_MESSAGE_CLASS, PR_MESSAGE_DELIVERY_TIME, PR_MESSAGE_SIZE, PR_INTERNET_MESSAGE_ID))
+
+FILETIME_EPOCH = datetime(1601, 1, 1)
+
+
+class PstFormatError(Exception):
+    """The file is not a PST this reader understands, or a structure in it is damaged."""
+
+
+class PstFile:
+    """
+    Read-only view of one PST. The node and block B-trees are read into dicts when the
+    file is opened; blocks, heaps and property contexts are decoded on demand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise PstFormatError(f"{path} is empty")
+        try:
+            self._read_header()
+            self.nodes = {}     # NID -> (bid_data, bid_sub, nid_parent)
+            self.blocks = {}    # BID without its reserved bit -> (file offset, byte count)
+            self._read_btree(self.nbt_root, PTYPE_NBT, self._add_node)
+            self._read_btree(self.bbt_root, PTYPE_BBT, self._add_block)
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _read_header(self):
+        header = self._map[:PAGE_SIZE + 64]
+        if header[:4] != b'!BDN':
+            raise PstFormatError(f"{self.path} is not a PST file")
+        version = struct.unpack_from('<H', header, 10)[0]
+        if version in (14, 15):
+            self.unicode = False
+            self.nbt_root, self.bbt_root = struct.unpack_from('<4xI4xI', header, 184)
+            self.encryption = header[461]
+            self._bid_format, self._bid_size = 'I', 4
+            # cEnt, cbEnt, cLevel and ptype offsets within a page
+            self._page_layout = (496, 498, 499, 500)
+        elif version == 23:
+            self.unicode = True
+            self.nbt_root, self.bbt_root = struct.unpack_from('<8xQ8xQ', header, 216)
+            self.encryption = header[513]
+            self._bid_format, self._bid_size = 'Q', 8
+            self._page_layout = (488, 490, 491, 496)
+        elif version == 36:
+            raise PstFormatError(f"{self.path} uses 4 KB pages (an OST), which is not supported")
+        else:
+            raise PstFormatError(f"{self.path} has unknown file format version {version}")
+        if self.encryption == CRYPT_CYCLIC:
+            raise PstFormatError(f"{self.path} uses cyclic (high) encoding, which is not supported")
+        if self.encryption not in (CRYPT_NONE, CRYPT_PERMUTE):
+            raise PstFormatError(f"{self.path} has unknown encoding {self.encryption}")
+
+    def _read_btree(self, root, page_type, add_entry):
+        count_at, size_at, level_at, type_at = self._page_layout
+        bid = self._bid_format
+        # Intermediate entries: key, BREF (bid, ib); the child page's offset comes last
+        child_format = f'<{bid}{bid}{bid}'
+        stack = [root]
+        while stack:
+            offset = stack.pop()
+            page = self._map[offset:offset + PAGE_SIZE]
+            if len(page) != PAGE_SIZE or page[type_at] != page_type:
+                raise PstFormatError(f"Bad B-tree page at offset {offset:#x} in {self.path}")
+            count, entry_size, level = page[count_at], page[size_at], page[level_at]
+            for index in range(count):
+                if level:
+                    stack.append(struct.unpack_from(child_format, page, index * entry_size)[2])
+                else:
+                    add_entry(page, index * entry_size)
+
+    def _add_node(self, page, offset):
+        if self.unicode:
+            nid, bid_data, bid_sub, nid_parent = struct.unpack_from('<QQQI', page, offset)
+        else:
+            nid, bid_data, bid_sub, nid_parent = struct.unpack_from('<IIII', page, offset)
+        self.nodes[nid & 0xFFFFFFFF] = (bid_data, bid_sub, nid_parent)
+
+    def _add_block(self, page, offset):
+        if self.unicode:
+            bid, position, size = struct.unpack_from('<QQH', page, offset)
+        else:
+            bid, position, size = struct.unpack_from('<IIH', page, offset)
+        self.blocks[bid & ~1] = (position, size)
+
+    def block(self, bid):
+        """Raw bytes of one block, decoded if it is an external (data) block."""
+        try:
+            position, size = self.blocks[bid & ~1]
+        except KeyError:
+            raise PstFormatError(f"Block {bid:#x} is missing from the block B-tree of {self.path}")
+        data = self._map[position:position + size]
+        if self.encryption == CRYPT_PERMUTE and not bid & 0x2:
+            data = data.translate(PERMUTE_DECODE)
+        return data
+
+    def data_blocks(self, bid):
+        """The data blocks of a data tree in order, following XBLOCKs and XXBLOCKs."""
+        if not bid:
+            return []
+        if not bid & 0x2:
+            return [self.block(bid)]
+        block = self.block(bid)
+        block_type, level, count = struct.unpack_from('<BBH', block)
+        if block_type != BLOCK_TYPE_XBLOCK or level not in (1, 2):
+            raise PstFormatError(f"Block {bid:#x} of {self.path} is not an XBLOCK")
+        children = struct.unpack_from(f'<{count}{self._bid_format}', block, 8)
+        if level == 1:
+            return [self.block(child) for child in children]
+        blocks = []
+        for child in children:
+            blocks.extend(self.data_blocks(child))
+        return blocks
+
+    def subnodes(self, bid):
+        """NID -> (bid_data, bid_sub) of a subnode tree, following SIBLOCKs."""
+        nodes = {}
+        if not bid:
+            return nodes
+        block = self.block(bid)
+        block_type, level, count = struct.unpack_from('<BBH', block)
+        if block_type != BLOCK_TYPE_SUBNODE or level not in (0, 1):
+            raise PstFormatError(f"Block {bid:#x} of {self.path} is not a subnode block")
+        bid_format = self._bid_format
+        # Unicode entries start after 4 bytes of padding; NIDs are stored in BID-sized fields
+        start = 8 if self.unicode else 4
+        if level == 0:
+            for nid, bid_data, bid_sub in struct.iter_unpack(f'<{bid_format * 3}',
+                                                              block[start:start + count * 3 * self._bid_size]):
+                nodes[nid & 0xFFFFFFFF] = (bid_data, bid_sub)
+        else:
+            for _, child in struct.iter_unpack(f'<{bid_format * 2}', block[start:start + count * 2 * self._bid_size]):
+                nodes.update(self.subnodes(child))
+        return nodes
+
+    def properties(self, nid, wanted=None):
+        """
+        Property ID -> value from the property context of a node. Only the IDs in wanted are
+        decoded (all of them if wanted is None). Strings are str, times naive UTC datetimes.
+        """
+        try:
+            bid_data, bid_sub, _ = self.nodes[nid]
+        except KeyError:
+            raise PstFormatError(f"Node {nid:#x} is missing from the node B-tree of {self.path}")
+        heap = HeapOnNode(self.data_blocks(bid_data))
+        if heap.client_signature != HEAP_CLIENT_PC:
+            raise PstFormatError(f"Node {nid:#x} of {self.path} is not a property context")
+        subnodes = None
+        values = {}
+        for key, entry in heap.bth_records(heap.user_root):
+            prop_id = struct.unpack('<H', key)[0]
+            if wanted is not None and prop_id not in wanted:
+                continue
+            prop_type, hnid = struct.unpack_from('<HI', entry)
+            if prop_type in (PT_SHORT, PT_LONG, PT_BOOLEAN):
+                values[prop_id] = _inline_value(prop_type, hnid)
+                continue
+            if not hnid:
+                raw = b''
+            elif not hnid & 0x1F:
+                raw = heap.allocation(hnid)
+            else:
+                # Values too big for the heap live in a subnode
+                if subnodes is None:
+                    subnodes = self.subnodes(bid_sub)
+                try:
+                    raw = b''.join(self.data_blocks(subnodes[hnid][0]))
+                except KeyError:
+                    raise PstFormatError(f"Subnode {hnid:#x} of node {nid:#x} is missing in {self.path}")
+            values[prop_id] = _decode_value(prop_type, raw)
+        return values
+
+    def inventory(self, message_ids=False):
+        """
+        Folders of the IPM subtree (what Outlook shows under the store's root folder) with
+        their counts, sizes and per-day histograms, as a JSON-serializable dict.
+        """
+        started = time.monotonic()
+        store = self.properties(NID_MESSAGE_STORE, STORE_PROPERTIES)
+        record_key = store.get(PR_RECORD_KEY)
+        subtree_id = store.get(PR_IPM_SUBTREE_ENTRYID)
+        ipm_subtree = struct.unpack_from('<I', subtree_id, 20)[0] if subtree_id and len(subtree_id) >= 24 else NID_ROOT_FOLDER
+        if ipm_subtree not in self.nodes:
+            raise PstFormatError(f"The IPM subtree folder {ipm_subtree:#x} of {self.path} is missing")
+
+        children = defaultdict(list)
+        for nid, (_, _, parent) in self.nodes.items():
+            if nid & 0x1F == NID_TYPE_NORMAL_FOLDER and nid != parent:
+                children[parent].append(nid)
+
+        folders = {}
+        stack = [(ipm_subtree, None)]
+        while stack:
+            nid, parent_path = stack.pop()
+            props = self.properties(nid, FOLDER_PROPERTIES)
+            name = props.get(PR_DISPLAY_NAME) or ''
+            # Paths are relative to the root folder, which Outlook names after the store
+            if parent_path is None:
+                path = ''
+            else:
+                path = f"{parent_path}/{name}" if parent_path else name
+            folders[nid] = {
+                'path': path,
+                'nid': nid,
+                'entry_id': _entry_id(record_key, nid),
+                'container_class': props.get(PR_CONTAINER_CLASS),
+                'content_count': props.get(PR_CONTENT_COUNT),
+                'items': 0,
+                'bytes': 0,
+                'mail_items': 0,
+                'mail_bytes': 0,
+                'undated': [0, 0],  # [items, mail items] without ReceivedTime
+                'days': defaultdict(lambda: [0, 0, 0, 0]),  # UTC date -> [items, bytes, mail items, mail bytes]
+            }
+            if message_ids:
+                folders[nid]['message_ids'] = []
+            stack.extend((child, path) for child in sorted(children[nid], reverse=True))
+
+        other_items = 0
+        unreadable = 0
+        for nid, (_, _, parent) in self.nodes.items():
+            if nid & 0x1F != NID_TYPE_NORMAL_MESSAGE:
+                continue
+            folder = folders.get(parent)
+            if folder is None:
+                other_items += 1
+                continue
+            try:
+                props = self.properties(nid, MESSAGE_PROPERTIES)
+            except (PstFormatError, struct.error, IndexError, ValueError) as e:
+                logging.debug(f"Unreadable message {nid:#x} in {self.path}: {e}")
+                unreadable += 1
+                props = {}
+            size = props.get(PR_MESSAGE_SIZE) or 0
+            mail = is_mail_class(props.get(PR_MESSAGE_CLASS))
+            folder['items'] += 1
+            folder['bytes'] += size
+            if mail:
+                folder['mail_items'] += 1
+                folder['mail_bytes'] += size
+            received = props.get(PR_MESSAGE_DELIVERY_TIME)
+            if isinstance(received, datetime):
+                day = folder['days'][received.date().isoformat()]
+                day[0] += 1
+                day[1] += size
+                if mail:
+                    day[2] += 1
+                    day[3] += size
+            else:
+                folder['undated'][0] += 1
+                folder['undated'][1] += mail
+            if message_ids and props.get(PR_INTERNET_MESSAGE_ID):
+                folder['message_ids'].append(props[PR_INTERNET_MESSAGE_ID])
+
+        folder_list = []
+        for folder in folders.values():
+            folder['days'] = dict(sorted(folder['days'].items()))
+            folder_list.append(folder)
+        return {
+            'path': self.path,
+            'file_bytes': len(self._map),
+            'format': 'unicode' if self.unicode else 'ansi',
+            'encryption': {CRYPT_NONE: 'none', CRYPT_PERMUTE: 'permute'}[self.encryption],
+            'display_name': store.get(PR_DISPLAY_NAME),
+            'root_entry_id': _entry_id(record_key, ipm_subtree),
+            'folders': folder_list,
+            'totals': {
+                'folders': len(folder_list),
+                'items': sum(folder['items'] for folder in folder_list),
+                'bytes': sum(folder['bytes'] for folder in folder_list),
+                'mail_items': sum(folder['mail_items'] for folder in folder_list),
+                'mail_bytes': sum(folder['mail_bytes'] for folder in folder_list),
+                'other_items': other_items,
+                'unreadable_items': unreadable,
+            },
+            'scan_seconds': round(time.monotonic() - started, 3),
+        }
+
+
+class HeapOnNode:
+    """Heap-on-node over the data blocks of one node; HIDs address allocations in it."""
+
+    def __init__(self, blocks):
+        if not blocks or len(blocks[0]) < 12 or blocks[0][2] != HEAP_SIGNATURE:
+            raise PstFormatError("Node data is not a heap-on-node")
+        self.blocks = blocks
+        self.client_signature = blocks[0][3]
+        self.user_root = struct.unpack_from('<I', blocks[0], 4)[0]
+        self._page_maps = {}
+
+    def allocation(self, hid):
+        if hid & 0x1F:
+            raise PstFormatError(f"{hid:#x} is not a heap ID")
+        block_index = hid >> 16
+        index = (hid >> 5) & 0x7FF
+        offsets = self._page_maps.get(block_index)
+        if offsets is None:
+            block = self.blocks[block_index]
+            page_map = struct.unpack_from('<H', block)[0]
+            count = struct.unpack_from('<H', block, page_map)[0]
+            offsets = self._page_maps[block_index] = struct.unpack_from(f'<{count + 1}H', block, page_map + 4)
+        if not 0 < index < len(offsets):
+            raise PstFormatError(f"Heap ID {hid:#x} is out of range")
+        return self.blocks[block_index][offsets[index - 1]:offsets[index]]
+
+    def bth_records(self, hid):
+        """(key, data) pairs of the BTH whose header is at hid, in key order."""
+        header = self.allocation(hid)
+        signature, key_size, data_size, levels, root = struct.unpack_from('<BBBBI', header)
+        if signature != BTH_SIGNATURE:
+            raise PstFormatError(f"Heap allocation {hid:#x} is not a BTH header")
+        if root:
+            yield from self._bth_level(root, key_size, data_size, levels)
+
+    def _bth_level(self, hid, key_size, data_size, levels):
+        records = self.allocation(hid)
+        if not levels:
+            size = key_size + data_size
+            for offset in range(0, len(records) - size + 1, size):
+                yield records[offset:offset + key_size], records[offset + key_size:offset + size]
+            return
+        size = key_size + 4
+        for offset in range(0, len(records) - size + 1, size):
+            child = struct.unpack_from('<I', records, offset + key_size)[0]
+            yield from self._bth_level(child, key_size, data_size, levels - 1)
+
+
+def _inline_value(prop_type, value):
+    if prop_type == PT_BOOLEAN:
+        return bool(value & 0xFF)
+    if prop_type == PT_SHORT:
+        value &= 0xFFFF
+        return value - 0x10000 if value & 0x8000 else value
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def _decode_value(prop_type, raw):
+    if prop_type == PT_UNICODE:
+        return raw.decode('utf-16-le', 'replace').rstrip('\x00')
+    if prop_type == PT_STRING8:
+        return raw.decode('cp1252', 'replace').rstrip('\x00')
+    if prop_type == PT_SYSTIME and len(raw) >= 8:
+        filetime = struct.unpack_from('<Q', raw)[0]
+        try:
+            return FILETIME_EPOCH + timedelta(microseconds=filetime // 10)
+        except OverflowError:
+            return None
+    if prop_type == PT_LONGLONG and len(raw) >= 8:
+        return struct.unpack_from('<q', raw)[0]
+    return raw
+
+
+def _entry_id(record_key, nid):
+    """Outlook EntryID of a PST folder or message: flags, the store's provider UID and the NID."""
+    if not record_key or len(record_key) != 16:
+        return None
+    return (bytes(4) + record_key + struct.pack('<I', nid)).hex().upper()
+
+
+def scan_file(path, message_ids=False):
+    """Inventory of one PST; errors are returned in the entry instead of raised."""
+    try:
+        with PstFile(path) as pst:
+            return pst.inventory(message_ids)
+    except (OSError, PstFormatError, struct.error, IndexError, KeyError, ValueError) as e:
+        return {'path': path, 'error': f"{type(e).__name__}: {e}"}
+
+
+def find_pst_files(paths):
+    """The given files plus every *.pst under the given directories, sorted per directory."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                files.extend(os.path.join(directory, name) for name in sorted(names) if name.lower().endswith('.pst'))
+        else:
+            files.append(path)
+    return files
+
+
+def scan_paths(paths, workers=1, message_ids=False):
+    """Inventory of many PSTs, scanned in workers processes; returns the inventory dict."""
+    files = find_pst_files(paths)
+    started = time.monotonic()
+    if workers > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            entries = list(pool.map(scan_file, files, [message_ids] * len(files)))
+    else:
+        entries = [scan_file(path, message_ids) for path in files]
+    for entry in entries:
+        if 'error' in entry:
+            logging.error(f"Could not scan {entry['path']}: {entry['error']}")
+        else:
+            totals = entry['totals']
+            logging.info(f"Scanned {entry['path']}: {totals['folders']} folders, {totals['items']} items "
+                         f"({totals['mail_items']} mail) in {entry['scan_seconds']}s")
+    return {
+        'version': INVENTORY_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'scan_seconds': round(time.monotonic() - started, 3),
+        'files': entries,
+    }
+
+
+def write_inventory(inventory, path):
+    """Write an inventory as JSON atomically."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(inventory, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def _path_key(path):
+    return (path or '').replace('\\', '/').lower()
+
+
+class PstInventory:
+    """
+    A loaded inventory, looked up by the FilePath Outlook reports for a store. The
+    inventory may have been taken on another machine, so a unique file name matches
+    when the full path does not.
+    """
+
+    def __init__(self, inventory):
+        if inventory.get('version') != INVENTORY_VERSION:
+            raise ValueError(f"Unsupported PST inventory version {inventory.get('version')}")
+        self.created_at = inventory.get('created_at')
+        self.files = [entry for entry in inventory['files'] if 'error' not in entry]
+        self._by_path = {_path_key(entry['path']): entry for entry in self.files}
+        names = defaultdict(list)
+        for entry in self.files:
+            names[_path_key(entry['path']).rsplit('/', 1)[-1]].append(entry)
+        self._by_name = {name: entries[0] for name, entries in names.items() if len(entries) == 1}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def find(self, file_path):
+        """Inventory entry of the PST at file_path, or None."""
+        key = _path_key(file_path)
+        if not key:
+            return None
+        return self._by_path.get(key) or self._by_name.get(key.rsplit('/', 1)[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inventory PST files without Outlook.")
+    parser.add_argument('paths', nargs='+', help="PST files, or directories searched recursively for *.pst")
+    parser.add_argument('--output', default=os.path.join("migration_reports", "pst_inventory.json"),
+                        help="Inventory JSON to write (default: migration_reports/pst_inventory.json)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Files scanned in parallel (default: number of CPUs)")
+    parser.add_argument('--message-ids', action='store_true',
+                        help="Include the Internet Message-ID of every item (large for big PSTs)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    inventory = scan_paths(args.paths, args.workers, args.message_ids)
+    write_inventory(inventory, args.output)
+    scanned = [entry for entry in inventory['files'] if 'error' not in entry]
+    print(f"{len(scanned)} of {len(inventory['files'])} PST files scanned in {inventory['scan_seconds']}s: "
+          f"{sum(entry['totals']['items'] for entry in scanned)} items, "
+          f"{sum(entry['totals']['mail_items'] for entry in scanned)} mail. Inventory: {args.output}")
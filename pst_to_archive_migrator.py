@@ -1,16 +1,119 @@
-import win32com.client
-import pythoncom
+import argparse
+import contextlib
 import logging
+import queue
+import random
+import threading
 import time
 from datetime import datetime
 import json
 import os
-import tkinter as tk
-from tkinter import messagebox
+from collections import Counter, namedtuple
+
+from destination_index import DestinationIndex, MESSAGE_ID_PROPTAG
+from migration_journal import MigrationJournal, ITEM_PLANNED, ITEM_MOVED, ITEM_FAILED, ITEM_DEFERRED
+from migration_logging import ProgressReporter, observe_logging, setup_queue_logging, stop_logging
+from migration_metrics import MigrationMetrics, SamplingProfiler
+from migration_planner import MigrationPlanner, format_duration, is_mail_class, received_filter, unit_label
+from outlook_backend import (ERROR_PERMANENT, ERROR_THROTTLE, OutlookBackend, classify_error, is_not_found_error,
+                             is_session_lost_error, is_throttle_error)
+from outlook_session import OutlookSession
+from pst_scanner import PstInventory
+from report_sink import ReportSink
+from sync_state import SyncState
+from throttle_controller import ThrottleController
+
+# Columns fetched per item in a single folder table query, in ItemRow order (message_id is added last when available)
+ITEM_TABLE_COLUMNS = ['EntryID', 'MessageClass', 'Subject', 'SentOn', 'SenderName', 'Size', 'LastModificationTime']
+ItemRow = namedtuple('ItemRow', ['entry_id', 'message_class', 'subject', 'sent_on', 'sender', 'size', 'modified',
+                                 'message_id'])
+# Per-PST counters an item of a folder ends up in once the folder loop has handled it
+HANDLED_ITEM_COUNTERS = ('total_successful_current_pst', 'total_failed_current_pst', 'total_skipped_current_pst',
+                         'total_deferred_current_pst')
+
+
+def show_dialog(kind, title, message):
+    """Show a tkinter message box ('error' or 'warning'). tkinter is imported on first use only."""
+    try:
+        from tkinter import messagebox
+        getattr(messagebox, f"show{kind}")(title, message)
+    except Exception as e:
+        logging.debug(f"Could not show the '{title}' dialog: {e}")
+
 
 class EmailMigrator:
-    def __init__(self):
-        self.setup_logging()
+    # Items fetched per enumeration window before the collection is re-read
+    ITEM_WINDOW_SIZE = 500
+    # Post-migration polling of the destination count, replaces a fixed sleep
+    SYNC_POLL_INTERVAL = 2.0
+    SYNC_TIMEOUT = 120.0
+    SYNC_STABLE_POLLS = 3
+    # Items whose move failed with a throttling or transient error are retried later by EntryID
+    RETRY_MAX_ATTEMPTS = 5
+    RETRY_BASE_DELAY = 30.0     # Seconds before the first retry, doubled per attempt (throttling starts at twice this)
+    RETRY_MAX_DELAY = 900.0
+    RETRY_BATCH = 100           # Due entries claimed per retry round
+    RETRY_LEASE = 300.0         # A claimed entry is not handed to another worker for this long
+
+    def __init__(self, backend=None, journal_path=None, resume=False, workers=1, max_concurrent_moves=None,
+                 throttle=None, preserve_structure=False, verbose=False, log_to_console=True,
+                 progress_interval=10.0, dedupe=True, planner=None, incremental=False, metrics=None, profiler=None,
+                 retry_timeout=1800.0, inventory=None, sources=None, report_dir="migration_reports",
+                 interactive=True, configure_logging=True, move_slots=None):
+        self.backend = backend or OutlookBackend()
+        # A batch runner configures logging once for all of its migrators
+        self.owns_logging = configure_logging
+        if configure_logging:
+            self.setup_logging(verbose=verbose, console=log_to_console)
+        # Without interaction nothing prompts or opens a dialog; errors only go to the log
+        self.interactive = interactive
+        self.report_dir = report_dir
+        # PST file paths or store display names to migrate instead of every open PST
+        self.sources = list(sources) if sources else None
+        self.opened_store_ids = []  # PSTs this run added to the profile, removed again at the end
+        # One warm OutlookSession per thread; the store and folder ID indexes are shared by all of them
+        self._thread_state = threading.local()
+        self.store_ids = {}
+        self.folder_ids = {}
+        self.session_stats = Counter()
+        self._session_stats_lock = threading.Lock()
+        # Per-item lines are DEBUG; INFO gets a rate-limited progress line instead
+        self.progress = ProgressReporter(interval_seconds=progress_interval)
+        # Shared by all workers, so the rate and any backoff apply to the destination as a whole
+        self.throttle = throttle or ThrottleController()
+        self.workers = max(1, workers)
+        # Global cap on in-flight Move() calls across all workers, protects the destination server
+        self.max_concurrent_moves = max_concurrent_moves
+        if move_slots is not None:
+            # Shared with other migrators, e.g. the jobs of a batch run
+            self.move_slots = move_slots
+        else:
+            self.move_slots = threading.BoundedSemaphore(max_concurrent_moves) if max_concurrent_moves else contextlib.nullcontext()
+        self.resume = resume
+        self.preserve_structure = preserve_structure
+        self.journal = MigrationJournal(journal_path or os.path.join("migration_state", "migration_journal.sqlite3"))
+        # Fingerprints of the destination: skips mail already there and verifies each moved item.
+        # On by default, so a re-run no longer moves a second copy of mail the destination holds
+        self.destination_index = DestinationIndex(os.path.dirname(self.journal.path) or ".") if dedupe else None
+        # Offline PST inventory (pst_scanner): source counts for planning and for reconciling the run
+        self.inventory = inventory
+        self.planner = planner or MigrationPlanner(state_dir=os.path.dirname(self.journal.path) or ".", inventory=inventory)
+        # Per-folder high-water marks: only items modified since the last run are looked at
+        self.incremental = incremental
+        self.sync_state = SyncState(os.path.join(os.path.dirname(self.journal.path) or ".", "sync_state.json")) if incremental else None
+        # Failures and folder summaries are spilled to NDJSON instead of kept in migration_report
+        self.report_sink = ReportSink(report_dir)
+        # Latency histograms per COM call category, exported periodically while the run is going
+        self.metrics = metrics or MigrationMetrics(export_path=os.path.join(report_dir, "migration_metrics"))
+        # Optional sampling profiler (anything with start() and stop()), runs while items are moved
+        self.profiler = profiler
+        # Retry queue (in the journal database): retried between folders, then for up to retry_timeout seconds
+        self.retry_timeout = retry_timeout
+        self.retry_keys = set()     # (pst, EntryID) of queued items, the main pass leaves them to the retry queue
+        self.retry_psts = None      # This run's PSTs; entries queued for other PSTs wait for a run that includes them
+        self.retry_stats = Counter()
+        self._retry_lock = threading.Lock()
+        self.run_id = None
         self.migration_report = {
             'start_time': None,
             'end_time': None,
@@ -19,122 +122,1103 @@ class EmailMigrator:
             'total_attempted': 0,
             'total_successful': 0,
             'total_failed': 0,
+            'total_skipped': 0,
+            'total_duplicates': 0,
+            'total_deferred': 0,
+            'resumed': resume,
+            'incremental': incremental,
+            'workers': self.workers,
+            'preserve_structure': preserve_structure,
+            'journal_path': self.journal.path,
             'aggregate_validation_passed': False,
-            'pst_migrations_details': [],
-            'failed_items_overall': [],
-            'folder_summary_overall': {}
+            'folders_processed': 0,
+            'pst_migrations_details': []
         }
 
-    def setup_logging(self):
-        """Setup comprehensive logging"""
+    @property
+    def session(self):
+        """The calling thread's OutlookSession, or None outside run_migration and its workers."""
+        return getattr(self._thread_state, 'session', None)
+
+    def open_session(self):
+        """Open an OutlookSession for the calling thread (COM apartment included)."""
+        session = OutlookSession(self.backend, store_ids=self.store_ids, folder_ids=self.folder_ids)
+        self._thread_state.session = session
+        return session.open()
+
+    def close_session(self):
+        """Close the calling thread's session and keep its counters for the report."""
+        session = self.session
+        if session is None:
+            return
+        self._thread_state.session = None
+        with self._session_stats_lock:
+            self.session_stats.update(session.stats)
+        session.close()
+
+    def session_snapshot(self):
+        """Counters of all sessions of this run, including the calling thread's open one."""
+        with self._session_stats_lock:
+            stats = self.session_stats.copy()
+        if self.session is not None:
+            stats.update(self.session.stats)
+        return {'stores_indexed': len(self.store_ids), 'folders_indexed': len(self.folder_ids), **stats}
+
+    def metrics_gauges(self):
+        """Point-in-time values exported next to the latency histograms."""
+        return {**self.progress.snapshot(), 'move_rate_limit': round(self.throttle.rate, 3)}
+
+    def setup_logging(self, verbose=False, console=True):
+        """
+        Setup logging: one file handler and one console handler, fed from a queue by a
+        background thread so the move loop never waits on log I/O. verbose adds the
+        per-item DEBUG lines to the log file.
+        """
         log_dir = "migration_logs"
         os.makedirs(log_dir, exist_ok=True)
         log_filename = os.path.join(log_dir, f'pst_migration_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
+        setup_queue_logging(log_filename, verbose=verbose, console=console)
+        logging.info(f"Logging to: {log_filename}")
 
-        logging.basicConfig(
-            filename=log_filename,
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
-        console = logging.StreamHandler()
-        console.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(levelname)s: %(message)s')
-        console.setFormatter(formatter)
-        logging.getLogger().addHandler(console)
-
-        file_handler = logging.FileHandler(log_filename)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        logging.getLogger().addHandler(file_handler)
+    def shutdown_logging(self):
+        """Flush queued log records and close the log handlers."""
+        stop_logging()
 
-        logging.info(f"Logging to: {log_filename}")
+    def alert(self, kind, title, message):
+        """Dialog for an interactive run; headless runs have already logged the problem."""
+        if self.interactive:
+            show_dialog(kind, title, message)
 
     def get_item_signature(self, item):
         """Create a unique signature for reporting/logging"""
         try:
-            return {
-                'subject': getattr(item, 'Subject', 'N/A'),
-                'sent_on': str(getattr(item, 'SentOn', None)) if getattr(item, 'SentOn', None) else None,
-                'sender': getattr(item, 'SenderName', 'N/A'),
-                'entry_id': getattr(item, 'EntryID', 'N/A'),
-                'size': getattr(item, 'Size', 'N/A')
-            }
+            return self.signature_from_row(self.row_from_item(item))
         except Exception as e:
             return {'subject': 'Unknown', 'error': f'Could not get item properties: {e}'}
 
+    def row_from_item(self, item):
+        """Read an ItemRow from an item proxy (one COM call per property)."""
+        with self.metrics.timer('property_read'):
+            return ItemRow(
+                entry_id=getattr(item, 'EntryID', 'N/A'),
+                message_class=getattr(item, 'MessageClass', ''),
+                subject=getattr(item, 'Subject', 'N/A'),
+                sent_on=getattr(item, 'SentOn', None),
+                sender=getattr(item, 'SenderName', 'N/A'),
+                size=getattr(item, 'Size', 'N/A'),
+                modified=getattr(item, 'LastModificationTime', None),
+                message_id=self.get_message_id(item)
+            )
+
+    def get_message_id(self, item):
+        """Internet Message-ID of an item proxy, or None if the item has none."""
+        try:
+            return item.PropertyAccessor.GetProperty(MESSAGE_ID_PROPTAG) or None
+        except Exception:
+            return None
+
+    def signature_from_row(self, row):
+        """Build the reporting signature from a prefetched ItemRow."""
+        return {
+            'subject': row.subject if row.subject is not None else 'N/A',
+            'sent_on': str(row.sent_on) if row.sent_on else None,
+            'sender': row.sender if row.sender is not None else 'N/A',
+            'entry_id': row.entry_id,
+            'size': row.size
+        }
+
+    def is_mail_row(self, row):
+        """Equivalent of item.Class == 43 (olMail) for a prefetched row."""
+        return is_mail_class(row.message_class)
+
     def get_folder_item_count(self, folder_obj):
         """Safely get the count of items in an Outlook folder."""
         try:
-            return folder_obj.Items.Count
+            with self.metrics.timer('count'):
+                return folder_obj.Items.Count
         except Exception as e:
             logging.error(f"Error getting item count for folder '{getattr(folder_obj, 'FolderPath', 'N/A')}': {e}", exc_info=True)
             return -1
 
-    def process_folder(self, source_folder, target_folder, current_pst_report, folder_path=""):
+    def get_target_item_count(self, target_folder):
+        """Item count used for aggregate validation: the whole target subtree when preserving structure."""
+        if self.preserve_structure:
+            return self.count_subtree_items(target_folder)
+        return self.get_folder_item_count(target_folder)
+
+    def move_item(self, item, target_folder):
         """
-        Process all items in a folder and move them to the specified target_folder.
-        Updates the current_pst_report with counts for the current PST.
+        Move one item, paced by the throttle controller.
+        Throttling errors back off and retry up to throttle.max_retries times; any other
+        error, or a throttle that outlasts the retries, is raised to the caller.
         """
+        attempt = 0
+        while True:
+            with self.metrics.timer('throttle_wait'):
+                self.throttle.acquire()
+            started = time.monotonic()
+            try:
+                with self.move_slots:
+                    item.Move(target_folder)
+            except Exception as move_error:
+                self.metrics.observe('move', time.monotonic() - started)
+                if is_throttle_error(move_error) and attempt < self.throttle.max_retries:
+                    attempt += 1
+                    self.metrics.increment('move_throttle_retries')
+                    self.throttle.record_throttle(move_error)
+                    continue
+                raise
+            latency = time.monotonic() - started
+            self.metrics.observe('move', latency)
+            self.throttle.record_success(latency)
+            return
 
-        current_folder_path = f"{folder_path}/{source_folder.Name}" if folder_path else source_folder.Name
-        logging.info(f"Processing folder: {current_folder_path}")
+    def iter_item_rows(self, source_folder, item_filter=None):
+        """
+        Yield (row, item) pairs for every item in a folder, or those matching a Jet item_filter.
+        Rows are read from a folder table ITEM_WINDOW_SIZE at a time, so no item proxy is
+        opened and item is None; the caller opens mail items by EntryID only to move them.
+        If the store cannot provide a table, items are enumerated one by one instead and
+        the row is read from the proxy.
+        """
+        try:
+            with self.metrics.timer('table_open'):
+                table = source_folder.GetTable(item_filter) if item_filter else source_folder.GetTable()
+                table.Columns.RemoveAll()
+                for column in ITEM_TABLE_COLUMNS:
+                    table.Columns.Add(column)
+        except Exception as e:
+            logging.warning(f"Folder table unavailable, reading item properties one by one: {e}")
+            for item in self.iter_folder_items(source_folder, item_filter):
+                yield self.row_from_item(item), item
+            return
 
         try:
-            items_list = list(source_folder.Items)
-            item_count = len(items_list)
-            logging.info(f"Found {item_count} items in '{current_folder_path}' to process.")
+            table.Columns.Add(MESSAGE_ID_PROPTAG)
+            has_message_id = True
+        except Exception:
+            has_message_id = False
 
-            for item in reversed(items_list):
+        while True:
+            with self.metrics.timer('table_read'):
+                rows = table.GetArray(self.ITEM_WINDOW_SIZE)
+            if not rows:
+                break
+            for values in rows:
+                yield (ItemRow(*values) if has_message_id else ItemRow(*values, None)), None
+
+    def iter_folder_items(self, source_folder, item_filter=None):
+        """
+        Yield the items of a folder one proxy at a time, walking indexes downwards in windows.
+        Moving an item only shifts the indexes above it, so the walk stays valid while the
+        collection shrinks, and memory does not grow with the folder size.
+        """
+        items = source_folder.Items
+        if item_filter:
+            items = items.Restrict(item_filter)
+        index = items.Count
+        while index > 0:
+            window_end = max(index - self.ITEM_WINDOW_SIZE, 0)
+            while index > window_end:
                 try:
-                    if item.Class == 43:
-                        current_pst_report['total_attempted_current_pst'] += 1
+                    with self.metrics.timer('item_enum'):
+                        item = items.Item(index)
+                except Exception:
+                    # Something else removed items underneath us; clamp to the new end.
+                    count = items.Count
+                    if index <= count:
+                        raise
+                    index = count
+                    window_end = min(window_end, index)
+                    continue
+                index -= 1
+                yield item
+                del item
+
+            # Start each window from a fresh collection and the current count.
+            items = source_folder.Items
+            index = min(index, items.Count)
+
+    def new_pst_report(self, pst_display_name, pst_file_path):
+        """Create the empty per-PST report that the folder moves fill in."""
+        return {
+            'pst_display_name': pst_display_name,
+            'pst_file_path': pst_file_path,
+            'total_attempted_current_pst': 0,
+            'total_successful_current_pst': 0,
+            'total_failed_current_pst': 0,
+            'total_skipped_current_pst': 0,
+            'total_duplicates_current_pst': 0,
+            'total_deferred_current_pst': 0,
+            'bulk_moved_folders_current_pst': 0,
+            'folders_processed_current_pst': 0,
+            'failed_items_sample_current_pst': []
+        }
+
+    def move_folder_items(self, source_folder, target_folder, current_pst_report, current_folder_path, mail_only=True,
+                          item_filter=None):
+        """
+        Move the items of one folder (not its subfolders) to target_folder and record
+        the folder's summary. With mail_only, only olMail items are moved; item_filter
+        (a Jet filter) limits the move to a planned ReceivedTime window. In incremental
+        mode only items modified since the folder's high-water mark are read. If the
+        Outlook session is lost, it is reconnected and both folders are reopened by EntryID.
+        """
+        pst_key = current_pst_report['pst_file_path']
+        # Below the PST root, as the items will sit below the destination root (when the structure is kept)
+        destination_path = current_folder_path.partition('/')[2]
+        # A folder finished in an earlier run can have new mail in incremental mode, so only items are skipped then
+        folder_already_done = (self.resume and not self.incremental and
+                               self.journal.is_folder_done(pst_key, current_folder_path))
+        successful_before = current_pst_report['total_successful_current_pst']
+        failed_before = current_pst_report['total_failed_current_pst']
+        deferred_before = current_pst_report['total_deferred_current_pst']
+        folder_completed = True
+        sync_key = None
+        folder_started = time.monotonic()
+
+        session = self.session
+        folder_ids = None
+        left_in_source = set()      # Items counted as skipped or failed, not counted again after a reconnect
+        if session is not None:
+            folder_ids = (source_folder.EntryID, source_folder.StoreID, target_folder.EntryID, target_folder.StoreID)
+        reconnects = 0              # Consecutive reconnects without a successful move in between
+        successful_at_reconnect = successful_before
 
-                        original_signature = self.get_item_signature(item)
-                        logging.info(f"Attempting to move item: {original_signature['subject'][:50]}...")
+        while True:
+            try:
+                folder_filter = item_filter
+                if self.sync_state is not None:
+                    sync_key = (source_folder.StoreID, source_folder.EntryID)
+                    boundary_ids = self.sync_state.boundary_ids(*sync_key)
+                    sync_filter = self.sync_state.item_filter(*sync_key)
+                    if sync_filter:
+                        folder_filter = f"{item_filter} AND {sync_filter}" if item_filter else sync_filter
+                with self.metrics.timer('count'):
+                    item_count = source_folder.Items.Restrict(folder_filter).Count if folder_filter else source_folder.Items.Count
+                # Items left in the source before a reconnect are in the count but are not handled again
+                handled_at_count = sum(current_pst_report[key] for key in HANDLED_ITEM_COUNTERS) - len(left_in_source)
+                if folder_already_done:
+                    logging.info(f"Resume: items of '{current_folder_path}' were already moved in a previous run, skipping.")
+                    rows = ()
+                else:
+                    logging.info(f"Found {item_count} items in '{current_folder_path}' to process.")
+                    namespace = source_folder.Session
+                    store_id = source_folder.StoreID
+                    rows = self.iter_item_rows(source_folder, folder_filter)
+
+                for row, item in rows:
+                    if sync_key is not None:
+                        if row.entry_id in boundary_ids:
+                            continue
+                        self.sync_state.observe(*sync_key, row.modified, row.entry_id)
+                    if row.entry_id in left_in_source:
+                        continue
+                    if self.retry_keys and (pst_key, row.entry_id) in self.retry_keys:
+                        # Waiting in the retry queue, possibly from an earlier run; the retry pass moves it
+                        continue
+                    try:
+                        if not mail_only or self.is_mail_row(row):
+                            if self.resume and self.journal.is_item_done(pst_key, row.entry_id):
+                                current_pst_report['total_skipped_current_pst'] += 1
+                                if folder_ids:
+                                    left_in_source.add(row.entry_id)
+                                continue
+
+                            fingerprint = None
+                            if self.destination_index is not None:
+                                fingerprint = self.destination_index.fingerprint_row(row, destination_path)
+                                if fingerprint is not None and not self.destination_index.claim(fingerprint):
+                                    # Already in the destination (or moved earlier in this run); leave it in the source
+                                    current_pst_report['total_skipped_current_pst'] += 1
+                                    current_pst_report['total_duplicates_current_pst'] += 1
+                                    if folder_ids:
+                                        left_in_source.add(row.entry_id)
+                                    logging.debug("Skipping duplicate already in destination: %.50s...", row.subject)
+                                    continue
+
+                            current_pst_report['total_attempted_current_pst'] += 1
+                            self.journal.record_item(pst_key, current_folder_path, row.entry_id, ITEM_PLANNED)
+
+                            original_signature = self.signature_from_row(row)
+                            logging.debug("Attempting to move item: %.50s...", original_signature['subject'])
+
+                            try:
+                                if item is None:
+                                    with self.metrics.timer('open_item'):
+                                        item = namespace.GetItemFromID(row.entry_id, store_id)
+                                self.move_item(item, target_folder)
+                                if fingerprint is not None:
+                                    self.destination_index.record_moved(fingerprint)
+
+                                current_pst_report['total_successful_current_pst'] += 1
+                                self.journal.record_item(pst_key, current_folder_path, row.entry_id, ITEM_MOVED)
+                                self.progress.update(moved=1)
+                                logging.debug("Successfully moved: %.50s...", original_signature['subject'])
+
+                            except Exception as move_error:
+                                if fingerprint is not None:
+                                    self.destination_index.release(fingerprint)
+                                if folder_ids and is_session_lost_error(move_error):
+                                    # Attempted again once the session is back
+                                    current_pst_report['total_attempted_current_pst'] -= 1
+                                    raise
+                                error_class = classify_error(move_error)
+                                if error_class != ERROR_PERMANENT and self.defer_item(
+                                        current_pst_report, current_folder_path, row, store_id, target_folder,
+                                        fingerprint, error_class, move_error):
+                                    if folder_ids:
+                                        left_in_source.add(row.entry_id)
+                                    continue
+                                current_pst_report['total_failed_current_pst'] += 1
+                                if folder_ids:
+                                    left_in_source.add(row.entry_id)
+                                self.journal.record_item(pst_key, current_folder_path, row.entry_id, ITEM_FAILED, str(move_error))
+                                self.record_failure(current_pst_report, {
+                                    'folder': current_folder_path,
+                                    'subject': original_signature['subject'],
+                                    'error': str(move_error),
+                                    'original_signature': original_signature
+                                })
+                                self.progress.update(failed=1)
+                                logging.error("Move failed for '%s': %s", original_signature['subject'], move_error,
+                                              exc_info=True)
+
+                    except Exception as item_error:
+                        if folder_ids and is_session_lost_error(item_error):
+                            raise
+                        current_pst_report['total_failed_current_pst'] += 1
+                        if folder_ids:
+                            left_in_source.add(row.entry_id)
+                        self.progress.update(failed=1)
+                        logging.error("Error processing item in '%s': %s", current_folder_path, item_error, exc_info=True)
+                        continue
+
+            except Exception as folder_items_error:
+                if current_pst_report['total_successful_current_pst'] > successful_at_reconnect:
+                    reconnects = 0
+                    successful_at_reconnect = current_pst_report['total_successful_current_pst']
+                if folder_ids and is_session_lost_error(folder_items_error) and reconnects < session.MAX_RECONNECTS:
+                    reconnects += 1
+                    self.metrics.increment('session_reconnects')
+                    logging.warning(f"Outlook session lost while moving '{current_folder_path}', reconnecting: {folder_items_error}")
+                    try:
+                        session.reconnect()
+                        source_folder = session.folder_by_id(*folder_ids[:2])
+                        target_folder = session.folder_by_id(*folder_ids[2:])
+                        continue
+                    except Exception as reconnect_error:
+                        folder_items_error = reconnect_error
+                folder_completed = False
+                logging.error(f"Error accessing items in folder '{current_folder_path}': {folder_items_error}", exc_info=True)
+                if 'item_count' in locals():
+                    # Only the items the loop had not reached; the ones it handled are already counted
+                    handled = sum(current_pst_report[key] for key in HANDLED_ITEM_COUNTERS) - handled_at_count
+                    current_pst_report['total_failed_current_pst'] += max(item_count - handled, 0)
+            break
+
+        folder_failed = (not folder_completed or current_pst_report['total_failed_current_pst'] != failed_before or
+                         current_pst_report['total_deferred_current_pst'] != deferred_before)
+        if not folder_failed and not folder_already_done:
+            self.journal.mark_folder_done(pst_key, current_folder_path)
+        if folder_failed and sync_key is not None:
+            self.sync_state.mark_failed(*sync_key)
+
+        successful = current_pst_report['total_successful_current_pst'] - successful_before
+        seconds = time.monotonic() - folder_started
+        items_per_second = self.metrics.record_folder(current_folder_path, successful, seconds)
+        self.record_folder_summary(
+            current_pst_report, current_folder_path,
+            successful=successful,
+            failed=current_pst_report['total_failed_current_pst'] - failed_before,
+            total_items=item_count if 'item_count' in locals() else 0,
+            seconds=round(seconds, 3),
+            items_per_second=round(items_per_second, 3) if items_per_second else None
+        )
+        # Interleave due retries with the main pass
+        self.retry_due_items()
 
-                        try:
-                            item.Move(target_folder)
-
-                            current_pst_report['total_successful_current_pst'] += 1
-                            logging.info(f"Successfully moved: {original_signature['subject'][:50]}...")
-
-                        except Exception as move_error:
-                            current_pst_report['total_failed_current_pst'] += 1
-                            current_pst_report['failed_items_current_pst'].append({
-                                'folder': current_folder_path,
-                                'subject': original_signature['subject'],
-                                'error': str(move_error),
-                                'original_signature': original_signature
-                            })
-                            logging.error(f"Move failed for '{original_signature['subject']}': {move_error}", exc_info=True)
-
-                except Exception as item_error:
-                    current_pst_report['total_failed_current_pst'] += 1
-                    logging.error(f"Error processing item in '{current_folder_path}': {item_error}", exc_info=True)
-                    continue
+    def retry_delay(self, attempts, error_class):
+        """Seconds until the next retry: exponential in the attempt count, with jitter."""
+        base = self.RETRY_BASE_DELAY * (2 if error_class == ERROR_THROTTLE else 1)
+        return min(base * 2 ** (attempts - 1), self.RETRY_MAX_DELAY) * random.uniform(0.8, 1.2)
 
-        except Exception as folder_items_error:
-            logging.error(f"Error accessing items in folder '{current_folder_path}': {folder_items_error}", exc_info=True)
-            current_pst_report['total_failed_current_pst'] += item_count if 'item_count' in locals() else 0
+    def defer_item(self, current_pst_report, folder_path, row, store_id, target_folder, fingerprint, error_class, error):
+        """Queue an item whose move failed with a throttling or transient error; False if it cannot be queued."""
+        pst_key = current_pst_report['pst_file_path']
+        try:
+            target_entry_id, target_store_id = target_folder.EntryID, target_folder.StoreID
+        except Exception as e:
+            logging.warning(f"Cannot queue a retry, the target folder is unreadable: {e}")
+            return False
+        self.journal.enqueue_retry({
+            'pst': pst_key,
+            'pst_display_name': current_pst_report['pst_display_name'],
+            'folder': folder_path,
+            'store_id': store_id,
+            'entry_id': row.entry_id,
+            'target_entry_id': target_entry_id,
+            'target_store_id': target_store_id,
+            'subject': row.subject,
+            'fingerprint': f"{fingerprint:016x}" if fingerprint is not None else None,
+            'error_class': error_class,
+            'last_error': str(error),
+            'attempts': 1,
+            'run_id': self.run_id,
+        }, self.retry_delay(1, error_class))
+        self.journal.record_item(pst_key, folder_path, row.entry_id, ITEM_DEFERRED, str(error))
+        with self._retry_lock:
+            self.retry_keys.add((pst_key, row.entry_id))
+            self.retry_stats['deferred'] += 1
+            self.retry_stats[f'deferred_{error_class}'] += 1
+        current_pst_report['total_deferred_current_pst'] += 1
+        logging.warning("Move of '%.50s' failed with a %s error, queued for retry: %s", row.subject, error_class, error)
+        return True
+
+    def retry_due_items(self):
+        """Retry the queued items that are due, in the calling thread's session; returns how many were handled."""
+        session = self.session
+        if session is None or not self.retry_keys:
+            return 0
+        entries = self.journal.claim_due_retries(self.RETRY_BATCH, self.RETRY_LEASE, self.retry_psts)
+        for entry in entries:
+            self.retry_item(session, entry)
+        return len(entries)
+
+    def retry_item(self, session, entry):
+        """One deferred move by EntryID: moved, queued again with a longer delay, or failed for good."""
+        fingerprint = int(entry['fingerprint'], 16) if entry['fingerprint'] else None
+        if fingerprint is not None and self.destination_index is not None and not self.destination_index.claim(fingerprint):
+            # A copy reached the destination in the meantime; if the item has left the source, it is that copy
+            if self.left_source(session, entry):
+                self.finish_moved_retry(entry, fingerprint)
+            else:
+                self.finish_retry(entry, 'duplicates')
+            return
+        with self._retry_lock:
+            self.retry_stats['attempts'] += 1
+        try:
+            with self.metrics.timer('folder_open'):
+                target_folder = session.folder_by_id(entry['target_entry_id'], entry['target_store_id'])
+            with self.metrics.timer('open_item'):
+                item = session.item_by_id(entry['entry_id'], entry['store_id'])
+            self.move_item(item, target_folder)
+        except Exception as e:
+            if fingerprint is not None and self.destination_index is not None:
+                self.destination_index.release(fingerprint)
+            error_class = classify_error(e)
+            if error_class != ERROR_PERMANENT and entry['attempts'] < self.RETRY_MAX_ATTEMPTS:
+                attempts = entry['attempts'] + 1
+                self.journal.enqueue_retry({**entry, 'attempts': attempts, 'error_class': error_class,
+                                            'last_error': str(e)}, self.retry_delay(attempts, error_class))
+                logging.debug("Retry %d of '%.50s' failed with a %s error, queued again: %s",
+                              entry['attempts'], entry['subject'], error_class, e)
+                return
+            if is_not_found_error(e) and self.retry_arrived(session, entry, fingerprint):
+                logging.info("'%.50s' is gone from the source but in the destination; an earlier move went through.",
+                             entry['subject'])
+                self.finish_moved_retry(entry, fingerprint)
+                return
+            self.journal.record_item(entry['pst'], entry['folder'], entry['entry_id'], ITEM_FAILED, str(e))
+            self.report_sink.record_failure({
+                'pst_display_name': entry['pst_display_name'],
+                'folder': entry['folder'],
+                'subject': entry['subject'],
+                'error': str(e),
+                'error_class': error_class,
+                'retry_attempts': entry['attempts'],
+                'original_signature': {'entry_id': entry['entry_id'], 'subject': entry['subject']}
+            })
+            self.progress.update(failed=1)
+            logging.error("Move of '%s' failed after %d retries (%s error): %s",
+                          entry['subject'], entry['attempts'], error_class, e)
+            self.finish_retry(entry, 'failed')
+            return
+
+        logging.debug("Retry moved: %.50s...", entry['subject'])
+        self.finish_moved_retry(entry, fingerprint)
+
+    def retry_arrived(self, session, entry, fingerprint):
+        """
+        Whether a queued item that is gone from the source reached the destination after all,
+        as when a Move() went through on the server but raised a timeout. The journal knows
+        if another attempt moved it; otherwise the destination index is brought up to date and
+        asked for the fingerprint. Without a fingerprint (no dedupe, no Message-ID) this is unknown.
+        """
+        if self.journal.is_item_done(entry['pst'], entry['entry_id']):
+            return True
+        if fingerprint is None or self.destination_index is None:
+            return False
+        try:
+            with self.metrics.timer('folder_open'):
+                destination_root = session.folder_by_id(self.destination_index.root_id, entry['target_store_id'])
+            with self.metrics.timer('table_read'):
+                self.destination_index.refresh(destination_root)
+        except Exception as e:
+            logging.warning(f"Cannot look for '{entry['subject']}' in the destination: {e}")
+            return False
+        return fingerprint in self.destination_index
 
-        current_pst_report['folder_summary_current_pst'][current_folder_path] = {
-            'successful_moves_from_this_folder': current_pst_report['total_successful_current_pst'] - sum(f['successful_moves_from_this_folder'] for f in current_pst_report['folder_summary_current_pst'].values()),
-            'failed_moves_from_this_folder': current_pst_report['total_failed_current_pst'] - sum(f['failed_moves_from_this_folder'] for f in current_pst_report['folder_summary_current_pst'].values()),
-            'total_items_in_source_folder': item_count if 'item_count' in locals() else 0
+    def left_source(self, session, entry):
+        """True if a queued item can no longer be found in its PST."""
+        try:
+            with self.metrics.timer('open_item'):
+                session.item_by_id(entry['entry_id'], entry['store_id'])
+        except Exception as e:
+            return is_not_found_error(e)
+        return False
+
+    def finish_moved_retry(self, entry, fingerprint):
+        """Record a queued item as moved and take it off the queue."""
+        if fingerprint is not None and self.destination_index is not None:
+            self.destination_index.record_moved(fingerprint)
+        self.journal.record_item(entry['pst'], entry['folder'], entry['entry_id'], ITEM_MOVED)
+        self.progress.update(moved=1)
+        self.finish_retry(entry, 'moved')
+
+    def finish_retry(self, entry, outcome):
+        """Take an entry off the retry queue and count its outcome (moved, failed or duplicates)."""
+        self.journal.remove_retry(entry['pst'], entry['entry_id'])
+        with self._retry_lock:
+            self.retry_keys.discard((entry['pst'], entry['entry_id']))
+            self.retry_stats[outcome] += 1
+            if entry['run_id'] != self.run_id:
+                self.retry_stats[f'{outcome}_from_earlier_runs'] += 1
+
+    def drain_retry_queue(self):
+        """
+        After the main pass, keep retrying until the queue is empty or the next due entry lies
+        beyond retry_timeout seconds; whatever is left stays queued for the next run.
+        """
+        deadline = time.monotonic() + self.retry_timeout
+        while self.retry_keys:
+            if self.retry_due_items():
+                continue
+            pending, next_attempt_at = self.journal.pending_retries(self.retry_psts)
+            if not pending:
+                break
+            wait = max(next_attempt_at - time.time(), 0.0)
+            if time.monotonic() + wait > deadline:
+                logging.warning(f"{pending} items stay in the retry queue for the next run.")
+                break
+            logging.info(f"Retry queue: {pending} items, next retry in {wait:.0f}s.")
+            time.sleep(wait)
+
+    def apply_retry_outcomes(self):
+        """Add the outcomes of retries to the overall totals; returns the retry summary for the report."""
+        with self._retry_lock:
+            stats = dict(self.retry_stats)
+        report = self.migration_report
+        report['total_successful'] += stats.get('moved', 0)
+        report['total_failed'] += stats.get('failed', 0)
+        report['total_skipped'] += stats.get('duplicates', 0)
+        report['total_duplicates'] += stats.get('duplicates', 0)
+        # Items deferred by an earlier run were not attempted by this run's main pass
+        report['total_attempted'] += stats.get('moved_from_earlier_runs', 0) + stats.get('failed_from_earlier_runs', 0)
+        pending, _ = self.journal.pending_retries(self.retry_psts)
+        report['total_deferred'] = pending
+        return {**stats, 'still_queued': pending}
+
+    def reconcile_with_inventory(self, queued_at_start):
+        """
+        Compare the items each PST report accounts for (attempted, skipped, queued for retry
+        by an earlier run, or moved by an earlier run since the inventory was taken) with the
+        source counts of the offline inventory. Fewer than the inventory lists means items
+        were missed; more is mail that arrived after the scan.
+        """
+        count_key = 'items' if self.preserve_structure else 'mail_items'
+        try:
+            inventory_taken = datetime.fromisoformat(self.inventory.created_at).timestamp()
+        except (TypeError, ValueError):
+            inventory_taken = 0.0
+        # Moves of a resumed run's predecessors are gone from the source, only the journal still knows them
+        moved_earlier = self.journal.moved_item_counts(inventory_taken, datetime.fromisoformat(self.run_id).timestamp())
+        psts = []
+        for pst_detail in self.migration_report['pst_migrations_details']:
+            entry = self.inventory.find(pst_detail['pst_file_path'])
+            if entry is None:
+                continue
+            expected = entry['totals'][count_key]
+            moved_by_earlier_runs = moved_earlier.get(pst_detail['pst_file_path'], 0)
+            accounted = (pst_detail['total_attempted_current_pst'] + pst_detail['total_skipped_current_pst'] +
+                         queued_at_start.get(pst_detail['pst_file_path'], 0) + moved_by_earlier_runs)
+            psts.append({
+                'pst_display_name': pst_detail['pst_display_name'],
+                'pst_file_path': pst_detail['pst_file_path'],
+                'inventory_path': entry['path'],
+                'expected': expected,
+                'moved_by_earlier_runs': moved_by_earlier_runs,
+                'accounted': accounted,
+                'unaccounted': max(expected - accounted, 0),
+            })
+        return {
+            'inventory_created_at': self.inventory.created_at,
+            'psts_reconciled': len(psts),
+            'psts_not_in_inventory': len(self.migration_report['pst_migrations_details']) - len(psts),
+            'unaccounted': sum(pst['unaccounted'] for pst in psts),
+            'psts': psts,
         }
 
-        for subfolder in source_folder.Folders:
+    def migrate_folder_tree(self, source_folder, destination_folder, current_pst_report, folder_path=""):
+        """
+        Structure-preserving migration: move the items of source_folder into destination_folder
+        and mirror each subfolder beneath it. A subfolder with no counterpart in the destination
+        is moved as a unit with one Folder.MoveTo; existing counterparts, and whatever a bulk
+        move leaves behind, are merged item by item.
+        """
+        current_folder_path = f"{folder_path}/{source_folder.Name}" if folder_path else source_folder.Name
+        logging.info(f"Processing folder: {current_folder_path}")
+
+        self.move_folder_items(source_folder, destination_folder, current_pst_report, current_folder_path, mail_only=False)
+
+        # Snapshot the subfolders first, bulk moves remove them from source_folder.Folders
+        with self.metrics.timer('folder_enum'):
+            subfolders = list(source_folder.Folders)
+        for subfolder in subfolders:
             try:
-                self.process_folder(subfolder, target_folder, current_pst_report, current_folder_path)
+                subfolder_name = subfolder.Name
+                destination_subfolder = self.find_child_folder(destination_folder, subfolder_name)
+                if destination_subfolder is None:
+                    if self.bulk_move_folder(subfolder, source_folder, destination_folder, current_pst_report,
+                                             f"{current_folder_path}/{subfolder_name}"):
+                        continue
+                    subfolder = self.find_child_folder(source_folder, subfolder_name)
+                    destination_subfolder = self.create_folder_if_not_exists(destination_folder, subfolder_name)
+                    if subfolder is None:
+                        continue
+                if destination_subfolder is None:
+                    logging.error(f"Failed to create destination folder for '{subfolder_name}'. Skipping its contents.")
+                    current_pst_report['total_failed_current_pst'] += 1
+                    continue
+                self.migrate_folder_tree(subfolder, destination_subfolder, current_pst_report, current_folder_path)
             except Exception as subfolder_error:
                 logging.error(f"Error processing subfolder '{subfolder.Name}': {subfolder_error}", exc_info=True)
                 current_pst_report['total_failed_current_pst'] += 1
 
+    def bulk_move_folder(self, subfolder, source_parent, destination_parent, current_pst_report, folder_path):
+        """
+        Move a whole subtree with a single Folder.MoveTo and verify it by item counts. With
+        the destination index, the subtree's fingerprints are read first, so the per-item
+        verification covers the bulk-moved items too. Returns True when nothing is left to do,
+        False when the caller must merge the remaining source folder item by item.
+        """
+        subfolder_name = subfolder.Name
+        expected = self.count_subtree_items(subfolder)
+        if expected < 0:
+            return False
+        destination_path = folder_path.partition('/')[2]
+        moved_fingerprints = None
+        if self.destination_index is not None:
+            try:
+                with self.metrics.timer('table_read'):
+                    moved_fingerprints = self.destination_index.subtree_fingerprints(subfolder, destination_path)
+            except Exception as e:
+                logging.warning(f"Cannot read the items of '{folder_path}' for verification, moving them one by one: {e}")
+                return False
+
+        try:
+            with self.metrics.timer('folder_move'):
+                subfolder.MoveTo(destination_parent)
+        except Exception as e:
+            remaining_folder = self.find_child_folder(source_parent, subfolder_name)
+            if remaining_folder is not None:
+                logging.warning(f"Bulk move of '{folder_path}' failed, falling back to per-item moves: {e}")
+                self.credit_failed_bulk_move(remaining_folder, current_pst_report, folder_path, expected,
+                                             moved_fingerprints)
+                return False
+            logging.warning(f"Bulk move of '{folder_path}' raised an error, but the folder left the source: {e}")
+
+        moved_folder = self.find_child_folder(destination_parent, subfolder_name)
+        arrived = self.count_subtree_items(moved_folder) if moved_folder is not None else 0
+        if moved_fingerprints is not None:
+            if arrived != expected:
+                # Only what reached the destination; the rest is merged item by item or counted as failed
+                try:
+                    with self.metrics.timer('table_read'):
+                        moved_fingerprints &= (self.destination_index.subtree_fingerprints(moved_folder, destination_path)
+                                               if moved_folder is not None else set())
+                except Exception as e:
+                    logging.warning(f"Cannot read the bulk moved items of '{folder_path}' for verification: {e}")
+                    moved_fingerprints = set()
+            self.destination_index.record_bulk_move(moved_fingerprints)
+        current_pst_report['total_attempted_current_pst'] += arrived
+        current_pst_report['total_successful_current_pst'] += arrived
+        current_pst_report['bulk_moved_folders_current_pst'] += 1
+        self.progress.update(moved=arrived)
+
+        if arrived == expected:
+            self.record_folder_summary(current_pst_report, folder_path, successful=arrived, failed=0,
+                                       total_items=expected, bulk_moved=True)
+            logging.info(f"Bulk moved '{folder_path}' with {arrived} items (count verified).")
+            return True
+
+        logging.warning(f"Bulk move of '{folder_path}' verified {arrived} of {expected} items.")
+        if self.find_child_folder(source_parent, subfolder_name) is not None:
+            # Partial move: the rest is still in the source and gets merged item by item
+            self.record_folder_summary(current_pst_report, folder_path, successful=arrived, failed=0,
+                                       total_items=expected, bulk_moved=True)
+            return False
+
+        missing = expected - arrived
+        current_pst_report['total_attempted_current_pst'] += missing
+        current_pst_report['total_failed_current_pst'] += missing
+        self.progress.update(failed=missing)
+        self.record_folder_summary(current_pst_report, folder_path, successful=arrived, failed=missing,
+                                   total_items=expected, bulk_moved=True)
+        self.record_failure(current_pst_report, {
+            'folder': folder_path,
+            'subject': f"<{missing} items missing after bulk folder move>",
+            'error': f"Expected {expected} items in the moved folder, found {arrived}",
+            'original_signature': None
+        })
+        return True
+
+    def credit_failed_bulk_move(self, remaining_folder, current_pst_report, folder_path, expected, moved_fingerprints):
+        """
+        A Folder.MoveTo that failed partway may have moved part of the subtree already:
+        count what is left in the source and credit the difference as moved.
+        """
+        remaining = self.count_subtree_items(remaining_folder)
+        if remaining < 0 or remaining >= expected:
+            return
+        moved = expected - remaining
+        if moved_fingerprints is not None:
+            try:
+                with self.metrics.timer('table_read'):
+                    moved_fingerprints -= self.destination_index.subtree_fingerprints(
+                        remaining_folder, folder_path.partition('/')[2])
+            except Exception as e:
+                logging.warning(f"Cannot read the items left in '{folder_path}' for verification: {e}")
+                moved_fingerprints = set()
+            self.destination_index.record_bulk_move(moved_fingerprints)
+        current_pst_report['total_attempted_current_pst'] += moved
+        current_pst_report['total_successful_current_pst'] += moved
+        self.progress.update(moved=moved)
+        self.record_folder_summary(current_pst_report, folder_path, successful=moved, failed=0,
+                                   total_items=expected, bulk_moved=True)
+        logging.info(f"Bulk move of '{folder_path}' moved {moved} of {expected} items before it failed; "
+                     f"the rest is merged item by item.")
+
+    def record_failure(self, current_pst_report, failure):
+        """Spill a failed item to the report sink, keeping only a small per-PST sample in memory."""
+        failure = {'pst_display_name': current_pst_report['pst_display_name'], **failure}
+        self.report_sink.record_failure(failure)
+        if len(current_pst_report['failed_items_sample_current_pst']) < 5:
+            current_pst_report['failed_items_sample_current_pst'].append(failure)
+
+    def record_folder_summary(self, current_pst_report, folder_path, successful, failed, total_items, **extra):
+        """Spill one folder's counts to the report sink."""
+        current_pst_report['folders_processed_current_pst'] += 1
+        self.report_sink.record_folder({
+            'pst_display_name': current_pst_report['pst_display_name'],
+            'folder': folder_path,
+            'successful_moves_from_this_folder': successful,
+            'failed_moves_from_this_folder': failed,
+            'total_items_in_source_folder': total_items,
+            **extra
+        })
+
+    def count_subtree_items(self, folder):
+        """Total Items.Count of a folder and all its subfolders, or -1 if it cannot be read."""
+        try:
+            with self.metrics.timer('count'):
+                count = folder.Items.Count
+            with self.metrics.timer('folder_enum'):
+                subfolders = list(folder.Folders)
+            return count + sum(self.count_subtree_items(subfolder) for subfolder in subfolders)
+        except Exception as e:
+            logging.error(f"Error counting items under '{getattr(folder, 'FolderPath', 'N/A')}': {e}", exc_info=True)
+            return -1
+
+    def find_child_folder(self, parent_folder, folder_name):
+        """Return the direct subfolder with the given name, or None."""
+        try:
+            with self.metrics.timer('folder_lookup'):
+                return parent_folder.Folders[folder_name]
+        except Exception:
+            return None
+
+    def create_folder_if_not_exists(self, parent_folder, folder_name):
+        """Creates a new folder in the parent folder if it doesn't already exist."""
+        existing = self.find_child_folder(parent_folder, folder_name)
+        if existing is not None:
+            return existing
+        try:
+            with self.metrics.timer('folder_create'):
+                new_folder = parent_folder.Folders.Add(folder_name)
+            logging.info(f"Created new folder: {new_folder.FolderPath}")
+            return new_folder
+        except Exception as e:
+            logging.error(f"Failed to create folder '{folder_name}': {e}", exc_info=True)
+            return None
+
+    def migrate_pst_store(self, pst_store_obj, target_folder):
+        """
+        Recreate the folder tree of one PST store below target_folder, move its items and
+        return its per-PST report. Flattened runs move planned shards (migrate_shards) instead.
+        """
+        current_pst_report = self.new_pst_report(pst_store_obj.DisplayName, getattr(pst_store_obj, 'FilePath', 'N/A'))
+        self.migrate_folder_tree(pst_store_obj.GetRootFolder(), target_folder, current_pst_report)
+        return current_pst_report
+
+    def merge_pst_report(self, current_pst_report):
+        """Add a finished per-PST report to the overall migration report."""
+        self.migration_report['pst_migrations_details'].append(current_pst_report)
+        self.migration_report['total_attempted'] += current_pst_report['total_attempted_current_pst']
+        self.migration_report['total_successful'] += current_pst_report['total_successful_current_pst']
+        self.migration_report['total_failed'] += current_pst_report['total_failed_current_pst']
+        self.migration_report['total_skipped'] += current_pst_report['total_skipped_current_pst']
+        self.migration_report['total_duplicates'] += current_pst_report['total_duplicates_current_pst']
+        self.migration_report['total_deferred'] += current_pst_report['total_deferred_current_pst']
+        self.migration_report['folders_processed'] += current_pst_report['folders_processed_current_pst']
+
+    def migrate_stores_in_parallel(self, all_pst_stores, target_folder):
+        """
+        Migrate PST stores with a pool of worker threads and return their reports in store order.
+        COM objects cannot cross apartments, so workers receive StoreIDs/EntryIDs and reopen
+        the stores and the target folder in their own session.
+        """
+        work_queue = queue.Queue()
+        for index, pst_store_obj in enumerate(all_pst_stores):
+            work_queue.put((index, pst_store_obj.StoreID, pst_store_obj.DisplayName, getattr(pst_store_obj, 'FilePath', 'N/A')))
+        results = [None] * len(all_pst_stores)
+        target_ids = (target_folder.EntryID, target_folder.StoreID)
+
+        worker_count = min(self.workers, len(all_pst_stores))
+        logging.info(f"Migrating {len(all_pst_stores)} PSTs with {worker_count} workers "
+                     f"(at most {self.max_concurrent_moves or 'unlimited'} concurrent moves).")
+        threads = [
+            threading.Thread(target=self.run_store_worker, args=(work_queue, results, target_ids),
+                             name=f"pst-worker-{n + 1}", daemon=True)
+            for n in range(worker_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Stores left behind by workers whose session could not be opened
+        while not work_queue.empty():
+            index, _, display_name, file_path = work_queue.get_nowait()
+            results[index] = self.failed_store_report(display_name, file_path, "No worker could open an Outlook session.")
+        return results
+
+    def run_store_worker(self, work_queue, results, target_ids):
+        """Worker thread: own COM apartment and Outlook session, migrates stores until the queue is empty."""
+        try:
+            session = self.open_session()
+            target_folder = session.folder_by_id(*target_ids)
+
+            while True:
+                try:
+                    index, store_id, display_name, file_path = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                logging.info(f"--- {threading.current_thread().name} processing PST '{display_name}' (Path: {file_path}) ---")
+                print(f"\n--- {threading.current_thread().name} processing PST '{display_name}' ---")
+                try:
+                    results[index] = self.migrate_pst_store(session.store_by_id(store_id), target_folder)
+                except Exception as e:
+                    logging.error(f"Worker failed to migrate PST '{display_name}': {e}", exc_info=True)
+                    results[index] = self.failed_store_report(display_name, file_path, str(e))
+
+        except Exception as e:
+            logging.error(f"{threading.current_thread().name} could not open an Outlook session: {e}", exc_info=True)
+        finally:
+            self.close_session()
+
+    def failed_store_report(self, display_name, file_path, error):
+        """Per-PST report for a store that could not be processed at all."""
+        current_pst_report = self.new_pst_report(display_name, file_path)
+        current_pst_report['total_failed_current_pst'] = 1
+        current_pst_report['store_error'] = error
+        return current_pst_report
+
+    def plan_migration(self, all_pst_stores):
+        """Scan the PST stores and return the shard plan, with an ETA from previous runs."""
+        logging.info(f"Planning: scanning folder tables of {len(all_pst_stores)} PSTs...")
+        plan = self.planner.build_plan(all_pst_stores, mail_only=not self.preserve_structure,
+                                       workers=self.workers, fallback_rate=self.throttle.rate,
+                                       item_filter=self.sync_state.item_filter if self.sync_state else None)
+        self.migration_report['plan'] = {key: value for key, value in plan.items() if key != 'shards'}
+        self.migration_report['plan']['shard_count'] = len(plan['shards'])
+        summary = (f"Plan: {plan['total_items']} items ({plan['total_bytes'] / (1024 * 1024):.1f} MB) in "
+                   f"{plan['folders']} folders, {len(plan['shards'])} shards. "
+                   f"Estimated duration: {format_duration(plan['eta_seconds'])} "
+                   f"({plan['items_per_second']} items/s, {plan['rate_source']}).")
+        logging.info(summary)
+        print(f"\n{summary}")
+        return plan
+
+    def save_plan(self, plan):
+        """Write the plan (with all shards) to the report directory and return its path."""
+        os.makedirs(self.report_dir, exist_ok=True)
+        plan_filename = os.path.join(self.report_dir, f'migration_plan_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+        with open(plan_filename, 'w') as f:
+            json.dump(plan, f, indent=2, default=str)
+        logging.info(f"Migration plan saved to: {plan_filename}")
+        return plan_filename
+
+    def migrate_shard(self, session, shard, target_ids):
+        """
+        Move the folders and ReceivedTime windows of one planned shard into the folder with
+        target_ids (EntryID, StoreID); returns the shard's per-PST report. Folders are opened
+        by EntryID, so a unit whose folders cannot be opened because the session was lost
+        (by this or another worker) is retried after a reconnect.
+        """
+        shard_report = self.new_pst_report(shard['pst_display_name'], shard['pst_file_path'])
+        target_folder = None
+        for unit in shard['units']:
+            label = unit_label(unit)
+            reconnects = 0
+            while True:
+                try:
+                    with self.metrics.timer('folder_open'):
+                        if target_folder is None:
+                            target_folder = session.folder_by_id(*target_ids)
+                        source_folder = session.folder_by_id(unit['entry_id'], shard['store_id'])
+                    logging.info(f"Processing folder: {label}")
+                    self.move_folder_items(source_folder, target_folder, shard_report, label,
+                                           item_filter=received_filter(unit))
+                except Exception as e:
+                    if is_session_lost_error(e) and reconnects < session.MAX_RECONNECTS:
+                        reconnects += 1
+                        self.metrics.increment('session_reconnects')
+                        logging.warning(f"Outlook session lost before '{label}' was moved, reconnecting: {e}")
+                        try:
+                            session.reconnect()
+                            target_folder = None
+                            continue
+                        except Exception as reconnect_error:
+                            e = reconnect_error
+                    logging.error(f"Error opening planned folder '{label}': {e}", exc_info=True)
+                    shard_report['total_failed_current_pst'] += unit['items']
+                    if self.sync_state is not None:
+                        self.sync_state.mark_failed(shard['store_id'], unit['entry_id'])
+                break
+        return shard_report
+
+    def migrate_shards(self, plan, all_pst_stores, target_folder):
+        """
+        Move every shard of the plan into target_folder, on worker threads when workers > 1,
+        then sweep the folders the plan has no units for, and return one per-PST report per
+        store in store order.
+        """
+        shards = plan['shards']
+        shard_reports = [None] * len(shards)
+        worker_count = min(self.workers, len(shards))
+        target_ids = (target_folder.EntryID, target_folder.StoreID)
+        if worker_count <= 1:
+            for index, shard in enumerate(shards):
+                shard_reports[index] = self.migrate_shard(self.session, shard, target_ids)
+        else:
+            work_queue = queue.Queue()
+            for index, shard in enumerate(shards):
+                work_queue.put((index, shard))
+            logging.info(f"Migrating {len(shards)} shards with {worker_count} workers "
+                         f"(at most {self.max_concurrent_moves or 'unlimited'} concurrent moves).")
+            threads = [
+                threading.Thread(target=self.run_shard_worker, args=(work_queue, shard_reports, target_ids),
+                                 name=f"shard-worker-{n + 1}", daemon=True)
+                for n in range(worker_count)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        pst_reports = {}
+        for store in all_pst_stores:
+            pst_reports[store.StoreID] = self.new_pst_report(store.DisplayName, getattr(store, 'FilePath', 'N/A'))
+        for shard, shard_report in zip(shards, shard_reports):
+            if shard_report is None:
+                # Left behind by workers whose session could not be opened
+                shard_report = self.failed_store_report(shard['pst_display_name'], shard['pst_file_path'],
+                                                        "No worker could open an Outlook session.")
+                shard_report['total_failed_current_pst'] = shard['items']
+            self.combine_pst_reports(pst_reports[shard['store_id']], shard_report)
+        self.sweep_unplanned_folders(plan, all_pst_stores, target_folder, pst_reports)
+        return list(pst_reports.values())
+
+    def sweep_unplanned_folders(self, plan, all_pst_stores, target_folder, pst_reports):
+        """
+        Move the mail of folders the plan has no units for: folders that were empty when the
+        plan was made, or created since. Runs in the calling thread once the shards are done.
+        """
+        planned = {unit['entry_id'] for shard in plan['shards'] for unit in shard['units']}
+        for store in all_pst_stores:
+            current_pst_report = pst_reports[store.StoreID]
+            stack = [(store.GetRootFolder(), "")]
+            while stack:
+                folder, parent_path = stack.pop()
+                folder_path = f"{parent_path}/{folder.Name}" if parent_path else folder.Name
+                try:
+                    with self.metrics.timer('folder_enum'):
+                        stack.extend((subfolder, folder_path) for subfolder in folder.Folders)
+                    if folder.EntryID in planned:
+                        continue
+                    with self.metrics.timer('count'):
+                        if not folder.Items.Count:
+                            continue
+                    logging.info(f"Processing folder not in the plan: {folder_path}")
+                    self.move_folder_items(folder, target_folder, current_pst_report, folder_path)
+                except Exception as e:
+                    logging.error(f"Error sweeping folder '{folder_path}': {e}", exc_info=True)
+                    current_pst_report['total_failed_current_pst'] += 1
+
+    def run_shard_worker(self, work_queue, shard_reports, target_ids):
+        """Worker thread: own COM apartment and Outlook session, migrates shards until the queue is empty."""
+        try:
+            session = self.open_session()
+
+            while True:
+                try:
+                    index, shard = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                logging.info(f"--- {threading.current_thread().name} processing shard {shard['shard_id']} of PST "
+                             f"'{shard['pst_display_name']}' ({shard['items']} items) ---")
+                shard_reports[index] = self.migrate_shard(session, shard, target_ids)
+
+        except Exception as e:
+            logging.error(f"{threading.current_thread().name} could not open an Outlook session: {e}", exc_info=True)
+        finally:
+            self.close_session()
+
+    def combine_pst_reports(self, current_pst_report, shard_report):
+        """Add the counters and failure sample of a shard report to its PST's report."""
+        for key, value in shard_report.items():
+            if key.endswith('_current_pst') and isinstance(value, int):
+                current_pst_report[key] += value
+        sample = current_pst_report['failed_items_sample_current_pst']
+        sample.extend(shard_report['failed_items_sample_current_pst'][:max(0, 5 - len(sample))])
+        if 'store_error' in shard_report:
+            current_pst_report['store_error'] = shard_report['store_error']
+
+    def wait_for_target_sync(self, target_folder, expected_count):
+        """
+        Poll the target count until it reaches expected_count or stops changing for
+        SYNC_STABLE_POLLS polls, at most SYNC_TIMEOUT seconds. Returns the last count (-1 on error).
+        """
+        logging.info(f"Waiting for the target destination to reach {expected_count} items...")
+        print("Waiting for target to synchronize...")
+        deadline = time.monotonic() + self.SYNC_TIMEOUT
+        count = self.get_target_item_count(target_folder)
+        stable_polls = 0
+        while count != -1 and count < expected_count and time.monotonic() < deadline:
+            time.sleep(self.SYNC_POLL_INTERVAL)
+            previous, count = count, self.get_target_item_count(target_folder)
+            stable_polls = stable_polls + 1 if count == previous else 0
+            if stable_polls >= self.SYNC_STABLE_POLLS:
+                logging.warning(f"Target count settled at {count}, below the expected {expected_count}.")
+                break
+        logging.info(f"Wait complete, target count {count}.")
+        return count
+
     def generate_report(self):
         """Generate a comprehensive migration report"""
-        report_dir = "migration_reports"
-        os.makedirs(report_dir, exist_ok=True)
-        report_filename = os.path.join(report_dir, f'migration_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
+        os.makedirs(self.report_dir, exist_ok=True)
+        report_filename = os.path.join(self.report_dir, f'migration_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
 
         self.migration_report['end_time'] = datetime.now().isoformat()
         if self.migration_report['start_time']:
@@ -145,12 +1229,18 @@ class EmailMigrator:
         else:
             self.migration_report['duration_seconds'] = 0
 
+        self.migration_report['throttle'] = self.throttle.snapshot()
+        self.migration_report['session'] = self.session_snapshot()
+        self.migration_report['metrics'] = self.metrics.snapshot()
+        self.migration_report['failure_summary'] = self.report_sink.summarize()
+
         self.migration_report['success_rate'] = (
             self.migration_report['total_successful'] / self.migration_report['total_attempted'] * 100
         ) if self.migration_report['total_attempted'] > 0 else 0
 
         with open(report_filename, 'w') as f:
             json.dump(self.migration_report, f, indent=2, default=str)
+        self.report_sink.close()
 
         logging.info(f"Migration report saved to: {report_filename}")
 
@@ -163,13 +1253,48 @@ class EmailMigrator:
         print(f"Grand Total PST Items Found (Attempted to Move): {self.migration_report['total_attempted']}")
         print(f"Grand Total Successful .Move() Operations: {self.migration_report['total_successful']}")
         print(f"Grand Total Failed .Move() Operations: {self.migration_report['total_failed']}")
+        if self.migration_report['total_skipped']:
+            print(f"Grand Total Skipped (moved in a previous run or already in destination): {self.migration_report['total_skipped']}")
+            print(f"  of which duplicates already in destination: {self.migration_report['total_duplicates']}")
         print(f"Overall Success Rate (of .Move() calls): {self.migration_report['success_rate']:.2f}%")
         print(f"Aggregate Validation Passed: {self.migration_report['aggregate_validation_passed']}")
-
-        if self.migration_report['failed_items_overall']:
-            print(f"\n=== OVERALL FAILED ITEMS ({len(self.migration_report['failed_items_overall'])}) ===")
+        retry_queue = self.migration_report.get('retry_queue')
+        if retry_queue and retry_queue.get('deferred', 0) + retry_queue['still_queued']:
+            print(f"Retry Queue: {retry_queue.get('deferred', 0)} deferred, {retry_queue.get('moved', 0)} moved on retry, "
+                  f"{retry_queue.get('failed', 0)} failed for good, {retry_queue['still_queued']} still queued for the next run")
+        verification = self.migration_report.get('item_verification')
+        if verification:
+            print(f"Moved Items Verified in Destination: {verification['verified']} of {verification['moved_items_checked']}"
+                  f" ({verification['missing']} missing)")
+        reconciliation = self.migration_report.get('source_reconciliation')
+        if reconciliation:
+            print(f"Source Inventory: {reconciliation['psts_reconciled']} PSTs reconciled, "
+                  f"{reconciliation['unaccounted']} items unaccounted for"
+                  f" ({reconciliation['psts_not_in_inventory']} PSTs not in the inventory)")
+            for pst in reconciliation['psts']:
+                if pst['unaccounted']:
+                    print(f"  '{pst['pst_display_name']}': {pst['expected']} in the inventory, {pst['accounted']} accounted for")
+        throttle = self.migration_report['throttle']
+        print(f"Move Rate: final {throttle['current_rate']}/s (range {throttle['min_rate_seen']}-{throttle['max_rate_seen']}/s), "
+              f"{throttle['throttle_events']} throttle events, {throttle['total_backoff_seconds']}s backing off")
+        session = self.migration_report['session']
+        if session.get('reconnects'):
+            print(f"Outlook Session: reconnected {session['reconnects']} times")
+
+        calls = self.migration_report['metrics']['calls']
+        if calls:
+            print(f"\n=== CALL LATENCY (ms) ===")
+            print(f"{'Category':<15}{'Calls':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'Total s':>10}")
+            for category, stats in sorted(calls.items(), key=lambda entry: entry[1]['total_seconds'], reverse=True):
+                print(f"{category:<15}{stats['count']:>10}{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}"
+                      f"{stats['p99'] * 1000:>10.2f}{stats['total_seconds']:>10.2f}")
+
+        failure_summary = self.migration_report['failure_summary']
+        if failure_summary['failures_recorded']:
+            print(f"\n=== OVERALL FAILED ITEMS ({failure_summary['failures_recorded']}) ===")
+            print(f"All failures: {failure_summary['failures_file']}")
             print("Showing first 10 overall failures (check log file for all details):")
-            for i, failed_item in enumerate(self.migration_report['failed_items_overall'][:10], 1):
+            for i, failed_item in enumerate(self.report_sink.failure_sample, 1):
                 print(f"{i}. PST: {failed_item.get('pst_display_name', 'N/A')}, Subject: {failed_item['subject'][:70]}...")
                 print(f"   From Folder: {failed_item['folder']}")
                 print(f"   Error: {failed_item['error']}")
@@ -184,14 +1309,22 @@ class EmailMigrator:
                 print(f"  Items Attempted: {pst_detail['total_attempted_current_pst']}")
                 print(f"  Successful Moves: {pst_detail['total_successful_current_pst']}")
                 print(f"  Failed Moves: {pst_detail['total_failed_current_pst']}")
+                if pst_detail['bulk_moved_folders_current_pst']:
+                    print(f"  Folders Moved as a Unit: {pst_detail['bulk_moved_folders_current_pst']}")
+                if pst_detail['total_skipped_current_pst']:
+                    print(f"  Skipped (moved in a previous run or already in destination): {pst_detail['total_skipped_current_pst']}")
+                if pst_detail['total_duplicates_current_pst']:
+                    print(f"  Duplicates Left in Source: {pst_detail['total_duplicates_current_pst']}")
+                if pst_detail['total_deferred_current_pst']:
+                    print(f"  Deferred to the Retry Queue: {pst_detail['total_deferred_current_pst']}")
                 pst_success_rate = (
                     pst_detail['total_successful_current_pst'] / pst_detail['total_attempted_current_pst'] * 100
                 ) if pst_detail['total_attempted_current_pst'] > 0 else 0
                 print(f"  Success Rate: {pst_success_rate:.2f}%")
 
-                if pst_detail['failed_items_current_pst']:
-                    print(f"  Failed items for this PST ({len(pst_detail['failed_items_current_pst'])}):")
-                    for i, failed_item in enumerate(pst_detail['failed_items_current_pst'][:5], 1):
+                if pst_detail['failed_items_sample_current_pst']:
+                    print(f"  Failed items for this PST ({failure_summary['failures_by_pst'].get(pst_detail['pst_display_name'], 0)}):")
+                    for i, failed_item in enumerate(pst_detail['failed_items_sample_current_pst'], 1):
                         print(f"    {i}. Subject: {failed_item['subject'][:70]}... - {failed_item['error']}")
                 else:
                     print("  No failed items for this PST.")
@@ -199,15 +1332,17 @@ class EmailMigrator:
 
 
     def select_pst_store(self, namespace):
-        """Identifies and returns a list of all open PST stores."""
+        """Identifies and returns a list of all open PST stores, or of the configured sources."""
         pst_stores = []
         for store in namespace.Stores:
             if hasattr(store, 'FilePath') and store.FilePath and store.FilePath.lower().endswith('.pst'):
                 pst_stores.append(store)
+        if self.sources:
+            pst_stores = self.select_sources(namespace, pst_stores)
 
         if not pst_stores:
             logging.error("No PST files found currently open in Outlook.")
-            messagebox.showerror("No PSTs Open", "No PST files are currently open in Outlook. Please open the desired PST file(s) in Outlook first, then run this script.")
+            self.alert('error', "No PSTs Open", "No PST files are currently open in Outlook. Please open the desired PST file(s) in Outlook first, then run this script.")
             return None
 
         print("\n--- Detected PST Files Open in Outlook ---")
@@ -216,15 +1351,82 @@ class EmailMigrator:
 
         return pst_stores
 
-    def select_destination_store(self, namespace):
+    def select_sources(self, namespace, open_stores):
+        """
+        The stores of self.sources, in order. A source is a PST file path or a store display
+        name; PST files that are not open are added to the profile for this run. Returns an
+        empty list if any source cannot be found, so a job never migrates half its sources.
+        """
+        selected = []
+        for source in self.sources:
+            store = self.find_source_store(open_stores, source)
+            if store is None and source.lower().endswith('.pst'):
+                try:
+                    self.backend.open_pst(namespace, source)
+                    store = self.find_source_store(namespace.Stores, source)
+                    if store is not None:
+                        self.opened_store_ids.append(store.StoreID)
+                        logging.info(f"Opened PST '{source}' as '{store.DisplayName}'.")
+                except Exception as e:
+                    logging.error(f"Could not open PST '{source}': {e}")
+            if store is None:
+                logging.error(f"Source '{source}' is not open in Outlook and could not be opened.")
+                return []
+            selected.append(store)
+        return selected
+
+    def find_source_store(self, stores, source):
+        """The store whose file path (case-insensitive) or display name is source, or None if none matches."""
+        for store in stores:
+            file_path = getattr(store, 'FilePath', '') or ''
+            if file_path.lower() == source.lower() or store.DisplayName == source:
+                return store
+        return None
+
+    def close_opened_stores(self):
+        """Remove the PSTs this run added to the profile."""
+        for store_id in self.opened_store_ids:
+            try:
+                self.session.namespace.RemoveStore(self.session.store_by_id(store_id).GetRootFolder())
+            except Exception as e:
+                logging.warning(f"Could not remove PST store {store_id} from the profile: {e}")
+        self.opened_store_ids = []
+
+    def select_destination_folder(self, target_root_folder, store_name, folder_path):
+        """
+        Folder at folder_path ('/'-separated, below the root folder) in the destination store,
+        resolved through the session's folder index; missing folders are created.
+        """
+        store_id = self.session.store(store_name).StoreID
+        folder = self.session.folder(store_id, f"{target_root_folder.Name}/{folder_path}")
+        if folder is None:
+            folder = target_root_folder
+            for name in folder_path.split('/'):
+                folder = self.create_folder_if_not_exists(folder, name)
+        logging.info(f"Target folder selected: {folder.FolderPath}")
+        return folder
+
+    def select_destination_store(self, namespace, store_name=None):
         """
         Prompts the user to select any open mailbox/store as the destination.
+        If store_name is given, the store with that display name is selected without prompting.
         Returns the root folder of the selected store.
         """
+        if store_name is not None and self.session is not None:
+            # Resolved through the session's store index, without opening every store's root folder
+            try:
+                selected_store = self.session.store(store_name)
+                if selected_store is not None:
+                    target_root_folder = selected_store.GetRootFolder()
+                    logging.info(f"Target destination selected: {target_root_folder.FolderPath}")
+                    return target_root_folder, store_name, target_root_folder.FolderPath
+            except Exception as e:
+                logging.warning(f"Could not open destination store '{store_name}' by ID, listing all stores: {e}")
+
         all_stores = list(namespace.Stores)
         if not all_stores:
             logging.error("No mailboxes or stores found in Outlook.")
-            messagebox.showerror("No Mailboxes Found", "No mailboxes or stores are currently open in Outlook. Please ensure Outlook is running with at least one mailbox open.")
+            self.alert('error', "No Mailboxes Found", "No mailboxes or stores are currently open in Outlook. Please ensure Outlook is running with at least one mailbox open.")
             return None, None, None
 
         print("\n--- Select Migration Destination ---")
@@ -239,7 +1441,18 @@ class EmailMigrator:
 
         if not display_list:
             logging.error("Could not find any selectable destinations.")
-            messagebox.showerror("No Destinations Found", "Could not find any folders to migrate to. Check Outlook's configuration.")
+            self.alert('error', "No Destinations Found", "Could not find any folders to migrate to. Check Outlook's configuration.")
+            return None, None, None
+
+        if store_name is not None:
+            for selected_store, target_root_folder in display_list:
+                if selected_store.DisplayName == store_name:
+                    logging.info(f"Target destination selected: {target_root_folder.FolderPath}")
+                    return target_root_folder, store_name, target_root_folder.FolderPath
+            logging.error(f"Destination store '{store_name}' not found.")
+            return None, None, None
+        if not self.interactive:
+            logging.error("No destination store given for a non-interactive run.")
             return None, None, None
 
         while True:
@@ -260,21 +1473,27 @@ class EmailMigrator:
                 logging.error(f"Unexpected error during destination selection: {e}", exc_info=True)
                 return None, None, None
 
-    def run_migration(self):
-        """Main migration function with comprehensive validation for multiple PSTs"""
+    def run_migration(self, destination_store_name=None, assume_yes=False, plan_only=False, destination_folder=None):
+        """
+        Main migration function with comprehensive validation for multiple PSTs.
+        destination_store_name skips the destination prompt, assume_yes skips the CONFIRM prompt,
+        plan_only stops after writing the migration plan (dry run). destination_folder is a
+        folder path below the destination store's root folder to move into instead of the root.
+        """
         logging.info("Starting PST to Destination migration.")
         self.migration_report['start_time'] = datetime.now().isoformat()
+        self.run_id = self.migration_report['start_time']
 
-        pythoncom.CoInitialize()
-        outlook = None
         all_pst_stores = []
         target_folder = None
         target_display_name = None
         target_path = None
 
+        self.metrics.start(gauges=self.metrics_gauges)
+        if self.owns_logging:
+            observe_logging(lambda seconds: self.metrics.observe('log', seconds))
         try:
-            outlook = win32com.client.Dispatch("Outlook.Application")
-            namespace = outlook.GetNamespace("MAPI")
+            namespace = self.open_session().namespace
 
             # --- Step 1: Detect all open PSTs ---
             all_pst_stores = self.select_pst_store(namespace)
@@ -284,86 +1503,103 @@ class EmailMigrator:
 
             logging.info(f"Detected {len(all_pst_stores)} PSTs for migration.")
             source_pst_file_paths = [getattr(store, 'FilePath', 'N/A') for store in all_pst_stores]
+            # Only these PSTs' queued items are retried and counted, their moves are the ones this run validates
+            self.retry_psts = source_pst_file_paths
+            self.retry_keys = self.journal.queued_retry_keys(self.retry_psts)
+            if self.retry_keys:
+                logging.info(f"Retry queue: {len(self.retry_keys)} items of these PSTs deferred by earlier runs.")
+            queued_at_start = Counter(pst for pst, _ in self.retry_keys)
+
+            plan = self.plan_migration(all_pst_stores)
+            if plan_only:
+                print(f"Dry run: plan written to {self.save_plan(plan)}. No items were moved.")
+                return True
 
             # --- Step 2: User selects the destination type ---
-            target_folder, target_display_name, target_path = self.select_destination_store(namespace)
+            target_folder, target_display_name, target_path = self.select_destination_store(namespace, destination_store_name)
 
             if not target_folder:
                 logging.error("Target destination selection failed. Exiting migration.")
                 return False
 
+            if destination_folder:
+                target_folder = self.select_destination_folder(target_folder, target_display_name, destination_folder)
+                target_path = target_folder.FolderPath
+
             self.migration_report['destination_type'] = "User Selected Store"
             self.migration_report['destination_path'] = target_path
 
             # --- Step 3: Get initial count of items in the target folder ---
-            initial_target_item_count = self.get_folder_item_count(target_folder)
+            initial_target_item_count = self.get_target_item_count(target_folder)
             if initial_target_item_count == -1:
                 logging.error("Failed to get initial item count for target destination. Cannot perform aggregate validation.")
-                messagebox.showerror("Validation Error", "Failed to get initial item count. Check logs.")
+                self.alert('error', "Validation Error", "Failed to get initial item count. Check logs.")
                 return False
             logging.info(f"Initial item count in target destination ('{target_path}'): {initial_target_item_count}")
             print(f"\nInitial item count in target destination: {initial_target_item_count}")
 
+            if self.destination_index is not None:
+                self.destination_index.open(target_folder, recursive=self.preserve_structure)
+                print(f"Destination index: {len(self.destination_index)} items already in the destination.")
+
             print("\n" + "=" * 50)
             print(f"CONFIRMATION: You are about to MOVE ALL emails from {len(all_pst_stores)} selected PST(s)")
             print(f"into the '{self.migration_report['destination_type']}' of '{target_display_name}' ('{target_path}').")
-            print("This action will flatten the folder structures of ALL PSTs into the single target folder.")
+            if self.preserve_structure:
+                print("The folder structure of each PST will be recreated (and merged) under the target.")
+            else:
+                print("This action will flatten the folder structures of ALL PSTs into the single target folder.")
             print("THIS ACTION CANNOT BE UNDONE. ENSURE YOU HAVE BACKUPS OF ALL YOUR PST FILES.")
             print("=" * 50)
 
-            confirm = input("Type 'CONFIRM' to proceed with the migration: ")
+            if not assume_yes and not self.interactive:
+                logging.error("A non-interactive run moves items only with assume_yes.")
+                return False
+            confirm = 'CONFIRM' if assume_yes else input("Type 'CONFIRM' to proceed with the migration: ")
             if confirm.strip().upper() != 'CONFIRM':
                 logging.warning("Migration cancelled by user.")
                 print("Operation cancelled.")
                 return False
 
             # --- Step 4: Process each PST ---
-            for i, pst_store_obj in enumerate(all_pst_stores):
-                pst_store_display_name = pst_store_obj.DisplayName
-                pst_file_path = getattr(pst_store_obj, 'FilePath', 'N/A')
-
-                logging.info(f"\n--- Processing PST {i+1}/{len(all_pst_stores)}: '{pst_store_display_name}' (Path: {pst_file_path}) ---")
-                print(f"\n--- Processing PST {i+1}/{len(all_pst_stores)}: '{pst_store_display_name}' ---")
-
-                current_pst_report = {
-                    'pst_display_name': pst_store_display_name,
-                    'pst_file_path': pst_file_path,
-                    'total_attempted_current_pst': 0,
-                    'total_successful_current_pst': 0,
-                    'total_failed_current_pst': 0,
-                    'failed_items_current_pst': [],
-                    'folder_summary_current_pst': {}
-                }
-
-                self.process_folder(
-                    pst_store_obj.GetRootFolder(),
-                    target_folder,
-                    current_pst_report
-                )
-
-                self.migration_report['pst_migrations_details'].append(current_pst_report)
-                self.migration_report['total_attempted'] += current_pst_report['total_attempted_current_pst']
-                self.migration_report['total_successful'] += current_pst_report['total_successful_current_pst']
-                self.migration_report['total_failed'] += current_pst_report['total_failed_current_pst']
-                self.migration_report['failed_items_overall'].extend(
-                    [{**item, 'pst_display_name': pst_store_display_name} for item in current_pst_report['failed_items_current_pst']]
-                )
-                self.migration_report['folder_summary_overall'].update(current_pst_report['folder_summary_current_pst'])
+            self.progress.start(total=plan['total_items'])
+            moves_started = time.monotonic()
+            if self.profiler is not None:
+                self.profiler.start()
+            if not self.preserve_structure:
+                pst_reports = self.migrate_shards(plan, all_pst_stores, target_folder)
+            elif self.workers > 1 and len(all_pst_stores) > 1:
+                pst_reports = self.migrate_stores_in_parallel(all_pst_stores, target_folder)
+            else:
+                pst_reports = []
+                for i, pst_store_obj in enumerate(all_pst_stores):
+                    logging.info(f"\n--- Processing PST {i+1}/{len(all_pst_stores)}: '{pst_store_obj.DisplayName}' (Path: {getattr(pst_store_obj, 'FilePath', 'N/A')}) ---")
+                    print(f"\n--- Processing PST {i+1}/{len(all_pst_stores)}: '{pst_store_obj.DisplayName}' ---")
+                    pst_reports.append(self.migrate_pst_store(pst_store_obj, target_folder))
+
+            for current_pst_report in pst_reports:
+                self.merge_pst_report(current_pst_report)
+            self.drain_retry_queue()
+            self.migration_report['retry_queue'] = self.apply_retry_outcomes()
+            self.progress.finish()
+            if self.profiler is not None:
+                self.migration_report['profile'] = self.profiler.stop()
+            self.planner.history.record(self.migration_report['total_attempted'], time.monotonic() - moves_started,
+                                        self.workers)
+            if self.sync_state is not None:
+                self.sync_state.commit()
 
             logging.info(f"\nFinished moving items from all {len(all_pst_stores)} PSTs.")
             print(f"\nFinished moving items from all {len(all_pst_stores)} PSTs.")
 
             # --- Step 5: Post-migration wait for synchronization ---
-            logging.info(f"Waiting for 10 seconds to allow target destination to synchronize...")
-            print("Waiting for 60 seconds for target to synchronize...")
-            time.sleep(5)
-            logging.info("Wait complete.")
+            final_target_item_count = self.wait_for_target_sync(
+                target_folder, initial_target_item_count + self.migration_report['total_successful'])
 
             # --- Step 6: Post-migration count and aggregate validation ---
-            final_target_item_count = self.get_folder_item_count(target_folder)
             if final_target_item_count == -1:
                 logging.error("Failed to get final item count for target destination. Aggregate validation cannot be completed.")
-                messagebox.showerror("Validation Error", "Failed to get final item count. Check logs.")
+                self.alert('error', "Validation Error", "Failed to get final item count. Check logs.")
                 self.migration_report['aggregate_validation_passed'] = False
             else:
                 logging.info(f"Final item count in target destination ('{target_path}'): {final_target_item_count}")
@@ -372,7 +1608,8 @@ class EmailMigrator:
                 delta_items = final_target_item_count - initial_target_item_count
                 logging.info(f"Delta items in target: {delta_items}. Total successful moves across all PSTs: {self.migration_report['total_successful']}")
 
-                if (final_target_item_count > initial_target_item_count and
+                # A re-run that only finds duplicates moves nothing, and that is a pass
+                if ((final_target_item_count > initial_target_item_count or self.migration_report['total_successful'] == 0) and
                     delta_items >= self.migration_report['total_successful']):
                     self.migration_report['aggregate_validation_passed'] = True
                     logging.info("Aggregate count validation PASSED: Target increased by expected amount.")
@@ -383,7 +1620,8 @@ class EmailMigrator:
                         f"Expected increase >= {self.migration_report['total_successful']}, but got {delta_items}. "
                         f"(Initial: {initial_target_item_count}, Final: {final_target_item_count})"
                     )
-                    messagebox.showwarning(
+                    self.alert(
+                        'warning',
                         "Aggregate Validation Failed",
                         f"Count validation failed.\n"
                         f"Expected total increase from all PSTs: >= {self.migration_report['total_successful']}\n"
@@ -391,9 +1629,31 @@ class EmailMigrator:
                         f"Please check Outlook and logs for discrepancies."
                     )
 
+            if self.destination_index is not None:
+                verification = self.destination_index.verify(target_folder, full=not self.incremental)
+                self.migration_report['item_verification'] = verification
+                if verification['missing']:
+                    self.migration_report['aggregate_validation_passed'] = False
+                    logging.warning(f"Per-item verification FAILED: {verification['missing']} of "
+                                    f"{verification['moved_items_checked']} moved items not found in the destination.")
+                else:
+                    logging.info(f"Per-item verification PASSED for {verification['verified']} moved items.")
+
+            # An incremental run only looks at recent items, so it cannot account for a whole PST
+            if self.inventory is not None and not self.incremental:
+                reconciliation = self.reconcile_with_inventory(queued_at_start)
+                self.migration_report['source_reconciliation'] = reconciliation
+                if reconciliation['unaccounted']:
+                    self.migration_report['aggregate_validation_passed'] = False
+                    logging.warning(f"Source reconciliation FAILED: {reconciliation['unaccounted']} items listed in the "
+                                    f"PST inventory were not accounted for by this run.")
+                else:
+                    logging.info(f"Source reconciliation PASSED for {reconciliation['psts_reconciled']} PSTs.")
+
             self.generate_report()
 
-            overall_success = (self.migration_report['total_failed'] == 0 and self.migration_report['aggregate_validation_passed'])
+            overall_success = (self.migration_report['total_failed'] == 0 and self.migration_report['total_deferred'] == 0 and
+                               self.migration_report['aggregate_validation_passed'])
 
             if overall_success:
                 logging.info("Migration completed successfully with 0 errors and passed aggregate validation!")
@@ -404,14 +1664,60 @@ class EmailMigrator:
 
         except Exception as e:
             logging.error(f"Critical error during migration: {e}", exc_info=True)
-            messagebox.showerror("Migration Error", f"A critical error occurred during migration. Check logs for details: {e}")
+            self.alert('error', "Migration Error", f"A critical error occurred during migration. Check logs for details: {e}")
             return False
         finally:
-            if outlook:
-                del outlook
-            pythoncom.CoUninitialize()
+            self.journal.flush()
+            if self.opened_store_ids:
+                self.close_opened_stores()
+            self.close_session()
+            if self.owns_logging:
+                observe_logging(None)
+            if self.profiler is not None:
+                self.profiler.stop()
+            self.metrics.stop()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move emails from all open PSTs into a selected destination.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip folders and items the journal records as already moved")
+    parser.add_argument('--journal', default=os.path.join("migration_state", "migration_journal.sqlite3"),
+                        help="Path of the checkpoint journal")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of PSTs migrated in parallel, each in its own COM apartment")
+    parser.add_argument('--max-concurrent-moves', type=int, default=None,
+                        help="Global cap on simultaneous Move() calls across all workers")
+    parser.add_argument('--move-rate', type=float, default=5.0,
+                        help="Initial Move() rate per second; adapts to server latency and throttling")
+    parser.add_argument('--max-move-rate', type=float, default=200.0,
+                        help="Upper bound for the adaptive Move() rate")
+    parser.add_argument('--preserve-structure', action='store_true',
+                        help="Recreate each PST's folder tree under the destination; new subtrees are moved as a unit")
+    parser.add_argument('--plan', action='store_true',
+                        help="Dry run: scan the PSTs, write the shard plan with an ETA and exit without moving")
+    parser.add_argument('--shard-mb', type=float, default=256,
+                        help="Target shard size in MB; larger folders are split by ReceivedTime")
+    parser.add_argument('--shard-items', type=int, default=5000,
+                        help="Maximum items per shard")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only look at items modified since the previous incremental run (per-folder high-water marks)")
+    parser.add_argument('--no-dedupe', dest='dedupe', action='store_false',
+                        help="Dedupe is on by default: items the destination already holds are skipped and "
+                             "moved items are verified. This moves them anyway (no destination index)")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Write a DEBUG line per item to the log file")
+    parser.add_argument('--retry-timeout', type=float, default=1800.0,
+                        help="Seconds to keep retrying deferred items after the main pass; the rest stays queued for the next run")
+    parser.add_argument('--metrics-interval', type=float, default=30.0,
+                        help="Seconds between metrics exports (JSON and Prometheus text in migration_reports); 0 exports only at the end")
+    parser.add_argument('--profile', action='store_true',
+                        help="Sample all thread stacks while moving and write them as collapsed stacks to migration_reports")
+    parser.add_argument('--inventory', default=None,
+                        help="PST inventory written by pst_scanner.py: plan from its counts instead of folder tables "
+                             "and reconcile the run against them")
+    args = parser.parse_args()
+    inventory = PstInventory.load(args.inventory) if args.inventory else None
+
     print("\n" + "=" * 60)
     print("   PST to Destination Email Migration Tool (All Open PSTs)   ")
     print("=" * 60)
@@ -420,8 +1726,23 @@ if __name__ == "__main__":
     print("moving emails from all their folders to a single selected destination.")
     print("\n" + "=" * 60)
 
-    migrator = EmailMigrator()
-    success = migrator.run_migration()
+    migrator = EmailMigrator(journal_path=args.journal, resume=args.resume,
+                             workers=args.workers, max_concurrent_moves=args.max_concurrent_moves,
+                             throttle=ThrottleController(initial_rate=args.move_rate, max_rate=args.max_move_rate),
+                             preserve_structure=args.preserve_structure, verbose=args.verbose,
+                             dedupe=args.dedupe, incremental=args.incremental, retry_timeout=args.retry_timeout,
+                             inventory=inventory,
+                             metrics=MigrationMetrics(export_path=os.path.join("migration_reports", "migration_metrics"),
+                                                      export_interval=args.metrics_interval),
+                             profiler=SamplingProfiler(os.path.join(
+                                 "migration_reports", f'profile_{datetime.now().strftime("%Y%m%d_%H%M%S")}.txt'))
+                             if args.profile else None,
+                             planner=MigrationPlanner(shard_bytes=int(args.shard_mb * 1024 * 1024),
+                                                      shard_items=args.shard_items,
+                                                      state_dir=os.path.dirname(args.journal) or ".",
+                                                      inventory=inventory))
+    success = migrator.run_migration(plan_only=args.plan)
+    migrator.shutdown_logging()
 
     if success:
         print("\n✅ Migration completed successfully with no errors and passed aggregate validation!")
@@ -0,0 +1,113 @@
+"""
+Streaming report sink for EmailMigrator.
+
+Failure records and per-folder summaries are appended to NDJSON files as they
+happen instead of accumulating in the migration report, so memory stays flat
+on million-item, ten-thousand-folder runs.  Only running counters and a small
+sample of failures stay in memory; the final summary is computed by streaming
+the spilled files once.
+"""
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+
+
+class ReportSink:
+    """Append-only NDJSON spill files for failures and folder summaries."""
+
+    FAILURE_SAMPLE_SIZE = 10    # Failures kept in memory for the console summary
+    MAX_ERROR_GROUPS = 50       # Distinct error messages tracked in the final summary
+
+    def __init__(self, report_dir="migration_reports", run_id=None):
+        run_id = run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.report_dir = report_dir
+        self.failures_path = os.path.join(report_dir, f'migration_failures_{run_id}.ndjson')
+        self.folders_path = os.path.join(report_dir, f'migration_folders_{run_id}.ndjson')
+        self.failures_recorded = 0
+        self.folders_recorded = 0
+        self.failure_sample = []
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _write(self, path, record):
+        handle = self._files.get(path)
+        if handle is None:
+            os.makedirs(self.report_dir, exist_ok=True)
+            handle = self._files[path] = open(path, 'a', encoding='utf-8')
+        handle.write(json.dumps(record, default=str) + '\n')
+
+    def record_failure(self, record):
+        """Spill one failed item to the failures file."""
+        with self._lock:
+            self._write(self.failures_path, record)
+            self.failures_recorded += 1
+            if len(self.failure_sample) < self.FAILURE_SAMPLE_SIZE:
+                self.failure_sample.append(record)
+
+    def record_folder(self, record):
+        """Spill one folder summary to the folders file."""
+        with self._lock:
+            self._write(self.folders_path, record)
+            self.folders_recorded += 1
+
+    def flush(self):
+        with self._lock:
+            for handle in self._files.values():
+                handle.flush()
+
+    def close(self):
+        with self._lock:
+            for handle in self._files.values():
+                handle.close()
+            self._files = {}
+
+    def summarize(self):
+        """Aggregate the spilled files in one streaming pass each."""
+        self.flush()
+        errors = Counter()
+        failures_by_pst = Counter()
+        other_errors = 0
+        for record in self._read(self.failures_path):
+            failures_by_pst[record.get('pst_display_name', 'N/A')] += 1
+            error = str(record.get('error', ''))[:200]
+            if error in errors or len(errors) < self.MAX_ERROR_GROUPS:
+                errors[error] += 1
+            else:
+                other_errors += 1
+
+        folders = 0
+        empty_folders = 0
+        folders_with_failures = 0
+        for record in self._read(self.folders_path):
+            folders += 1
+            if not record.get('total_items_in_source_folder'):
+                empty_folders += 1
+            if record.get('failed_moves_from_this_folder'):
+                folders_with_failures += 1
+
+        summary = {
+            'failures_file': self.failures_path if self.failures_recorded else None,
+            'folders_file': self.folders_path if self.folders_recorded else None,
+            'failures_recorded': self.failures_recorded,
+            'failures_by_pst': dict(failures_by_pst),
+            'failures_by_error': dict(errors.most_common()),
+            'folders_recorded': folders,
+            'empty_folders': empty_folders,
+            'folders_with_failures': folders_with_failures,
+        }
+        if other_errors:
+            summary['failures_with_other_errors'] = other_errors
+        return summary
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    logging.warning(f"Skipping unreadable line in {path}")
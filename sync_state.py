@@ -0,0 +1,107 @@
+"""
+Per-folder high-water marks for incremental migration runs.
+
+After a run, every source folder that was processed without failures records
+the newest LastModificationTime it saw (at minute precision, like Jet filters)
+and the EntryIDs of the items in that last minute.  The next run restricts
+each folder to items modified since that minute and skips the boundary
+EntryIDs, so a catch-up run during a cutover costs time proportional to new
+mail rather than to the size of the source.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from destination_index import restrict_date
+
+STATE_VERSION = 1
+
+
+def folder_key(store_id, entry_id):
+    return f"{store_id}:{entry_id}"
+
+
+class SyncState:
+    """High-water marks of source folders, stored as JSON and updated once per run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.folders = {}       # folder_key -> {'high_water': ISO minute, 'boundary_ids': [...], 'synced_at': ISO}
+        self._pending = {}      # folder_key -> {'high_water': datetime, 'ids': set, 'failed': bool}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION:
+                self.folders = state['folders']
+            else:
+                logging.warning(f"Ignoring sync state {self.path} written by another version.")
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not read sync state {self.path}, doing a full pass: {e}")
+            self.folders = {}
+
+    def item_filter(self, store_id, entry_id):
+        """Jet filter selecting the items modified since the folder's high-water mark, or None on a first run."""
+        mark = self.folders.get(folder_key(store_id, entry_id))
+        if not mark:
+            return None
+        return f"[LastModificationTime] >= '{restrict_date(datetime.fromisoformat(mark['high_water']))}'"
+
+    def boundary_ids(self, store_id, entry_id):
+        """EntryIDs already handled in the high-water minute of the folder."""
+        mark = self.folders.get(folder_key(store_id, entry_id))
+        return frozenset(mark['boundary_ids']) if mark else frozenset()
+
+    def observe(self, store_id, entry_id, modified, item_entry_id):
+        """Record an item handled in this run; called from any worker thread."""
+        if not modified:
+            return
+        minute = modified.replace(second=0, microsecond=0)
+        key = folder_key(store_id, entry_id)
+        with self._lock:
+            pending = self._pending.setdefault(key, {'high_water': None, 'ids': set(), 'failed': False})
+            if pending['high_water'] is None or minute > pending['high_water']:
+                pending['high_water'] = minute
+                pending['ids'] = {item_entry_id}
+            elif minute == pending['high_water']:
+                pending['ids'].add(item_entry_id)
+
+    def mark_failed(self, store_id, entry_id):
+        """Keep the folder's old high-water mark so the next run looks at its items again."""
+        with self._lock:
+            self._pending.setdefault(folder_key(store_id, entry_id), {'high_water': None, 'ids': set(), 'failed': False})['failed'] = True
+
+    def commit(self):
+        """Advance the marks of folders processed without failures and save the state file."""
+        advanced = 0
+        with self._lock:
+            now = datetime.now().isoformat()
+            for key, pending in self._pending.items():
+                if pending['failed'] or pending['high_water'] is None:
+                    continue
+                high_water = pending['high_water'].isoformat()
+                mark = self.folders.get(key)
+                if mark and mark['high_water'] > high_water:
+                    continue
+                ids = pending['ids']
+                if mark and mark['high_water'] == high_water:
+                    ids = ids | set(mark['boundary_ids'])
+                self.folders[key] = {'high_water': high_water, 'boundary_ids': sorted(ids), 'synced_at': now}
+                advanced += 1
+            self._pending = {}
+            state = {'version': STATE_VERSION, 'folders': self.folders}
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.path)
+        logging.info(f"Sync state: advanced the high-water mark of {advanced} folders ({self.path}).")
+        return advanced
@@ -0,0 +1,97 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_outlook import FakeOutlookBackend  # noqa: E402
+from pst_scanner import INVENTORY_VERSION, PstInventory  # noqa: E402
+from pst_to_archive_migrator import EmailMigrator  # noqa: E402
+from throttle_controller import ThrottleController  # noqa: E402
+
+DESTINATION = 'Online Archive - test@example.com'
+
+
+@pytest.fixture(autouse=True)
+def fast_migrator(monkeypatch, tmp_path):
+    """Short retry and sync delays, and a scratch working directory for anything written to the cwd."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(EmailMigrator, 'RETRY_BASE_DELAY', 0.01)
+    monkeypatch.setattr(EmailMigrator, 'SYNC_POLL_INTERVAL', 0.01)
+
+
+@pytest.fixture
+def backend():
+    backend = FakeOutlookBackend(seed=7)
+    backend.add_mailbox(DESTINATION, folder_names=())
+    return backend
+
+
+@pytest.fixture
+def make_migrator(backend, tmp_path):
+    """EmailMigrator factory: headless, unthrottled, state and reports under tmp_path."""
+    def make(**options):
+        defaults = {
+            'backend': backend,
+            'journal_path': str(tmp_path / 'state' / 'migration_journal.sqlite3'),
+            'report_dir': str(tmp_path / 'reports'),
+            'interactive': False,
+            'configure_logging': False,
+            'retry_timeout': 5.0,
+            'throttle': ThrottleController(initial_rate=1000.0, max_rate=1000.0),
+        }
+        return EmailMigrator(**{**defaults, **options})
+    return make
+
+
+def run(migrator):
+    """Run a whole migration into DESTINATION and return (success, migration_report)."""
+    try:
+        return migrator.run_migration(destination_store_name=DESTINATION, assume_yes=True), migrator.migration_report
+    finally:
+        migrator.journal.close()
+
+
+def entry_id(record):
+    """EntryID of a fake item or folder record, as the migrator sees it."""
+    return f"{record.uid:032X}"
+
+
+def pst_items(backend, store):
+    """Item records still in a fake PST store."""
+    return [record for record in backend.items.values() if record.folder is not None and record.folder.store is store]
+
+
+def inventory_for(backend, *stores):
+    """A PstInventory as pst_scanner would write it for the current contents of fake PST stores."""
+    files = []
+    for store in stores:
+        folders = []
+        stack = [(store.root, '')]
+        while stack:
+            folder, path = stack.pop()
+            items = len(folder.items)
+            mail = sum(1 for record in folder.items if record.message_class == 'IPM.Note')
+            folders.append({
+                'path': path, 'nid': 0, 'entry_id': entry_id(folder), 'container_class': 'IPF.Note',
+                'content_count': items, 'items': items, 'bytes': 0, 'mail_items': mail, 'mail_bytes': 0,
+                'undated': [items, mail], 'days': {},
+            })
+            stack.extend((child, f"{path}/{child.name}" if path else child.name) for child in folder.children)
+        files.append({
+            'path': store.file_path, 'file_bytes': 0, 'format': 'unicode', 'encryption': 'none',
+            'display_name': store.display_name, 'root_entry_id': entry_id(store.root),
+            'totals': {
+                'folders': len(folders),
+                'items': sum(folder['items'] for folder in folders),
+                'bytes': 0,
+                'mail_items': sum(folder['mail_items'] for folder in folders),
+                'mail_bytes': 0,
+                'other_items': sum(folder['items'] - folder['mail_items'] for folder in folders),
+                'unreadable_items': 0,
+            },
+            'folders': folders,
+        })
+    return PstInventory({'version': INVENTORY_VERSION, 'created_at': datetime.now().isoformat(), 'files': files})
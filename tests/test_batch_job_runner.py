@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+import pytest
+
+from batch_job_runner import JOB_STATUS_SUCCEEDED, BatchJobRunner, ManifestError, parse_jobs
+from conftest import DESTINATION, inventory_for, pst_items
+from throttle_controller import ThrottleController
+
+
+def test_jobs_may_not_share_a_source():
+    with pytest.raises(ManifestError, match="both list source"):
+        parse_jobs([
+            {'id': 'a', 'sources': ['C:\\PST\\one.pst', 'C:\\PST\\two.pst'], 'destination': 'Archive A'},
+            {'id': 'b', 'source': 'c:/pst/TWO.pst', 'destination': 'Archive B'},
+        ])
+
+
+def test_jobs_with_distinct_sources_are_accepted():
+    jobs = parse_jobs([
+        {'id': 'a', 'source': 'C:\\PST\\one.pst', 'destination': 'Archive A'},
+        {'id': 'b', 'source': 'C:\\PST\\two.pst', 'destination': 'Archive B', 'mode': 'preserve'},
+    ], defaults={'workers': 2})
+
+    assert [job['sources'] for job in jobs] == [['C:\\PST\\one.pst'], ['C:\\PST\\two.pst']]
+    assert [job['workers'] for job in jobs] == [2, 2]
+
+
+def test_batch_runs_every_job_into_its_destination(backend, tmp_path):
+    small = backend.build_synthetic_pst('PST Small', 10, depth=1)
+    big = backend.build_synthetic_pst('PST Big', 30, depth=1, opened=False)
+    mailbox = backend.add_mailbox('Archive B')
+    jobs = parse_jobs([
+        {'id': 'big', 'source': big.file_path, 'destination': DESTINATION, 'mode': 'preserve'},
+        {'id': 'small', 'source': small.file_path, 'destination': 'Archive B', 'destination_folder': 'Inbox'},
+    ], defaults={'retry_timeout': 5.0})
+    runner = BatchJobRunner(jobs, backend=backend, max_jobs=2, max_concurrent_moves=4,
+                            throttle=ThrottleController(initial_rate=1000.0, max_rate=1000.0),
+                            state_dir=str(tmp_path / 'state'), report_dir=str(tmp_path / 'reports'),
+                            inventory=inventory_for(backend, small), metrics_interval=0)
+
+    summary = runner.run()
+
+    assert [job['id'] for job in runner.order] == ['small', 'big']
+    assert (summary['jobs'], summary['succeeded'], summary['total_successful']) == (2, 2, 40)
+    assert {job['id']: job['successful'] for job in summary['results']} == {'small': 10, 'big': 30}
+    assert not pst_items(backend, small) and not pst_items(backend, big)
+    inbox = [folder for folder in mailbox.root.children if folder.name == 'Inbox'][0]
+    assert len(inbox.items) == 10
+    with open(summary['summary_path'], encoding='utf-8') as f:
+        assert json.load(f)['total_successful'] == 40
+
+
+def test_concurrent_jobs_need_pst_paths_as_sources(backend):
+    jobs = parse_jobs([
+        {'id': 'a', 'source': 'C:\\PST\\one.pst', 'destination': 'Archive A'},
+        {'id': 'b', 'source': 'Personal Folders', 'destination': 'Archive B'},
+    ])
+
+    with pytest.raises(ManifestError, match="by display name"):
+        BatchJobRunner(jobs, backend=backend, max_jobs=2)
+    assert BatchJobRunner(jobs, backend=backend, max_jobs=1).max_jobs == 1
+
+
+def test_jobs_sharing_a_destination_run_one_after_another(backend, tmp_path):
+    jobs = parse_jobs([
+        {'id': 'a', 'source': 'C:\\PST\\a.pst', 'destination': 'Archive A'},
+        {'id': 'b', 'source': 'C:\\PST\\b.pst', 'destination': 'archive a', 'destination_folder': 'Inbox'},
+        {'id': 'c', 'source': 'C:\\PST\\c.pst', 'destination': 'Archive C'},
+    ])
+    runner = BatchJobRunner(jobs, backend=backend, max_jobs=3, state_dir=str(tmp_path / 'state'),
+                            report_dir=str(tmp_path / 'reports'))
+    lock = threading.Lock()
+    running = []
+    overlaps = []
+
+    def run_job(job, job_dir):
+        with lock:
+            running.append(job['id'])
+            overlaps.append(sorted(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(job['id'])
+        return {'id': job['id'], 'status': JOB_STATUS_SUCCEEDED, 'attempted': 0, 'successful': 0, 'failed': 0,
+                'deferred': 0, 'seconds': 0.05}
+
+    runner.run_job = run_job
+    summary = runner.run()
+
+    assert summary['succeeded'] == 3
+    assert ['a', 'c'] in overlaps
+    assert not any('a' in ids and 'b' in ids for ids in overlaps)
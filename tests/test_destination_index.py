@@ -0,0 +1,30 @@
+from conftest import DESTINATION
+from destination_index import DestinationIndex
+
+
+def test_rebuild_keeps_claims_of_moves_in_flight(backend, tmp_path):
+    destination = [store for store in backend.stores if store.display_name == DESTINATION][0]
+    backend.add_items(destination.root, 3)
+    backend.initialize()
+    try:
+        store = [store for store in backend.dispatch().GetNamespace('MAPI').Stores
+                 if store.DisplayName == DESTINATION][0]
+        root = store.GetRootFolder()
+        index = DestinationIndex(state_dir=str(tmp_path))
+        index.open(root)
+        fingerprints = index.fingerprints
+        assert len(index) == 3
+        assert index.claim(12345)
+
+        # The destination shrank, so this refresh rebuilds the index
+        deleted = list(destination.root.items)[-1]
+        destination.root.items.remove(deleted)
+        del backend.items[deleted.uid]
+        index.refresh(root)
+    finally:
+        backend.uninitialize()
+
+    assert index.fingerprints is fingerprints
+    assert len(index) == 3
+    assert 12345 in index
+    assert not index.claim(12345)
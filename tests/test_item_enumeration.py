@@ -0,0 +1,45 @@
+from conftest import DESTINATION, pst_items, run
+
+
+def open_root(backend, display_name):
+    stores = backend.dispatch().GetNamespace('MAPI').Stores
+    return [store for store in stores if store.DisplayName == display_name][0].GetRootFolder()
+
+
+def test_items_are_moved_one_by_one_when_folder_tables_fail(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 25, depth=1, non_mail_ratio=0.2)
+    mail = sum(1 for record in pst_items(backend, pst) if record.message_class == 'IPM.Note')
+    backend.failure_rates = {'table': 1.0}
+    migrator = make_migrator(dedupe=False)
+    migrator.ITEM_WINDOW_SIZE = 4
+
+    ok, report = run(migrator)
+
+    assert ok
+    assert report['total_successful'] == mail
+    assert {record.message_class for record in pst_items(backend, pst)} == {'IPM.Appointment'}
+
+
+def test_windowed_walk_yields_each_item_once_while_the_folder_shrinks(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 10, depth=0)
+    migrator = make_migrator()
+    migrator.ITEM_WINDOW_SIZE = 3
+    backend.initialize()
+    try:
+        source = open_root(backend, 'PST A')
+        target = open_root(backend, DESTINATION)
+        seen = []
+        for item in migrator.iter_folder_items(source):
+            seen.append(item.EntryID)
+            if len(seen) == 2:
+                # Another client deletes the four lowest items while the walk is in the middle
+                for record in list(pst.root.items)[:4]:
+                    pst.root.items.remove(record)
+                    record.folder = None
+            item.Move(target)
+    finally:
+        backend.uninitialize()
+        migrator.journal.close()
+
+    assert len(seen) == len(set(seen)) == 6
+    assert not pst_items(backend, pst)
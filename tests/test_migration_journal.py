@@ -0,0 +1,66 @@
+import sqlite3
+
+from conftest import entry_id, pst_items, run
+from migration_journal import ITEM_FAILED, ITEM_MOVED, ITEM_PLANNED, MigrationJournal
+
+
+def committed_events(path):
+    """Item events another process can read, i.e. the ones already committed."""
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM item_events').fetchone()[0]
+
+
+def test_item_events_are_committed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(MigrationJournal, 'FLUSH_EVERY', 3)
+    monkeypatch.setattr(MigrationJournal, 'FLUSH_SECONDS', 3600.0)
+    journal = MigrationJournal(str(tmp_path / 'journal.sqlite3'))
+
+    journal.record_item('a.pst', 'Inbox', 'E1', ITEM_PLANNED)
+    journal.record_item('a.pst', 'Inbox', 'E1', ITEM_MOVED)
+    assert committed_events(journal.path) == 0
+
+    journal.record_item('a.pst', 'Inbox', 'E2', ITEM_PLANNED)
+    assert committed_events(journal.path) == 3
+
+    journal.record_item('a.pst', 'Inbox', 'E2', ITEM_FAILED, 'Unspecified error')
+    journal.close()
+    assert committed_events(journal.path) == 4
+
+
+def test_journal_reopened_by_a_resumed_run_knows_finished_items_and_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(MigrationJournal, 'FLUSH_SECONDS', 3600.0)
+    journal = MigrationJournal(str(tmp_path / 'journal.sqlite3'))
+    journal.record_item('a.pst', 'Inbox', 'E1', ITEM_MOVED)
+    journal.record_item('a.pst', 'Inbox', 'E2', ITEM_FAILED)
+    # Marking the folder done commits its buffered item events first
+    journal.mark_folder_done('a.pst', 'Inbox')
+    assert committed_events(journal.path) == 2
+    journal.close()
+
+    journal = MigrationJournal(journal.path)
+    try:
+        assert journal.is_folder_done('a.pst', 'Inbox')
+        assert not journal.is_folder_done('b.pst', 'Inbox')
+        assert journal.is_item_done('a.pst', 'E1')
+        assert not journal.is_item_done('a.pst', 'E2')
+        assert not journal.is_item_done('b.pst', 'E1')
+    finally:
+        journal.close()
+
+
+def test_resume_skips_folders_finished_by_the_interrupted_run(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 30, depth=1)
+    failing_folder, done_folder = pst.root.children[0], pst.root.children[1]
+    backend.mark_failing(entry_id(next(iter(failing_folder.items))))
+
+    ok, report = run(make_migrator())
+    assert not ok
+    assert report['total_successful'] == 29
+
+    backend._failing_uids.clear()
+    backend.add_items(done_folder, 2)
+    ok, report = run(make_migrator(resume=True))
+
+    assert ok
+    assert report['total_successful'] == 1
+    assert {record.folder for record in pst_items(backend, pst)} == {done_folder}
@@ -0,0 +1,27 @@
+import logging
+import sys
+
+from migration_logging import TimedQueueHandler
+
+
+def test_records_are_formatted_before_they_are_queued():
+    queued = []
+
+    class Queue:
+        def put_nowait(self, record):
+            queued.append(record)
+
+    handler = TimedQueueHandler(Queue())
+    try:
+        raise ValueError("bad item")
+    except ValueError:
+        record = logging.LogRecord('test', logging.ERROR, __file__, 1, "Move of %s failed", ('item 7',),
+                                   sys.exc_info())
+    handler.handle(record)
+
+    record = queued[0]
+    assert record.getMessage().startswith("Move of item 7 failed")
+    assert "ValueError: bad item" in record.msg
+    assert record.args is None
+    assert record.exc_info is None
+    assert record.exc_text is None
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from conftest import run
+from migration_metrics import LatencyHistogram, MigrationMetrics
+
+
+def test_histogram_quantiles_are_bucket_bounds_within_a_fifth_of_the_value():
+    histogram = LatencyHistogram()
+    for milliseconds in range(1, 101):
+        histogram.observe(milliseconds / 1000)
+
+    snapshot = histogram.snapshot()
+    assert (snapshot['count'], snapshot['min'], snapshot['max']) == (100, 0.001, 0.1)
+    assert snapshot['mean'] == pytest.approx(0.0505)
+    assert 0.050 <= snapshot['p50'] <= 0.050 * 1.19
+    assert 0.095 <= snapshot['p95'] <= 0.1
+    assert snapshot['p99'] <= snapshot['max']
+    assert LatencyHistogram().snapshot()['p50'] is None
+
+
+def test_slowest_folders_keep_the_lowest_throughput(monkeypatch):
+    monkeypatch.setattr(MigrationMetrics, 'SLOWEST_FOLDERS', 2)
+    metrics = MigrationMetrics()
+
+    assert metrics.record_folder('Inbox', 100, 10.0) == 10.0
+    metrics.record_folder('Sent', 100, 50.0)
+    metrics.record_folder('Archive', 100, 1.0)
+    metrics.record_folder('Tiny', 1, 100.0)
+    assert metrics.record_folder('Empty', 0, 1.0) is None
+
+    snapshot = metrics.snapshot()
+    assert [folder['folder'] for folder in snapshot['slowest_folders']] == ['Sent', 'Inbox']
+    assert snapshot['folders_timed'] == 4
+
+
+def test_prometheus_text_has_quantiles_counters_and_gauges(tmp_path):
+    metrics = MigrationMetrics(export_path=str(tmp_path / 'metrics'))
+    metrics.start(gauges=lambda: {'items_moved': 12, 'phase': 'moving'})
+    for seconds in (0.01, 0.02, 0.04):
+        metrics.observe('move', seconds)
+    metrics.increment('throttle_events', 2)
+    snapshot = metrics.stop()
+
+    text = (tmp_path / 'metrics.prom').read_text()
+    assert '# TYPE migrator_call_seconds summary' in text
+    assert f'migrator_call_seconds{{category="move",quantile="0.5"}} {snapshot["calls"]["move"]["p50"]}' in text
+    assert 'migrator_call_seconds_count{category="move"} 3' in text
+    assert 'migrator_throttle_events_total 2' in text
+    assert 'migrator_items_moved 12' in text
+    assert 'phase' not in text
+    assert json.loads((tmp_path / 'metrics.json').read_text())['calls']['move']['count'] == 3
+
+
+def test_migration_report_times_moves_and_folder_opens(backend, make_migrator):
+    backend.build_synthetic_pst('PST A', 20, depth=1)
+
+    ok, report = run(make_migrator())
+
+    assert ok
+    calls = report['metrics']['calls']
+    assert calls['move']['count'] == 20
+    assert calls['folder_open']['count'] >= 1
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+from migration_planner import MigrationPlanner, received_filter
+
+STORE = SimpleNamespace(StoreID='S1', DisplayName='PST A', FilePath='C:\\PST\\a.pst')
+
+
+def folder_stats(days, undated=0):
+    return {
+        'folder_path': 'PST A/Inbox', 'entry_id': 'F1',
+        'items': sum(items for items, _ in days.values()) + undated,
+        'bytes': sum(size for _, size in days.values()),
+        'undated': undated,
+        'days': days,
+    }
+
+
+def test_folder_within_a_shard_is_one_unit(tmp_path):
+    planner = MigrationPlanner(shard_items=10, state_dir=str(tmp_path))
+
+    assert planner.split_folder(folder_stats({})) == []
+    units = planner.split_folder(folder_stats({'2024-01-01': [6, 600], '2024-01-02': [4, 400]}))
+    assert units == [{'folder_path': 'PST A/Inbox', 'entry_id': 'F1', 'items': 10, 'bytes': 1000}]
+    assert received_filter(units[0]) is None
+
+
+def test_big_folder_is_split_into_contiguous_day_windows(tmp_path):
+    planner = MigrationPlanner(shard_items=10, state_dir=str(tmp_path))
+    days = {'2024-01-01': [6, 600], '2024-01-02': [3, 300], '2024-01-03': [8, 800], '2024-01-05': [4, 400]}
+
+    units = planner.split_folder(folder_stats(days))
+
+    assert [(unit['received_from'], unit['received_until'], unit['items']) for unit in units] == [
+        (None, '2024-01-03', 9),
+        ('2024-01-03', '2024-01-05', 8),
+        ('2024-01-05', None, 4),
+    ]
+    assert sum(unit['bytes'] for unit in units) == 2100
+    assert received_filter(units[1]) == ("[ReceivedTime] >= '01/03/2024 12:00 AM' AND "
+                                         "[ReceivedTime] < '01/05/2024 12:00 AM'")
+
+
+def test_folder_with_undated_items_is_never_split(tmp_path):
+    planner = MigrationPlanner(shard_items=10, state_dir=str(tmp_path))
+
+    units = planner.split_folder(folder_stats({'2024-01-01': [8, 800], '2024-01-02': [8, 800]}, undated=1))
+
+    assert len(units) == 1
+    assert units[0]['items'] == 17
+
+
+def test_units_are_packed_into_balanced_shards(tmp_path):
+    planner = MigrationPlanner(shard_bytes=1000, shard_items=100, state_dir=str(tmp_path))
+    units = [{'folder_path': f"PST A/F{size}", 'entry_id': f"F{size}", 'items': 1, 'bytes': size}
+             for size in (700, 500, 400, 300, 100)]
+
+    shards = planner.pack_units(STORE, units)
+
+    assert sorted(shard['bytes'] for shard in shards) == [1000, 1000]
+    assert sorted(len(shard['units']) for shard in shards) == [2, 3]
+    assert all(shard['store_id'] == 'S1' and shard['pst_file_path'] == 'C:\\PST\\a.pst' for shard in shards)
+    assert planner.pack_units(STORE, []) == []
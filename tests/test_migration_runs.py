@@ -0,0 +1,119 @@
+from conftest import DESTINATION, entry_id, inventory_for, pst_items, run
+from destination_index import fingerprint
+from fake_outlook import E_FAIL, FakeComError, FakeTable
+from migration_planner import MigrationPlanner
+
+
+def test_resume_with_inventory_accounts_for_items_moved_by_earlier_runs(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 50, depth=1)
+    inventory = inventory_for(backend, pst)
+    failing = [entry_id(record) for record in pst_items(backend, pst)[:4]]
+    for value in failing:
+        backend.mark_failing(value)
+
+    ok, report = run(make_migrator(inventory=inventory))
+    assert not ok
+    assert report['total_successful'] == 46
+    assert report['source_reconciliation']['unaccounted'] == 0
+
+    backend._failing_uids.clear()
+    ok, report = run(make_migrator(inventory=inventory, resume=True))
+
+    assert ok
+    assert report['total_successful'] == 4
+    reconciled = report['source_reconciliation']['psts'][0]
+    assert reconciled['moved_by_earlier_runs'] == 46
+    assert reconciled['expected'] == 50
+    assert reconciled['unaccounted'] == 0
+
+
+def test_planner_scans_folders_changed_since_the_inventory(backend, tmp_path):
+    pst = backend.build_synthetic_pst('PST A', 30, depth=1)
+    inventory = inventory_for(backend, pst)
+    backend.add_items(pst.root.children[0], 4)
+    backend.add_items(backend.add_folder(pst.root, 'New'), 5)
+    backend.initialize()
+    try:
+        store = [store for store in backend.dispatch().GetNamespace('MAPI').Stores if store.FilePath][0]
+        plan = MigrationPlanner(state_dir=str(tmp_path), inventory=inventory).build_plan([store])
+    finally:
+        backend.uninitialize()
+
+    assert plan['stores_from_inventory'] == 1
+    assert plan['total_items'] == 39
+    assert plan['folders'] == 5
+
+
+def test_flatten_moves_mail_of_folders_created_or_filled_after_planning(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 30, depth=1)
+    empty = backend.add_folder(pst.root, 'Empty')
+    migrator = make_migrator(workers=2)
+    plan_migration = migrator.plan_migration
+
+    def plan_then_receive_mail(stores):
+        plan = plan_migration(stores)
+        backend.add_items(empty, 3)
+        backend.add_items(backend.add_folder(pst.root, 'New'), 4)
+        return plan
+
+    migrator.plan_migration = plan_then_receive_mail
+    ok, report = run(migrator)
+
+    assert ok
+    assert report['total_successful'] == 37
+    assert not pst_items(backend, pst)
+
+
+def test_partial_bulk_folder_move_is_credited_and_verified(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 60, depth=1)
+    backend.folder_move_item_limit = 4
+
+    ok, report = run(make_migrator(preserve_structure=True))
+
+    assert ok
+    assert report['total_successful'] == 60
+    assert report['total_failed'] == 0
+    assert report['item_verification']['verified'] == 60
+    assert not pst_items(backend, pst)
+
+
+def test_preserve_skips_only_copies_already_in_the_same_folder(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 40, depth=2)
+    destination = [store for store in backend.stores if store.display_name == DESTINATION][0]
+    folder = pst.root.children[0]
+    in_folder = sum(len(subfolder.items) for subfolder in [folder, *folder.children])
+    backend.copy_folder(folder, destination.root)
+    backend.copy_folder(folder, backend.add_folder(destination.root, 'Elsewhere'))
+
+    ok, report = run(make_migrator(preserve_structure=True))
+
+    assert ok
+    assert report['total_duplicates'] == in_folder
+    assert report['total_successful'] == 40 - in_folder
+    assert report['item_verification']['missing'] == 0
+
+
+def test_fingerprint_needs_a_message_id_and_tells_folders_apart():
+    assert fingerprint(None, None, 'Sender', 'Inbox') is None
+    assert fingerprint('<1@example.com>', None, 'Sender', 'Inbox') != fingerprint('<1@example.com>', None, 'Sender', 'Sent')
+    assert fingerprint('<1@example.com>', None, 'Sender', 'Inbox') == fingerprint('<1@example.com>', None, 'Sender', 'INBOX')
+
+
+def test_folder_failing_midway_counts_only_the_items_not_yet_handled(backend, make_migrator, monkeypatch):
+    pst = backend.build_synthetic_pst('PST A', 12, depth=0)
+    get_array = FakeTable.GetArray
+
+    def fail_after_first_window(table, max_rows):
+        if table._folder is pst.root and table._position:
+            raise FakeComError(E_FAIL, 'Unspecified error')
+        return get_array(table, max_rows)
+
+    monkeypatch.setattr(FakeTable, 'GetArray', fail_after_first_window)
+    migrator = make_migrator(dedupe=False)
+    migrator.ITEM_WINDOW_SIZE = 5
+    ok, report = run(migrator)
+
+    assert not ok
+    assert report['total_successful'] == 5
+    assert report['total_failed'] == 7
+    assert len(pst_items(backend, pst)) == 7
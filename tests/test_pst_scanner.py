@@ -0,0 +1,178 @@
+import re
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from pst_scanner import (
+    BTH_SIGNATURE, CRYPT_CYCLIC, CRYPT_NONE, CRYPT_PERMUTE, FILETIME_EPOCH, HEAP_CLIENT_PC, HEAP_SIGNATURE,
+    MPBB_CRYPT, NID_MESSAGE_STORE, NID_ROOT_FOLDER, PAGE_SIZE, PERMUTE_DECODE, PR_CONTAINER_CLASS,
+    PR_CONTENT_COUNT, PR_DISPLAY_NAME, PR_INTERNET_MESSAGE_ID, PR_IPM_SUBTREE_ENTRYID, PR_MESSAGE_CLASS,
+    PR_MESSAGE_DELIVERY_TIME, PR_MESSAGE_SIZE, PR_RECORD_KEY, PT_BINARY, PT_LONG, PT_SYSTIME, PT_UNICODE,
+    PTYPE_BBT, PTYPE_NBT, PstFile, PstFormatError, PstInventory, scan_file, scan_paths,
+)
+
+RECORD_KEY = bytes(range(16))
+ROOT_ENTRY_ID = bytes(4) + RECORD_KEY + struct.pack('<I', NID_ROOT_FOLDER)
+INBOX, PROJECTS, SENT = 0x8022, 0x8042, 0x8062
+
+
+def property_context(properties):
+    """Heap-on-node holding a property context of (prop_id, prop_type, value) entries."""
+    allocations = []
+
+    def allocate(data):
+        allocations.append(data)
+        return len(allocations) << 5
+
+    records = b''
+    for prop_id, prop_type, value in sorted(properties):
+        if prop_type == PT_LONG:
+            hnid = value
+        elif prop_type == PT_UNICODE:
+            hnid = allocate(value.encode('utf-16-le'))
+        elif prop_type == PT_SYSTIME:
+            # FILETIME: 100 ns ticks since 1601
+            hnid = allocate(struct.pack('<Q', (value - FILETIME_EPOCH) // timedelta(microseconds=1) * 10))
+        else:
+            hnid = allocate(value)
+        records += struct.pack('<HHI', prop_id, prop_type, hnid)
+    bth_root = allocate(records)
+    bth_header = allocate(struct.pack('<BBBBI', BTH_SIGNATURE, 2, 6, 0, bth_root))
+
+    offsets = [12]
+    for data in allocations:
+        offsets.append(offsets[-1] + len(data))
+    return (struct.pack('<HBBI4x', offsets[-1], HEAP_SIGNATURE, HEAP_CLIENT_PC, bth_header)
+            + b''.join(allocations) + struct.pack(f'<HH{len(offsets)}H', len(allocations), 0, *offsets))
+
+
+def message(nid, folder, message_class, size, received=None, message_id=None):
+    properties = [(PR_MESSAGE_CLASS, PT_UNICODE, message_class), (PR_MESSAGE_SIZE, PT_LONG, size)]
+    if received:
+        properties.append((PR_MESSAGE_DELIVERY_TIME, PT_SYSTIME, received))
+    if message_id:
+        properties.append((PR_INTERNET_MESSAGE_ID, PT_UNICODE, message_id))
+    return nid, folder, properties
+
+
+def folder(nid, parent, name, count):
+    return nid, parent, [(PR_DISPLAY_NAME, PT_UNICODE, name), (PR_CONTENT_COUNT, PT_LONG, count),
+                         (PR_CONTAINER_CLASS, PT_UNICODE, 'IPF.Note')]
+
+
+# Store, IPM subtree with Inbox, Inbox/Projects and Sent Items, and their messages
+NODES = [
+    (NID_MESSAGE_STORE, 0, [(PR_DISPLAY_NAME, PT_UNICODE, 'Archive 2019'),
+                            (PR_RECORD_KEY, PT_BINARY, RECORD_KEY),
+                            (PR_IPM_SUBTREE_ENTRYID, PT_BINARY, ROOT_ENTRY_ID)]),
+    folder(NID_ROOT_FOLDER, NID_ROOT_FOLDER, 'Top of Personal Folders', 0),
+    folder(INBOX, NID_ROOT_FOLDER, 'Inbox', 3),
+    folder(PROJECTS, INBOX, 'Projects', 2),
+    folder(SENT, NID_ROOT_FOLDER, 'Sent Items', 1),
+    message(0x200004, INBOX, 'IPM.Note', 1000, datetime(2019, 5, 1, 9, 30), '<1@example.com>'),
+    message(0x200024, INBOX, 'IPM.Note', 2000, datetime(2019, 5, 1, 17, 0), '<2@example.com>'),
+    message(0x200044, INBOX, 'IPM.Note.SMIME', 4000, datetime(2019, 5, 2, 8, 0)),
+    message(0x200064, PROJECTS, 'IPM.Note', 500, datetime(2019, 5, 3, 12, 0), '<3@example.com>'),
+    message(0x200084, PROJECTS, 'IPM.Appointment', 300),
+    message(0x2000A4, SENT, 'IPM.Note', 700, datetime(2019, 5, 1, 10, 0)),
+    # A message whose folder is not in the IPM subtree (e.g. a search folder's)
+    message(0x2000C4, 0x80A2, 'IPM.Note', 100, datetime(2019, 5, 1, 10, 0)),
+]
+
+
+def btree_page(entries, entry_size, page_type):
+    """Unicode leaf page of a node or block B-tree."""
+    page = bytearray(PAGE_SIZE)
+    for index, entry in enumerate(entries):
+        page[index * entry_size:index * entry_size + len(entry)] = entry
+    page[488], page[490], page[491], page[496] = len(entries), entry_size, 0, page_type
+    return bytes(page)
+
+
+def write_pst(path, nodes=NODES, encryption=CRYPT_NONE, version=23, magic=b'!BDN'):
+    """Write a Unicode PST whose nodes each have one data block holding a property context."""
+    blocks = bytearray()
+    node_entries, block_entries = [], []
+    data_start = 2 * PAGE_SIZE
+    for index, (nid, parent, properties) in enumerate(nodes):
+        data = property_context(properties)
+        if encryption == CRYPT_PERMUTE:
+            data = data.translate(MPBB_CRYPT)
+        bid = (index + 1) * 4
+        block_entries.append(struct.pack('<QQHH4x', bid, data_start + len(blocks), len(data), 2))
+        node_entries.append(struct.pack('<QQQI4x', nid, bid, 0, parent))
+        blocks += data + bytes(-len(data) % 64)
+    nbt_at = data_start + len(blocks) + (-len(blocks) % PAGE_SIZE)
+    bbt_at = nbt_at + PAGE_SIZE
+
+    header = bytearray(data_start)
+    header[:4] = magic
+    struct.pack_into('<H', header, 10, version)
+    struct.pack_into('<QQQQ', header, 216, 1, nbt_at, 2, bbt_at)
+    header[513] = encryption
+    image = header + blocks + bytes(nbt_at - data_start - len(blocks))
+    image += btree_page(node_entries, 32, PTYPE_NBT) + btree_page(block_entries, 24, PTYPE_BBT)
+    path.write_bytes(bytes(image))
+    return str(path)
+
+
+def test_permute_decoding_inverts_the_encoding_table():
+    every_byte = bytes(range(256))
+    assert every_byte.translate(MPBB_CRYPT) != every_byte
+    assert every_byte.translate(MPBB_CRYPT).translate(PERMUTE_DECODE) == every_byte
+
+
+@pytest.mark.parametrize('encryption, name', [(CRYPT_NONE, 'none'), (CRYPT_PERMUTE, 'permute')])
+def test_inventory_lists_the_folder_hierarchy_with_counts(tmp_path, encryption, name):
+    with PstFile(write_pst(tmp_path / 'archive.pst', encryption=encryption)) as pst:
+        inventory = pst.inventory(message_ids=True)
+
+    assert inventory['format'] == 'unicode'
+    assert inventory['encryption'] == name
+    assert inventory['display_name'] == 'Archive 2019'
+    assert inventory['root_entry_id'] == ROOT_ENTRY_ID.hex().upper()
+    folders = {entry['path']: entry for entry in inventory['folders']}
+    assert sorted(folders) == ['', 'Inbox', 'Inbox/Projects', 'Sent Items']
+
+    inbox = folders['Inbox']
+    assert inbox['entry_id'].endswith(struct.pack('<I', INBOX).hex().upper())
+    assert (inbox['content_count'], inbox['items'], inbox['bytes'], inbox['mail_items']) == (3, 3, 7000, 3)
+    assert inbox['days'] == {'2019-05-01': [2, 3000, 2, 3000], '2019-05-02': [1, 4000, 1, 4000]}
+    assert inbox['message_ids'] == ['<1@example.com>', '<2@example.com>']
+    projects = folders['Inbox/Projects']
+    assert (projects['items'], projects['mail_items'], projects['undated']) == (2, 1, [1, 0])
+    assert projects['container_class'] == 'IPF.Note'
+    assert inventory['totals'] == {'folders': 4, 'items': 6, 'bytes': 8500, 'mail_items': 5, 'mail_bytes': 8200,
+                                   'other_items': 1, 'unreadable_items': 0}
+
+
+def test_scanned_inventory_is_found_by_the_path_outlook_reports(tmp_path):
+    write_pst(tmp_path / 'archive.pst')
+
+    inventory = PstInventory(scan_paths([str(tmp_path)]))
+
+    entry = inventory.find('C:\\Users\\me\\Documents\\Archive.PST')
+    assert entry is not None
+    assert entry['totals']['items'] == 6
+
+
+@pytest.mark.parametrize('header, error', [
+    ({'magic': b'PK\x03\x04'}, 'is not a PST file'),
+    ({'version': 36}, 'uses 4 KB pages'),
+    ({'version': 99}, 'unknown file format version 99'),
+    ({'encryption': CRYPT_CYCLIC}, 'cyclic (high) encoding'),
+])
+def test_unsupported_headers_are_rejected(tmp_path, header, error):
+    path = write_pst(tmp_path / 'bad.pst', **header)
+
+    with pytest.raises(PstFormatError, match=re.escape(error)):
+        PstFile(path)
+    assert error in scan_file(path)['error']
+
+
+def test_empty_file_is_reported_not_raised(tmp_path):
+    path = tmp_path / 'empty.pst'
+    path.write_bytes(b'')
+
+    assert scan_file(str(path)) == {'path': str(path), 'error': f"PstFormatError: {path} is empty"}
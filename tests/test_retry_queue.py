@@ -0,0 +1,98 @@
+import sqlite3
+
+from conftest import entry_id, pst_items, run
+from pst_to_archive_migrator import EmailMigrator
+
+
+def make_due(journal_path):
+    """Make every queued retry due now, as if the next run started after their delay."""
+    with sqlite3.connect(journal_path) as conn:
+        conn.execute('UPDATE retry_queue SET next_attempt_at = 0')
+
+
+def test_locked_items_are_deferred_and_moved_by_the_retry_pass(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 40, depth=1)
+    for record in pst_items(backend, pst)[:3]:
+        backend.mark_locked(entry_id(record), attempts=2)
+
+    ok, report = run(make_migrator())
+
+    assert ok
+    assert report['total_successful'] == 40
+    assert report['total_failed'] == 0
+    assert report['retry_queue']['deferred'] == 3
+    assert report['retry_queue']['moved'] == 3
+    assert report['retry_queue']['still_queued'] == 0
+    assert not pst_items(backend, pst)
+
+
+def test_item_that_stays_locked_fails_after_the_last_retry(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 10, depth=0)
+    backend.mark_locked(entry_id(pst_items(backend, pst)[0]), attempts=100)
+
+    ok, report = run(make_migrator())
+
+    assert not ok
+    assert report['total_successful'] == 9
+    assert report['total_failed'] == 1
+    assert report['retry_queue']['failed'] == 1
+    assert report['retry_queue']['still_queued'] == 0
+
+
+def test_queued_item_is_retried_by_the_next_run_of_its_pst(backend, make_migrator, monkeypatch):
+    pst_a = backend.build_synthetic_pst('PST A', 10, depth=0)
+    pst_b = backend.build_synthetic_pst('PST B', 10, depth=0)
+    backend.mark_locked(entry_id(pst_items(backend, pst_b)[0]), attempts=1)
+    monkeypatch.setattr(EmailMigrator, 'RETRY_BASE_DELAY', 1000.0)
+
+    ok, report = run(make_migrator(retry_timeout=0))
+    assert not ok
+    assert report['total_deferred'] == 1
+
+    # A run of the other PST neither retries nor counts PST B's queued item
+    migrator = make_migrator(retry_timeout=0, sources=[pst_a.file_path])
+    make_due(migrator.journal.path)
+    backend.add_items(pst_a.root, 2)
+    ok, report = run(migrator)
+    assert ok
+    assert report['total_successful'] == 2
+    assert report['total_deferred'] == 0
+    assert len(pst_items(backend, pst_b)) == 1
+
+    ok, report = run(make_migrator(retry_timeout=0))
+    assert ok
+    assert report['total_successful'] == 1
+    assert report['retry_queue']['moved_from_earlier_runs'] == 1
+    assert not pst_items(backend, pst_b)
+
+
+def test_dedupe_off_rerun_moves_items_queued_with_a_fingerprint(backend, make_migrator, monkeypatch):
+    pst = backend.build_synthetic_pst('PST A', 10, depth=0)
+    backend.mark_locked(entry_id(pst_items(backend, pst)[0]), attempts=1)
+    monkeypatch.setattr(EmailMigrator, 'RETRY_BASE_DELAY', 1000.0)
+    ok, report = run(make_migrator(retry_timeout=0))
+    assert not ok
+    assert report['total_deferred'] == 1
+
+    migrator = make_migrator(retry_timeout=0, dedupe=False)
+    make_due(migrator.journal.path)
+    ok, report = run(migrator)
+
+    assert ok
+    assert report['retry_queue']['moved'] == 1
+    assert report['retry_queue']['still_queued'] == 0
+    assert not pst_items(backend, pst)
+
+
+def test_move_whose_reply_was_lost_counts_as_moved(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 20, depth=1)
+    for record in pst_items(backend, pst)[:3]:
+        backend.mark_reply_lost(entry_id(record))
+
+    ok, report = run(make_migrator())
+
+    assert ok
+    assert report['total_successful'] == 20
+    assert report['total_failed'] == 0
+    assert report['retry_queue']['moved'] == 3
+    assert report['item_verification']['missing'] == 0
@@ -0,0 +1,38 @@
+from conftest import pst_items, run
+from fake_outlook import FakeComError
+from outlook_backend import RPC_E_DISCONNECTED
+from outlook_session import OutlookSession
+
+
+def test_reconnect_budget_resets_once_items_move_again(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 40, depth=0)
+    # One folder losing its session more often than MAX_RECONNECTS
+    backend.disconnect_every = 5
+
+    ok, report = run(make_migrator())
+
+    assert ok
+    assert report['total_successful'] == 40
+    assert report['session']['reconnects'] > OutlookSession.MAX_RECONNECTS
+    assert not pst_items(backend, pst)
+
+
+def test_shard_unit_is_retried_when_its_folder_cannot_be_opened_for_a_lost_session(backend, make_migrator,
+                                                                                  monkeypatch):
+    pst = backend.build_synthetic_pst('PST A', 30, depth=1)
+    folder_by_id = OutlookSession.folder_by_id
+    lost_for = {f"{folder.uid:032X}" for folder in pst.root.children}
+
+    def lost_once(session, entry_id, store_id=None):
+        if entry_id in lost_for:
+            lost_for.discard(entry_id)
+            raise FakeComError(RPC_E_DISCONNECTED, 'The object invoked has disconnected from its clients.')
+        return folder_by_id(session, entry_id, store_id)
+
+    monkeypatch.setattr(OutlookSession, 'folder_by_id', lost_once)
+    ok, report = run(make_migrator())
+
+    assert ok
+    assert report['total_successful'] == 30
+    assert not lost_for
+    assert not pst_items(backend, pst)
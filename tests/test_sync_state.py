@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from conftest import entry_id, pst_items, run
+from destination_index import restrict_date
+from migration_planner import MigrationPlanner
+from outlook_session import OutlookSession
+from sync_state import SyncState
+
+
+def test_folder_whose_planned_window_could_not_be_opened_is_scanned_again(backend, make_migrator, tmp_path,
+                                                                          monkeypatch):
+    pst = backend.build_synthetic_pst('PST A', 60, depth=0)
+    # One item an hour, so the folder is split into ReceivedTime windows of whole days
+    for hour, record in enumerate(pst_items(backend, pst)):
+        record.received = record.modified = hour * 3600
+    oldest = {entry_id(record) for record in pst_items(backend, pst) if record.received < 24 * 3600}
+    folder_id = entry_id(pst.root)
+
+    def make_incremental():
+        planner = MigrationPlanner(shard_items=25, state_dir=str(tmp_path / 'state'))
+        return make_migrator(incremental=True, planner=planner)
+
+    migrator = make_incremental()
+    migrate_shard = migrator.migrate_shard
+    folder_by_id = OutlookSession.folder_by_id
+    opening_oldest = []
+
+    def fail_oldest_window(session, shard, target_ids):
+        opening_oldest[:] = [shard['units'][0]['received_from'] is None]
+        return migrate_shard(session, shard, target_ids)
+
+    def open_folder(session, value, store_id=None):
+        if value == folder_id and opening_oldest[0]:
+            raise RuntimeError('The operation failed.')
+        return folder_by_id(session, value, store_id)
+
+    migrator.migrate_shard = fail_oldest_window
+    monkeypatch.setattr(OutlookSession, 'folder_by_id', open_folder)
+    ok, report = run(migrator)
+    monkeypatch.setattr(OutlookSession, 'folder_by_id', folder_by_id)
+
+    assert not ok
+    assert report['plan']['shard_count'] > 1
+    assert {entry_id(record) for record in pst_items(backend, pst)} == oldest
+
+    ok, report = run(make_incremental())
+
+    assert ok
+    assert report['total_successful'] == len(oldest)
+    assert not pst_items(backend, pst)
+
+
+def test_commit_advances_marks_of_folders_without_failures(tmp_path):
+    state = SyncState(str(tmp_path / 'sync_state.json'))
+    assert state.item_filter('S', 'F1') is None
+    state.observe('S', 'F1', datetime(2024, 3, 1, 9, 15, 20), 'A')
+    state.observe('S', 'F1', datetime(2024, 3, 1, 9, 15, 40), 'B')
+    state.observe('S', 'F1', datetime(2024, 3, 1, 8, 0), 'C')
+    state.observe('S', 'F2', datetime(2024, 3, 1, 9, 0), 'D')
+    state.mark_failed('S', 'F2')
+    state.observe('S', 'F3', None, 'E')
+
+    assert state.commit() == 1
+
+    reloaded = SyncState(state.path)
+    assert reloaded.boundary_ids('S', 'F1') == {'A', 'B'}
+    high_water = restrict_date(datetime(2024, 3, 1, 9, 15))
+    assert reloaded.item_filter('S', 'F1') == f"[LastModificationTime] >= '{high_water}'"
+    assert reloaded.item_filter('S', 'F2') is None
+    assert reloaded.item_filter('S', 'F3') is None
+
+
+def test_commit_keeps_boundary_ids_of_the_same_minute_and_never_moves_a_mark_back(tmp_path):
+    state = SyncState(str(tmp_path / 'sync_state.json'))
+    state.observe('S', 'F1', datetime(2024, 3, 1, 9, 15), 'A')
+    state.commit()
+
+    state.observe('S', 'F1', datetime(2024, 3, 1, 9, 15, 30), 'B')
+    assert state.commit() == 1
+    assert state.boundary_ids('S', 'F1') == {'A', 'B'}
+
+    state.observe('S', 'F1', datetime(2024, 3, 1, 8, 0), 'C')
+    assert state.commit() == 0
+    assert state.boundary_ids('S', 'F1') == {'A', 'B'}
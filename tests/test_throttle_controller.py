@@ -0,0 +1,71 @@
+import pytest
+
+import throttle_controller
+from conftest import pst_items, run
+from throttle_controller import ThrottleController
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(throttle_controller.random, 'uniform', lambda low, high: high)
+
+
+def test_rate_grows_additively_up_to_the_maximum():
+    throttle = ThrottleController(initial_rate=10.0, max_rate=11.0, increase_step=5.0)
+
+    throttle.record_success(0.1)
+    assert throttle.rate == pytest.approx(10.5)
+    for _ in range(5):
+        throttle.record_success(0.1)
+    assert throttle.rate == 11.0
+
+
+def test_throttling_halves_the_rate_and_backs_off_exponentially(no_jitter):
+    throttle = ThrottleController(initial_rate=8.0, min_rate=1.5, backoff_base=5.0, backoff_max=30.0)
+
+    assert [throttle.record_throttle() for _ in range(4)] == [5.0, 10.0, 20.0, 30.0]
+    assert throttle.rate == 1.5
+    assert throttle.stats['throttle_events'] == 4
+
+    # A successful move ends the streak, so the next backoff starts at the base again
+    throttle.record_success(0.1)
+    assert throttle.record_throttle() == 5.0
+
+
+def test_slow_moves_cut_the_rate_at_most_once_a_second():
+    throttle = ThrottleController(initial_rate=10.0, target_latency=1.0, latency_decrease_factor=0.9)
+
+    throttle.record_success(3.0)
+    throttle.record_success(3.0)
+
+    assert throttle.rate == pytest.approx(9.0)
+    assert throttle.stats['latency_slowdowns'] == 1
+    assert throttle.snapshot()['recent_decisions'][-1]['event'] == 'latency_slowdown'
+
+
+def test_acquire_paces_moves_and_waits_out_a_backoff(monkeypatch, no_jitter):
+    sleeps = []
+    monkeypatch.setattr(throttle_controller.time, 'sleep', sleeps.append)
+    throttle = ThrottleController(initial_rate=10.0, backoff_base=2.0)
+
+    throttle.acquire()
+    throttle.acquire()
+    assert sleeps == [pytest.approx(0.1, abs=0.05)]
+
+    throttle.record_throttle()
+    throttle.acquire()
+    assert sleeps[-1] == pytest.approx(2.0, abs=0.05)
+
+
+def test_migration_slows_down_and_finishes_when_the_server_throttles(backend, make_migrator):
+    pst = backend.build_synthetic_pst('PST A', 30, depth=1)
+    backend.throttle_every = 7
+    throttle = ThrottleController(initial_rate=1000.0, max_rate=1000.0, backoff_base=0.001)
+
+    ok, report = run(make_migrator(throttle=throttle))
+
+    assert ok
+    assert report['total_successful'] == 30
+    assert report['throttle']['throttle_events'] > 0
+    assert report['throttle']['min_rate_seen'] < 1000.0
+    assert not pst_items(backend, pst)
@@ -0,0 +1,115 @@
+"""
+Adaptive rate control for Move() calls.
+
+ThrottleController replaces the fixed batch/pause/cooldown constants of the
+earlier migrators.  It paces moves at a rate that grows additively while the
+server keeps up and shrinks multiplicatively when Move() latency rises or the
+server throttles (AIMD).  A throttling error also starts an exponential
+backoff with jitter that every worker sharing the controller waits out.
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class ThrottleController:
+    """Thread-safe AIMD pacing of Move() calls with exponential backoff on throttling."""
+
+    def __init__(self, initial_rate=5.0, min_rate=0.5, max_rate=200.0,
+                 increase_step=5.0, decrease_factor=0.5, latency_decrease_factor=0.9,
+                 target_latency=2.0, backoff_base=5.0, backoff_max=300.0, max_retries=5):
+        self.rate = initial_rate                        # Moves per second currently allowed
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step              # Added to the rate per second of successful moves
+        self.decrease_factor = decrease_factor          # Applied to the rate on a throttling error
+        self.latency_decrease_factor = latency_decrease_factor
+        self.target_latency = target_latency            # Smoothed Move() latency above this slows down
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retries = max_retries                  # Throttle retries per item before it counts as failed
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._resume_at = 0.0
+        self._consecutive_throttles = 0
+        self._latency_ewma = None
+        self._last_latency_cut = 0.0
+        self.decisions = deque(maxlen=500)
+        self.stats = {
+            'moves_paced': 0,
+            'throttle_events': 0,
+            'latency_slowdowns': 0,
+            'total_backoff_seconds': 0.0,
+            'min_rate_seen': initial_rate,
+            'max_rate_seen': initial_rate,
+        }
+
+    def acquire(self):
+        """Block until the next move is allowed by the current rate and any active backoff."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_slot, self._resume_at)
+            self._next_slot = start + 1.0 / self.rate
+            self.stats['moves_paced'] += 1
+        if start > now:
+            time.sleep(start - now)
+
+    def record_success(self, latency):
+        """Additive increase, or a multiplicative slowdown if smoothed latency is above target."""
+        with self._lock:
+            self._consecutive_throttles = 0
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+            now = time.monotonic()
+            if self._latency_ewma > self.target_latency:
+                # At most one latency cut per second so a slow burst does not collapse the rate
+                if now - self._last_latency_cut >= 1.0:
+                    self._last_latency_cut = now
+                    self._set_rate(self.rate * self.latency_decrease_factor)
+                    self.stats['latency_slowdowns'] += 1
+                    self._decide('latency_slowdown', latency_ewma=round(self._latency_ewma, 3))
+            else:
+                self._set_rate(self.rate + self.increase_step / self.rate)
+
+    def record_throttle(self, error=None):
+        """Multiplicative decrease plus exponential backoff with jitter; returns the backoff in seconds."""
+        with self._lock:
+            self._consecutive_throttles += 1
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** (self._consecutive_throttles - 1))
+            backoff *= random.uniform(0.5, 1.0)
+            self._resume_at = max(self._resume_at, time.monotonic() + backoff)
+            self._set_rate(self.rate * self.decrease_factor)
+            self.stats['throttle_events'] += 1
+            self.stats['total_backoff_seconds'] += backoff
+            self._decide('throttled', backoff_seconds=round(backoff, 2),
+                         consecutive=self._consecutive_throttles, error=str(error) if error else None)
+        logging.warning(f"Server throttling detected. Backing off {backoff:.1f}s, move rate now {self.rate:.2f}/s.")
+        return backoff
+
+    def _set_rate(self, rate):
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        self.stats['min_rate_seen'] = min(self.stats['min_rate_seen'], self.rate)
+        self.stats['max_rate_seen'] = max(self.stats['max_rate_seen'], self.rate)
+
+    def _decide(self, event, **details):
+        self.decisions.append({'time': datetime.now().isoformat(), 'event': event, 'rate': round(self.rate, 3), **details})
+
+    def snapshot(self):
+        """Current state and recent rate decisions, for the migration report."""
+        with self._lock:
+            return {
+                'current_rate': round(self.rate, 3),
+                'config': {
+                    'min_rate': self.min_rate,
+                    'max_rate': self.max_rate,
+                    'target_latency': self.target_latency,
+                    'backoff_base': self.backoff_base,
+                    'backoff_max': self.backoff_max,
+                    'max_retries': self.max_retries,
+                },
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+                'recent_decisions': list(self.decisions),
+            }